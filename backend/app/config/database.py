@@ -1,5 +1,6 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from ..config.settings import settings
+from .indexes import ensure_indexes
 from typing import Optional
 import logging
 import asyncio
@@ -32,6 +33,7 @@ class Database:
                 # Verify connection
                 await cls.client.admin.command('ping')
                 logger.info("Successfully connected to MongoDB")
+                await ensure_indexes(cls.client[settings.DATABASE_NAME])
                 return
                 
             except (ConnectionFailure, ConfigurationError, ServerSelectionTimeoutError) as e:
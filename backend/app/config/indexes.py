@@ -0,0 +1,145 @@
+"""Declarative index registry for the collections the backend queries.
+
+Indexes are applied idempotently on startup by ``Database.connect_to_database``.
+Collections owned by the radius service (accounting, accounting_history,
+post_auth) manage their own indexes there.
+
+    python -m app.config.indexes check   # report missing, undeclared and unused indexes
+    python -m app.config.indexes apply   # create missing indexes now
+"""
+from typing import Dict, List
+import asyncio
+import logging
+import sys
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Collection -> indexes; names are left to pymongo's defaults so they stay
+# stable across deployments. Listings sort on (created_at, _id) so keyset
+# pages (app.utils.pagination) are a range scan on the same index.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)]),
+        IndexModel([("agency", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "agencies": [
+        # get_agency_by_shortcode matches any of the three shortcodes
+        IndexModel([("mpesa_shortcode", ASCENDING)], sparse=True),
+        IndexModel([("mpesa_b2c_shortcode", ASCENDING)], sparse=True),
+        IndexModel([("mpesa_b2b_shortcode", ASCENDING)], sparse=True),
+        # One agency per RADIUS realm; agencies without one store null
+        IndexModel(
+            [("realm", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"realm": {"$type": "string"}}
+        ),
+        IndexModel([("nas_clients", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "customers": [
+        IndexModel([("agency", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # RADIUS lookups scoped to the agency a realm or NAS resolved to
+        IndexModel([("agency", ASCENDING), ("username", ASCENDING)]),
+        # Unscoped RADIUS lookups by bare username
+        IndexModel([("username", ASCENDING)]),
+        # Per-station customer counts
+        IndexModel([("station", ASCENDING)]),
+        IndexModel([("package", ASCENDING)]),
+        # Expiry sweeps and reports compare the precomputed UTC epoch
+        IndexModel([("expiry_epoch", ASCENDING)], sparse=True),
+    ],
+    "packages": [
+        IndexModel([("agency", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "stations": [
+        IndexModel([("agency", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "employees": [
+        IndexModel([("agency", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "inventories": [
+        IndexModel([("agency", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "tickets": [
+        IndexModel([("agency", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "notifications": [
+        # Listing, keyset pages, retention cleanup and per-agency counts
+        IndexModel([("agency", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # Unread counts and mark-all-as-read
+        IndexModel([("agency", ASCENDING), ("is_read", ASCENDING), ("user_id", ASCENDING)]),
+    ],
+    "mpesa_transactions": [
+        # Callback matching of pending transactions
+        IndexModel([("reference", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("agency_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("mpesa_receipt", ASCENDING)], sparse=True),
+    ],
+    "subscriptions": [
+        IndexModel([("user_id", ASCENDING)]),
+    ],
+}
+
+def index_name(model: IndexModel) -> str:
+    return model.document["name"]
+
+async def ensure_indexes(database) -> None:
+    """Create any declared index that does not exist yet.
+
+    createIndexes is a no-op for an identical existing index, so this is safe
+    to run on every startup. A conflicting definition is logged, not raised,
+    so one bad index never blocks the API from starting.
+    """
+    for collection_name, models in INDEXES.items():
+        collection = database.get_collection(collection_name)
+        for model in models:
+            try:
+                await collection.create_indexes([model])
+            except OperationFailure as e:
+                logger.error(f"Could not create index {index_name(model)} on {collection_name}: {str(e)}")
+
+async def check_indexes(database) -> bool:
+    """Print missing, undeclared and unused indexes; returns True when none are missing"""
+    healthy = True
+    for collection_name, models in INDEXES.items():
+        collection = database.get_collection(collection_name)
+        declared = {index_name(model) for model in models}
+        existing = set(await collection.index_information())
+        usage = {
+            stats["name"]: stats["accesses"]
+            async for stats in collection.aggregate([{"$indexStats": {}}])
+        }
+
+        for name in sorted(declared - existing):
+            healthy = False
+            print(f"{collection_name}: missing {name}")
+        for name in sorted(existing - declared - {"_id_"}):
+            print(f"{collection_name}: undeclared {name}")
+        for name in sorted(declared & existing):
+            accesses = usage.get(name)
+            if accesses is not None and accesses["ops"] == 0:
+                print(f"{collection_name}: unused {name} (no operations since {accesses['since']})")
+    return healthy
+
+async def main(command: str) -> int:
+    from .database import db
+
+    await db.connect_to_database()
+    try:
+        database = db.get_database()
+        if command == "apply":
+            await ensure_indexes(database)
+            return 0
+        return 0 if await check_indexes(database) else 1
+    finally:
+        await db.close_database_connection()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    if command not in ("check", "apply"):
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(asyncio.run(main(command)))
@@ -18,6 +18,10 @@ class Settings(BaseSettings):
     
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    # Authenticated users are cached per token for this long, so most
+    # requests authenticate without a users lookup
+    AUTH_CACHE_TTL_SECONDS: int = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+    AUTH_CACHE_SIZE: int = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
     
     # API URLs
     RADIUS_API_URL: str = os.getenv("RADIUS_API_URL", "http://localhost:9000")
@@ -44,6 +48,21 @@ class Settings(BaseSettings):
     # Security
     ENCRYPTION_KEY: Optional[str] = os.getenv("ENCRYPTION_KEY")
     
+    # Logging
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    
+    # GraphQL document caching and persisted queries
+    GRAPHQL_DOCUMENT_CACHE_SIZE: int = int(os.getenv("GRAPHQL_DOCUMENT_CACHE_SIZE", "1000"))
+    PERSISTED_QUERIES_CACHE_SIZE: int = int(os.getenv("PERSISTED_QUERIES_CACHE_SIZE", "1000"))
+    # JSON object of sha256 hash -> query text
+    PERSISTED_QUERIES_MANIFEST: Optional[str] = os.getenv("PERSISTED_QUERIES_MANIFEST")
+    # Only run operations listed in the manifest
+    PERSISTED_QUERIES_ALLOWLIST: bool = os.getenv("PERSISTED_QUERIES_ALLOWLIST", "False").lower() == "true"
+    # Write queries registered at runtime into the manifest, e.g. on staging
+    PERSISTED_QUERIES_RECORD: bool = os.getenv("PERSISTED_QUERIES_RECORD", "False").lower() == "true"
+    # Cache-Control max-age for successful persisted queries sent over GET; 0 disables
+    GRAPHQL_GET_MAX_AGE: int = int(os.getenv("GRAPHQL_GET_MAX_AGE", "0"))
+    
     # File Upload Settings
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
     MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", "5242880"))  # 5MB default
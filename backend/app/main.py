@@ -2,7 +2,6 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from app.config.database import db
 import logging
-from strawberry.fastapi import GraphQLRouter
 from app.routes.user_routes import Query as UserQuery, Mutation as UserMutation
 from app.routes.auth_routes import AuthMutation, router as auth_router
 from app.routes.agency_routes import Query as AgencyQuery, Mutation as AgencyMutation
@@ -16,6 +15,7 @@ from app.routes.station_routes import Query as StationQuery, Mutation as Station
 from app.routes.notification_routes import Query as NotificationQuery, Mutation as NotificationMutation
 from app.routes.service_routes import Query as ServiceQuery, Mutation as ServiceMutation
 from app.routes.subscription_routes import Query as SubscriptionQuery, Mutation as SubscriptionMutation
+from app.routes.usage_routes import Query as UsageQuery
 from app.schemas.mpesa_schemas import (
     MpesaTransaction, TransactionFilter, CustomerPaymentInput,
     TransactionStatus, TransactionType, CommandID, MpesaCallback,
@@ -25,14 +25,14 @@ from app.schemas.service_schemas import Service, Tier, ServiceInput, ServiceUpda
 from app.schemas.subscription_schema import Subscription, SubscriptionInput, SubscriptionUpdateInput
 from app.middleware.auth_middleware import get_context
 import strawberry
+from strawberry.extensions import ParserCache, ValidationCache
 from app.config.settings import settings
+from app.utils.persisted_queries import PersistedQueries, PersistedQueryRouter
+from app.utils.log_pipeline import start_logging, stop_logging
 from .routes.mpesa_callbacks import router as mpesa_router
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging; records are written by a background thread
+start_logging(settings.LOG_LEVEL)
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +41,8 @@ logger = logging.getLogger(__name__)
 class Query(
     UserQuery, AgencyQuery, EmployeeQuery, CustomerQuery,
     InventoryQuery, PackageQuery, TicketQuery, MpesaQuery,
-    StationQuery, NotificationQuery, ServiceQuery, SubscriptionQuery
+    StationQuery, NotificationQuery, ServiceQuery, SubscriptionQuery,
+    UsageQuery
 ):
     pass
 
@@ -72,6 +73,13 @@ schema = strawberry.Schema(
         Subscription,
         SubscriptionInput,
         SubscriptionUpdateInput
+    ],
+    extensions=[
+        # Persisted queries resolve to query text first, so repeat operations
+        # hit the parser and validation caches
+        PersistedQueries,
+        lambda: ParserCache(maxsize=settings.GRAPHQL_DOCUMENT_CACHE_SIZE),
+        lambda: ValidationCache(maxsize=settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
     ]
 )
 
@@ -93,7 +101,7 @@ app.add_middleware(
 )
 
 # Add GraphQL route
-graphql_app = GraphQLRouter(schema, context_getter=get_context)
+graphql_app = PersistedQueryRouter(schema, context_getter=get_context)
 app.include_router(graphql_app, prefix="/graphql")
 app.include_router(auth_router)
 
@@ -114,6 +122,7 @@ async def startup_db_client():
 async def shutdown_db_client():
     await db.close_database_connection()
     logger.info("Database connection closed")
+    stop_logging()
 
 @app.get("/health")
 async def health_check():
@@ -2,24 +2,29 @@ from typing import Optional, Any, Callable
 from strawberry.types import Info
 from ..utils.auth import verify_token
 from ..config.database import db
+from ..utils.loaders import Loaders
+from ..utils.principal_cache import principal_cache
 from bson import ObjectId
 from fastapi import Request
 import jwt
 from app.config.settings import settings
 from strawberry.fastapi import BaseContext
 from functools import wraps
+import logging
+
+logger = logging.getLogger(__name__)
 
 class Context(BaseContext):
     def __init__(self, request: Request, user: Optional[dict] = None):
         super().__init__()
         self.request = request
         self.user = user
+        self.loaders = Loaders()
 
 async def get_context(request: Request):
     auth_header = request.headers.get('Authorization')
     context = Context(request=request)
     
-    
     if auth_header and auth_header.startswith('Bearer '):
         try:
             token = auth_header.split(' ')[1]
@@ -27,19 +32,24 @@ async def get_context(request: Request):
             payload = verify_token(token)
 
             if payload and 'sub' in payload:
-                collection = db.get_collection("users")
-                user = await collection.find_one({"_id": ObjectId(payload['sub'])})
+                user_id, jti = payload['sub'], payload.get('jti')
+                user = principal_cache.get(user_id, jti)
+                if user is None:
+                    collection = db.get_collection("users")
+                    user = await collection.find_one({"_id": ObjectId(user_id)})
+                    if user:
+                        principal_cache.put(user_id, jti, user)
                 if user:
                     context.user = user
                     context.user_id = str(user["_id"])
                 else:
-                    print("User not found in database")
+                    logger.debug("Auth rejected: user %s not found", user_id)
             else:
-                print("Invalid token payload")
+                logger.debug("Auth rejected: invalid token payload")
         except (jwt.InvalidTokenError, Exception) as e:
-            print(f"Auth error: {str(e)}")
+            logger.debug("Auth rejected: %s", e)
     else:
-        print("No Authorization header or invalid format")
+        logger.debug("No bearer token on request")
     
     return context
 
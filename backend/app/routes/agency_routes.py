@@ -1,5 +1,5 @@
 import strawberry
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 from bson import ObjectId
 from ..config.database import db
@@ -7,34 +7,44 @@ from ..schemas.agency_schemas import Agency, AgencyInput, AgencyUpdateInput, Mpe
 from ..utils.decorators import login_required, role_required
 from ..utils.mpesa import MpesaIntegration
 from ..utils.encryption import encrypt_mpesa_credentials, decrypt_mpesa_credentials
+from ..utils.principal_cache import principal_cache
 from strawberry.types import Info
+from ..utils.pagination import paginate, DEFAULT_PAGE_SIZE
+from ..schemas.pagination_schemas import Connection
 import requests
 import base64
 import json
 
+def agency_from_document(agency: Dict) -> Agency:
+    return Agency(
+        id=str(agency["_id"]),
+        name=agency["name"],
+        address=agency.get("address"),
+        phone=agency.get("phone"),
+        email=agency.get("email"),
+        website=agency.get("website"),
+        logo=agency.get("logo"),
+        banner=agency.get("banner"),
+        description=agency.get("description"),
+        mpesa_shortcode=agency.get("mpesa_shortcode"),
+        mpesa_env=agency.get("mpesa_env"),
+        mpesa_b2c_shortcode=agency.get("mpesa_b2c_shortcode"),
+        mpesa_b2b_shortcode=agency.get("mpesa_b2b_shortcode"),
+        mpesa_initiator_name=agency.get("mpesa_initiator_name"),
+        realm=agency.get("realm"),
+        nas_clients=agency.get("nas_clients"),
+        created_at=agency.get("created_at", datetime.utcnow()),
+        updated_at=agency.get("updated_at")
+    )
+
 async def get_agencies() -> List[Agency]:
     collection = db.get_collection("agencies")
     agencies_data = await collection.find({}).to_list(None)
-    return [
-        Agency(
-            id=str(agency["_id"]),
-            name=agency["name"],
-            address=agency.get("address"),
-            phone=agency.get("phone"),
-            email=agency.get("email"),
-            website=agency.get("website"),
-            logo=agency.get("logo"),
-            banner=agency.get("banner"),
-            description=agency.get("description"),
-            mpesa_shortcode=agency.get("mpesa_shortcode"),
-            mpesa_env=agency.get("mpesa_env"),
-            mpesa_b2c_shortcode=agency.get("mpesa_b2c_shortcode"),
-            mpesa_b2b_shortcode=agency.get("mpesa_b2b_shortcode"),
-            mpesa_initiator_name=agency.get("mpesa_initiator_name"),
-            created_at=agency.get("created_at", datetime.utcnow()),
-            updated_at=agency.get("updated_at")
-        ) for agency in agencies_data
-    ]
+    return [agency_from_document(agency) for agency in agencies_data]
+
+async def get_agencies_page(first: int, after: Optional[str]) -> Connection[Agency]:
+    page = await paginate(db.get_collection("agencies"), {}, first, after)
+    return page.connection([agency_from_document(agency) for agency in page.documents])
 
 async def get_agency(id: str) -> Optional[Agency]:
     collection = db.get_collection("agencies")
@@ -56,6 +66,8 @@ async def get_agency(id: str) -> Optional[Agency]:
                 mpesa_b2c_shortcode=agency.get("mpesa_b2c_shortcode"),
                 mpesa_b2b_shortcode=agency.get("mpesa_b2b_shortcode"),
                 mpesa_initiator_name=agency.get("mpesa_initiator_name"),
+                realm=agency.get("realm"),
+                nas_clients=agency.get("nas_clients"),
                 created_at=agency.get("created_at", datetime.utcnow()),
                 updated_at=agency.get("updated_at")
             )
@@ -87,6 +99,9 @@ async def create_agency(info: Info, agency_input: AgencyInput) -> Agency:
         "mpesa_b2b_shortcode": agency_input.mpesa_b2b_shortcode,
         "mpesa_initiator_name": agency_input.mpesa_initiator_name,
         "mpesa_initiator_password": agency_input.mpesa_initiator_password,
+        # Realms are matched case-insensitively by the radius service
+        "realm": agency_input.realm.lower() if agency_input.realm else None,
+        "nas_clients": agency_input.nas_clients or [],
         "created_at": now,
         "updated_at": now
     }
@@ -115,6 +130,7 @@ async def create_agency(info: Info, agency_input: AgencyInput) -> Agency:
             "updated_at": now
         }}
     )
+    principal_cache.invalidate(info.context.user_id)
     
     # Return Agency without sensitive fields
     return Agency(
@@ -132,6 +148,8 @@ async def create_agency(info: Info, agency_input: AgencyInput) -> Agency:
         mpesa_b2c_shortcode=agency_data.get("mpesa_b2c_shortcode"),
         mpesa_b2b_shortcode=agency_data.get("mpesa_b2b_shortcode"),
         mpesa_initiator_name=agency_data.get("mpesa_initiator_name"),
+        realm=agency_data.get("realm"),
+        nas_clients=agency_data.get("nas_clients"),
         created_at=agency_data["created_at"],
         updated_at=agency_data["updated_at"]
     )
@@ -147,11 +165,14 @@ async def update_agency(id: str, agency_input: AgencyUpdateInput) -> Optional[Ag
         "name", "address", "phone", "email", "website", "logo", "banner",
         "description", "mpesa_consumer_key", "mpesa_consumer_secret",
         "mpesa_shortcode", "mpesa_passkey", "mpesa_env", "mpesa_b2c_shortcode",
-        "mpesa_b2b_shortcode", "mpesa_initiator_name", "mpesa_initiator_password"
+        "mpesa_b2b_shortcode", "mpesa_initiator_name", "mpesa_initiator_password",
+        "realm", "nas_clients"
     ]:
         value = getattr(agency_input, field, None)
         if value is not None:
             update_data[field] = value
+    if update_data.get("realm"):
+        update_data["realm"] = update_data["realm"].lower()
     
     # Encrypt sensitive M-Pesa credentials if they are being updated
     update_data = encrypt_mpesa_credentials(update_data)
@@ -188,6 +209,8 @@ async def update_agency(id: str, agency_input: AgencyUpdateInput) -> Optional[Ag
                     mpesa_b2c_shortcode=result.get("mpesa_b2c_shortcode"),
                     mpesa_b2b_shortcode=result.get("mpesa_b2b_shortcode"),
                     mpesa_initiator_name=result.get("mpesa_initiator_name"),
+                    realm=result.get("realm"),
+                    nas_clients=result.get("nas_clients"),
                     created_at=result.get("created_at", datetime.utcnow()),
                     updated_at=result.get("updated_at")
                 )
@@ -210,6 +233,14 @@ class Query:
     async def agencies(self, info: Info) -> List[Agency]:
         return await get_agencies()
 
+    @strawberry.field
+    @login_required
+    async def agencies_connection(
+        self, info: Info, first: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None
+    ) -> Connection[Agency]:
+        """Agency rows newest first, ``first`` at a time after the ``after`` cursor"""
+        return await get_agencies_page(first, after)
+
     @strawberry.field
     @login_required
     async def agency(self, info: Info, id: str) -> Optional[Agency]:
@@ -1,34 +1,68 @@
+import asyncio
 import strawberry
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 from bson import ObjectId
 from ..config.database import db
-from ..schemas.customer_schemas import Customer, CustomerInput, CustomerUpdateInput, CustomerPackage, CustomerStation, AccountingData
+from ..schemas.customer_schemas import (
+    Customer, CustomerInput, CustomerUpdateInput, CustomerPackage, CustomerStation, AccountingData,
+    OnlineSession, OnlineCount
+)
 from ..schemas.notification_schemas import NotificationInput
 from ..routes.notification_routes import create_notification
 from ..utils.decorators import login_required, role_required
+from ..utils.expiry import expiry_fields
+from ..utils.loaders import Loaders, load_optional
 from strawberry.types import Info
+from ..utils.pagination import paginate, DEFAULT_PAGE_SIZE
+from ..utils.projection import selection, projection, projected
+from ..schemas.pagination_schemas import Connection
 
-async def get_customers(agency_id: Optional[str] = None) -> List[Customer]:
-    collection = db.get_collection("customers")
-    query = {"agency": agency_id} if agency_id else {}
-    customers_data = await collection.find(query).sort("created_at", -1).to_list(None)
-    
+# GraphQL field -> customers document key, for selection-set projections
+CUSTOMER_FIELDS = {
+    "id": "_id", "name": "name", "email": "email", "phone": "phone", "username": "username",
+    "address": "address", "agency": "agency", "package": "package", "station": "station",
+    "status": "status", "expiry": "expiry", "password": "password",
+    "createdAt": "created_at", "updatedAt": "updated_at"
+}
+# GraphQL field -> accounting / accounting_history document key
+ACCOUNTING_FIELDS = {
+    "username": "username", "sessionId": "session_id", "status": "status",
+    "sessionTime": "session_time", "inputOctets": "input_octets", "outputOctets": "output_octets",
+    "inputPackets": "input_packets", "outputPackets": "output_packets",
+    "inputGigawords": "input_gigawords", "outputGigawords": "output_gigawords",
+    "calledStationId": "called_station_id", "callingStationId": "calling_station_id",
+    "terminateCause": "terminate_cause", "nasIpAddress": "nas_ip_address",
+    "nasIdentifier": "nas_identifier", "nasPort": "nas_port", "nasPortType": "nas_port_type",
+    "serviceType": "service_type", "framedProtocol": "framed_protocol",
+    "framedIpAddress": "framed_ip_address", "idleTimeout": "idle_timeout",
+    "sessionTimeout": "session_timeout", "mikrotikRateLimit": "mikrotik_rate_limit",
+    "timestamp": "timestamp", "totalInputBytes": "total_input_bytes",
+    "totalOutputBytes": "total_output_bytes", "totalBytes": "total_bytes",
+    "inputMbytes": "input_mbytes", "outputMbytes": "output_mbytes", "totalMbytes": "total_mbytes",
+    "sessionTimeHours": "session_time_hours"
+}
+# History rows keep the username in the time-series metaField
+HISTORY_FIELDS = {**ACCOUNTING_FIELDS, "username": "meta.username"}
+ONLINE_SESSION_FIELDS = {
+    "username": "username", "sessionId": "session_id", "station": "station",
+    "nasIpAddress": "nas_ip_address", "framedIpAddress": "framed_ip_address",
+    "sessionTime": "session_time", "startTime": "start_time", "lastUpdate": "last_update"
+}
+
+async def customers_from_documents(customers_data: List[Dict], loaders: Optional[Loaders] = None) -> List[Customer]:
     # Get all unique package and station IDs
-    package_ids = {ObjectId(customer.get("package")) for customer in customers_data if customer.get("package")}
-    station_ids = {ObjectId(customer.get("station")) for customer in customers_data if customer.get("station")}
+    package_ids = list({customer["package"] for customer in customers_data if customer.get("package")})
+    station_ids = list({customer["station"] for customer in customers_data if customer.get("station")})
     
     # Fetch all packages and stations in one query each
-    packages = {}
-    stations = {}
-    
-    if package_ids:
-        packages_data = await db.get_collection("packages").find({"_id": {"$in": list(package_ids)}}).to_list(None)
-        packages = {str(package["_id"]): package for package in packages_data}
-    
-    if station_ids:
-        stations_data = await db.get_collection("stations").find({"_id": {"$in": list(station_ids)}}).to_list(None)
-        stations = {str(station["_id"]): station for station in stations_data}
+    loaders = loaders or Loaders()
+    packages_data, stations_data = await asyncio.gather(
+        loaders.packages.load_many(package_ids),
+        loaders.stations.load_many(station_ids)
+    )
+    packages = {key: package for key, package in zip(package_ids, packages_data) if package}
+    stations = {key: station for key, station in zip(station_ids, stations_data) if station}
     
     return [
         Customer(
@@ -58,33 +92,61 @@ async def get_customers(agency_id: Optional[str] = None) -> List[Customer]:
         ) for customer in customers_data
     ]
 
-async def get_customer(id: str) -> Optional[Customer]:
+async def get_customers(
+    agency_id: Optional[str] = None,
+    loaders: Optional[Loaders] = None,
+    fields: Optional[Dict[str, int]] = None
+) -> List[Customer]:
+    collection = db.get_collection("customers")
+    query = {"agency": agency_id} if agency_id else {}
+    customers_data = await collection.find(query, fields).sort("created_at", -1).to_list(None)
+    return await customers_from_documents([projected(customer, fields) for customer in customers_data], loaders)
+
+async def get_customers_page(
+    agency_id: Optional[str],
+    first: int,
+    after: Optional[str],
+    loaders: Optional[Loaders] = None,
+    fields: Optional[Dict[str, int]] = None
+) -> Connection[Customer]:
+    query = {"agency": agency_id} if agency_id else {}
+    page = await paginate(db.get_collection("customers"), query, first, after, fields)
+    customers_data = [projected(customer, fields) for customer in page.documents]
+    return page.connection(await customers_from_documents(customers_data, loaders))
+
+async def get_customer(
+    id: str,
+    loaders: Optional[Loaders] = None,
+    fields: Optional[Dict[str, int]] = None
+) -> Optional[Customer]:
     collection = db.get_collection("customers")
     try:
-        customer = await collection.find_one({"_id": ObjectId(id)})
+        customer = await collection.find_one({"_id": ObjectId(id)}, fields)
         if customer:
-            # Fetch package details if customer has a package
+            customer = projected(customer, fields)
+            # Package and station are fetched together, batched with the rest of the request
+            loaders = loaders or Loaders()
+            package_data, station_data = await asyncio.gather(
+                load_optional(loaders.packages, customer.get("package")),
+                load_optional(loaders.stations, customer.get("station"))
+            )
+
             package = None
-            if customer.get("package"):
-                package_data = await db.get_collection("packages").find_one({"_id": ObjectId(customer["package"])})
-                if package_data:
-                    package = CustomerPackage(
-                        id=str(package_data["_id"]),
-                        name=package_data["name"],
-                        serviceType=package_data["service_type"]
-                    )
+            if package_data:
+                package = CustomerPackage(
+                    id=str(package_data["_id"]),
+                    name=package_data["name"],
+                    serviceType=package_data["service_type"]
+                )
             
-            # Fetch station details if customer has a station
             station = None
-            if customer.get("station"):
-                station_data = await db.get_collection("stations").find_one({"_id": ObjectId(customer["station"])})
-                if station_data:
-                    station = CustomerStation(
-                        id=str(station_data["_id"]),
-                        name=station_data["name"],
-                        location=station_data["location"],
-                        address=station_data["address"]
-                    )
+            if station_data:
+                station = CustomerStation(
+                    id=str(station_data["_id"]),
+                    name=station_data["name"],
+                    location=station_data["location"],
+                    address=station_data["address"]
+                )
             
             return Customer(
                 id=str(customer["_id"]),
@@ -135,7 +197,7 @@ async def create_customer(customer_input: CustomerInput, agency_id: str, user_id
         "package": customer_input.package,
         "station": customer_input.station,
         "status": customer_input.status or "inactive",
-        "expiry": customer_input.expiry,
+        **expiry_fields(customer_input.expiry),
         "created_at": now,
         "updated_at": now
     }
@@ -221,6 +283,8 @@ async def update_customer(id: str, customer_input: CustomerUpdateInput, agency_i
         value = getattr(customer_input, field)
         if value is not None:
             update_data[field] = value
+    if "expiry" in update_data:
+        update_data.update(expiry_fields(update_data["expiry"]))
     
     try:
         result = await collection.find_one_and_update(
@@ -230,7 +294,7 @@ async def update_customer(id: str, customer_input: CustomerUpdateInput, agency_i
         )
         if result:
             # Create notification for customer update
-            changes = [field for field in update_data.keys() if field != "updated_at"]
+            changes = [field for field in update_data.keys() if field not in ("updated_at", "expiry_epoch")]
             if changes:
                 await create_notification(
                     NotificationInput(
@@ -316,11 +380,15 @@ async def delete_customer(id: str, agency_id: str, user_id: str) -> bool:
     except:
         return False
 
-async def get_customer_accounting(username: str) -> Optional[AccountingData]:
+async def get_customer_accounting(
+    username: str,
+    fields: Optional[Dict[str, int]] = None
+) -> Optional[AccountingData]:
     collection = db.get_collection("accounting")
     try:
-        accounting = await collection.find_one({"username": username})
+        accounting = await collection.find_one({"username": username}, fields)
         if accounting:
+            accounting = projected(accounting, fields)
             return AccountingData(
                 username=accounting["username"],
                 sessionId=accounting["session_id"],
@@ -359,16 +427,26 @@ async def get_customer_accounting(username: str) -> Optional[AccountingData]:
         return None
     return None
 
-async def get_customer_accounting_history(username: str) -> List[AccountingData]:
-    collection = db.get_collection("accounting")
+async def get_customer_accounting_history(
+    username: str,
+    limit: int = 100,
+    before: Optional[datetime] = None,
+    fields: Optional[Dict[str, int]] = None
+) -> List[AccountingData]:
+    # Per-packet history written by the radius service to a time-series
+    # collection; the (meta.username, timestamp) index serves filter and sort
+    collection = db.get_collection("accounting_history")
+    query = {"meta.username": username}
+    if before:
+        query["timestamp"] = {"$lt": before}
     try:
-        accounting_records = await collection.find(
-            {"username": username}
-        ).sort("timestamp", -1).to_list(None)
+        accounting_records = await collection.find(query, fields).sort(
+            "timestamp", -1
+        ).limit(min(limit, 1000)).to_list(None)
         
         return [
             AccountingData(
-                username=record["username"],
+                username=record["meta"]["username"],
                 sessionId=record["session_id"],
                 status=record["status"],
                 sessionTime=record["session_time"],
@@ -399,34 +477,124 @@ async def get_customer_accounting_history(username: str) -> List[AccountingData]
                 outputMbytes=record["output_mbytes"],
                 totalMbytes=record["total_mbytes"],
                 sessionTimeHours=record["session_time_hours"]
-            ) for record in accounting_records
+            ) for record in (projected(record, fields) for record in accounting_records)
         ]
     except Exception as e:
         print(f"Error fetching accounting history: {e}")
         return []
 
+# radius_sessions fields online counts can be grouped by
+ONLINE_GROUPS = {"station", "nas_ip_address", "package"}
+
+async def get_online_sessions(
+    agency_id: str,
+    station: Optional[str] = None,
+    nas_ip_address: Optional[str] = None,
+    limit: int = 100,
+    fields: Optional[Dict[str, int]] = None
+) -> List[OnlineSession]:
+    # Live sessions maintained by the radius service from accounting packets
+    collection = db.get_collection("radius_sessions")
+    query = {"agency": agency_id}
+    if station:
+        query["station"] = station
+    if nas_ip_address:
+        query["nas_ip_address"] = nas_ip_address
+    try:
+        sessions = await collection.find(query, fields).limit(min(limit, 1000)).to_list(None)
+        return [
+            OnlineSession(
+                username=session["username"],
+                sessionId=session["session_id"],
+                station=session.get("station"),
+                nasIpAddress=session["nas_ip_address"],
+                framedIpAddress=session["framed_ip_address"],
+                sessionTime=session["session_time"],
+                startTime=session["start_time"],
+                lastUpdate=session["last_update"]
+            ) for session in (projected(session, fields) for session in sessions)
+        ]
+    except Exception as e:
+        print(f"Error fetching online sessions: {e}")
+        return []
+
+async def get_online_counts(agency_id: str, group_by: str = "station") -> List[OnlineCount]:
+    if group_by not in ONLINE_GROUPS:
+        raise ValueError(f"group_by must be one of {', '.join(sorted(ONLINE_GROUPS))}")
+    collection = db.get_collection("radius_sessions")
+    try:
+        groups = await collection.aggregate([
+            {"$match": {"agency": agency_id}},
+            {"$group": {"_id": f"${group_by}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}}
+        ]).to_list(None)
+        return [OnlineCount(key=group["_id"], count=group["count"]) for group in groups]
+    except Exception as e:
+        print(f"Error counting online sessions: {e}")
+        return []
+
 @strawberry.type
 class Query:
     @strawberry.field
     @login_required
     async def customers(self, info: Info) -> List[Customer]:
         agency_id = info.context.user.get("agency")
-        return await get_customers(agency_id)
+        fields = projection(selection(info), CUSTOMER_FIELDS)
+        return await get_customers(agency_id, info.context.loaders, fields)
+
+    @strawberry.field
+    @login_required
+    async def customers_connection(
+        self, info: Info, first: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None
+    ) -> Connection[Customer]:
+        """Customer rows newest first, ``first`` at a time after the ``after`` cursor"""
+        agency_id = info.context.user.get("agency")
+        fields = projection(selection(info, "edges", "node"), CUSTOMER_FIELDS)
+        return await get_customers_page(agency_id, first, after, info.context.loaders, fields)
 
     @strawberry.field
     @login_required
     async def customer(self, info: Info, id: str) -> Optional[Customer]:
-        return await get_customer(id)
+        fields = projection(selection(info), CUSTOMER_FIELDS)
+        return await get_customer(id, info.context.loaders, fields)
 
     @strawberry.field
     @login_required
     async def customer_accounting(self, info: Info, username: str) -> Optional[AccountingData]:
-        return await get_customer_accounting(username)
+        fields = projection(selection(info), ACCOUNTING_FIELDS)
+        return await get_customer_accounting(username, fields)
 
     @strawberry.field
     @login_required
-    async def customer_accounting_history(self, info: Info, username: str) -> List[AccountingData]:
-        return await get_customer_accounting_history(username)
+    async def customer_accounting_history(
+        self,
+        info: Info,
+        username: str,
+        limit: int = 100,
+        before: Optional[datetime] = None
+    ) -> List[AccountingData]:
+        # The username lives in meta and is read for every row
+        fields = projection(selection(info), HISTORY_FIELDS, required=("meta.username",))
+        return await get_customer_accounting_history(username, limit, before, fields)
+
+    @strawberry.field
+    @login_required
+    async def online_sessions(
+        self,
+        info: Info,
+        station: Optional[str] = None,
+        nas_ip_address: Optional[str] = None,
+        limit: int = 100
+    ) -> List[OnlineSession]:
+        agency_id = info.context.user.get("agency")
+        fields = projection(selection(info), ONLINE_SESSION_FIELDS)
+        return await get_online_sessions(agency_id, station, nas_ip_address, limit, fields)
+
+    @strawberry.field
+    @login_required
+    async def online_counts(self, info: Info, group_by: str = "station") -> List[OnlineCount]:
+        agency_id = info.context.user.get("agency")
+        return await get_online_counts(agency_id, group_by)
 
 @strawberry.type
 class Mutation:
@@ -1,5 +1,5 @@
 import strawberry
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 from bson import ObjectId
 
@@ -9,24 +9,32 @@ from ..schemas.notification_schemas import NotificationInput
 from ..routes.notification_routes import create_notification
 from ..utils.decorators import login_required, role_required
 from strawberry.types import Info
+from ..utils.pagination import paginate, DEFAULT_PAGE_SIZE
+from ..schemas.pagination_schemas import Connection
+
+def employee_from_document(employee: Dict) -> Employee:
+    return Employee(
+        id=str(employee["_id"]),
+        name=employee["name"],
+        email=employee["email"],
+        username=employee["username"],
+        phone=employee["phone"],
+        role=employee["role"],
+        agency=employee["agency"],
+        createdAt=employee.get("created_at", datetime.utcnow()),
+        updatedAt=employee.get("updated_at")
+    )
 
 async def get_staff_members(agency_id: Optional[str] = None) -> List[Employee]:
     collection = db.get_collection("employees")
     query = {"agency": agency_id} if agency_id else {}
     employees_data = await collection.find(query).sort("created_at", -1).to_list(None)
-    return [
-        Employee(
-            id=str(employee["_id"]),
-            name=employee["name"],
-            email=employee["email"],
-            username=employee["username"],
-            phone=employee["phone"],
-            role=employee["role"],
-            agency=employee["agency"],
-            createdAt=employee.get("created_at", datetime.utcnow()),
-            updatedAt=employee.get("updated_at")
-        ) for employee in employees_data
-    ]
+    return [employee_from_document(employee) for employee in employees_data]
+
+async def get_staff_members_page(agency_id: Optional[str], first: int, after: Optional[str]) -> Connection[Employee]:
+    query = {"agency": agency_id} if agency_id else {}
+    page = await paginate(db.get_collection("employees"), query, first, after)
+    return page.connection([employee_from_document(employee) for employee in page.documents])
 
 async def get_staff_member(id: str) -> Optional[Employee]:
     collection = db.get_collection("employees")
@@ -180,6 +188,16 @@ class Query:
         agency_id = info.context.user.get("agency")
         return await get_staff_members(agency_id)
 
+    @strawberry.field(name="staffMembersConnection")
+    @login_required
+    @role_required("admin")
+    async def staff_members_connection(
+        self, info: Info, first: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None
+    ) -> Connection[Employee]:
+        """Employee rows newest first, ``first`` at a time after the ``after`` cursor"""
+        agency_id = info.context.user.get("agency")
+        return await get_staff_members_page(agency_id, first, after)
+
     @strawberry.field(name="staffMember")
     @login_required
     @role_required("admin")
@@ -1,5 +1,5 @@
 import strawberry
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 from bson import ObjectId
 
@@ -9,24 +9,32 @@ from ..schemas.notification_schemas import NotificationInput
 from ..routes.notification_routes import create_notification
 from ..utils.decorators import login_required, role_required
 from strawberry.types import Info
+from ..utils.pagination import paginate, DEFAULT_PAGE_SIZE
+from ..schemas.pagination_schemas import Connection
+
+def inventory_from_document(inventory: Dict) -> Inventory:
+    return Inventory(
+        id=str(inventory["_id"]),
+        name=inventory["name"],
+        description=inventory["description"],
+        price=inventory["price"],
+        stock=inventory["stock"],
+        category=inventory["category"],
+        agency=inventory["agency"],
+        created_at=inventory.get("created_at", datetime.utcnow()),
+        updated_at=inventory.get("updated_at")
+    )
 
 async def get_inventories(agency_id: Optional[str] = None) -> List[Inventory]:
     collection = db.get_collection("inventories")
     query = {"agency": agency_id} if agency_id else {}
     inventories_data = await collection.find(query).sort("created_at", -1).to_list(None)
-    return [
-        Inventory(
-            id=str(inventory["_id"]),
-            name=inventory["name"],
-            description=inventory["description"],
-            price=inventory["price"],
-            stock=inventory["stock"],
-            category=inventory["category"],
-            agency=inventory["agency"],
-            created_at=inventory.get("created_at", datetime.utcnow()),
-            updated_at=inventory.get("updated_at")
-        ) for inventory in inventories_data
-    ]
+    return [inventory_from_document(inventory) for inventory in inventories_data]
+
+async def get_inventories_page(agency_id: Optional[str], first: int, after: Optional[str]) -> Connection[Inventory]:
+    query = {"agency": agency_id} if agency_id else {}
+    page = await paginate(db.get_collection("inventories"), query, first, after)
+    return page.connection([inventory_from_document(inventory) for inventory in page.documents])
 
 async def get_inventory(id: str) -> Optional[Inventory]:
     collection = db.get_collection("inventories")
@@ -185,6 +193,15 @@ class Query:
         agency_id = info.context.user.get("agency")
         return await get_inventories(agency_id)
 
+    @strawberry.field
+    @login_required
+    async def inventories_connection(
+        self, info: Info, first: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None
+    ) -> Connection[Inventory]:
+        """Inventory rows newest first, ``first`` at a time after the ``after`` cursor"""
+        agency_id = info.context.user.get("agency")
+        return await get_inventories_page(agency_id, first, after)
+
     @strawberry.field
     @login_required
     async def inventory(self, info: Info, id: str) -> Optional[Inventory]:
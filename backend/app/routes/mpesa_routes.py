@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from bson import ObjectId
 from ..config.database import db
 from ..utils.decorators import login_required
+from ..utils.expiry import expiry_fields
 from ..utils.mpesa import MpesaIntegration
 from ..schemas.mpesa_schemas import (
     MpesaTransaction, TransactionFilter, TransactionStatus, 
@@ -12,6 +13,8 @@ from ..schemas.mpesa_schemas import (
 from ..schemas.notification_schemas import NotificationInput
 from ..routes.notification_routes import create_notification
 from strawberry.types import Info
+from ..utils.pagination import paginate, DEFAULT_PAGE_SIZE
+from ..schemas.pagination_schemas import Connection
 
 @strawberry.input
 class MpesaTransactionInput:
@@ -101,7 +104,7 @@ async def update_customer_subscription(
         {
             "$set": {
                 "package": package_id,
-                "expiry": new_expiry,
+                **expiry_fields(new_expiry),
                 "status": "active",
                 "updated_at": now
             }
@@ -199,6 +202,73 @@ async def handle_timeout(data: Dict[str, Any]) -> Dict[str, Any]:
     """Handle M-Pesa timeout callback."""
     return await process_mpesa_callback(data, TransactionStatus.TIMEOUT)
 
+def transaction_query(agency_id: str, filter: Optional[TransactionFilter]) -> Dict:
+    """Mongo filter for a TransactionFilter, always scoped to the caller's agency"""
+    if filter is None:
+        filter = TransactionFilter(agency_id=agency_id)
+    else:
+        filter.agency_id = agency_id
+
+    query = {}
+    if filter.agency_id:
+        query["agency_id"] = filter.agency_id
+    if filter.type:
+        query["type"] = filter.type
+    if filter.status:
+        query["status"] = filter.status
+    if filter.reference:
+        query["reference"] = filter.reference
+    if filter.phone:
+        query["phone"] = filter.phone
+    if filter.mpesa_receipt:
+        query["mpesa_receipt"] = filter.mpesa_receipt
+    
+    # Date range filter
+    date_query = {}
+    if filter.start_date:
+        date_query["$gte"] = filter.start_date
+    if filter.end_date:
+        date_query["$lte"] = filter.end_date
+    if date_query:
+        query["created_at"] = date_query
+    return query
+
+async def transactions_from_documents(transactions_data: List[Dict]) -> List[MpesaTransaction]:
+    # Get all unique customer IDs
+    customer_ids = {ObjectId(t["customer_id"]) for t in transactions_data if t.get("customer_id")}
+    
+    # Fetch all customers in one query
+    customers = {}
+    if customer_ids:
+        customers_data = await db.get_collection("customers").find({"_id": {"$in": list(customer_ids)}}).to_list(None)
+        customers = {str(customer["_id"]): customer for customer in customers_data}
+    
+    return [
+        MpesaTransaction(
+            id=str(t["_id"]),
+            agency_id=t["agency_id"],
+            customer_id=t.get("customer_id"),
+            customer_username=customers.get(t.get("customer_id", ""), {}).get("username"),
+            type=t["type"],
+            amount=t["amount"],
+            phone=t.get("phone"),
+            reference=t["reference"],
+            remarks=t.get("remarks"),
+            status=t["status"],
+            mpesa_receipt=t.get("mpesa_receipt"),
+            receiver_shortcode=t.get("receiver_shortcode"),
+            response_data=t.get("response_data"),
+            created_at=t["created_at"],
+            completed_at=t.get("completed_at"),
+            updated_at=t.get("updated_at"),
+            package_id=t.get("package_id"),
+            months=t.get("months"),
+            command_id=t.get("command_id"),
+            conversation_id=t.get("conversation_id"),
+            originator_conversation_id=t.get("originator_conversation_id")
+        ) for t in transactions_data
+    ]
+
 # GraphQL Queries and Mutations
 @strawberry.type
 class Query:
@@ -212,73 +282,28 @@ class Query:
         if not agency_id:
             raise Exception("Agency ID not found")
             
-        if filter is None:
-            filter = TransactionFilter(agency_id=agency_id)
-        else:
-            filter.agency_id = agency_id
-            
-        transactions = db.get_collection("mpesa_transactions")
-        query = {}
-        
-        if filter.agency_id:
-            query["agency_id"] = filter.agency_id
-        if filter.type:
-            query["type"] = filter.type
-        if filter.status:
-            query["status"] = filter.status
-        if filter.reference:
-            query["reference"] = filter.reference
-        if filter.phone:
-            query["phone"] = filter.phone
-        if filter.mpesa_receipt:
-            query["mpesa_receipt"] = filter.mpesa_receipt
-        
-        # Date range filter
-        date_query = {}
-        if filter.start_date:
-            date_query["$gte"] = filter.start_date
-        if filter.end_date:
-            date_query["$lte"] = filter.end_date
-        if date_query:
-            query["created_at"] = date_query
-        
-        cursor = transactions.find(query).sort("created_at", -1)
+        query = transaction_query(agency_id, filter)
+        cursor = db.get_collection("mpesa_transactions").find(query).sort("created_at", -1)
         transactions_data = await cursor.to_list(None)
-        
-        # Get all unique customer IDs
-        customer_ids = {ObjectId(t["customer_id"]) for t in transactions_data if t.get("customer_id")}
-        
-        # Fetch all customers in one query
-        customers = {}
-        if customer_ids:
-            customers_data = await db.get_collection("customers").find({"_id": {"$in": list(customer_ids)}}).to_list(None)
-            customers = {str(customer["_id"]): customer for customer in customers_data}
-        
-        return [
-            MpesaTransaction(
-                id=str(t["_id"]),
-                agency_id=t["agency_id"],
-                customer_id=t.get("customer_id"),
-                customer_username=customers.get(t.get("customer_id", ""), {}).get("username"),
-                type=t["type"],
-                amount=t["amount"],
-                phone=t.get("phone"),
-                reference=t["reference"],
-                remarks=t.get("remarks"),
-                status=t["status"],
-                mpesa_receipt=t.get("mpesa_receipt"),
-                receiver_shortcode=t.get("receiver_shortcode"),
-                response_data=t.get("response_data"),
-                created_at=t["created_at"],
-                completed_at=t.get("completed_at"),
-                updated_at=t.get("updated_at"),
-                package_id=t.get("package_id"),
-                months=t.get("months"),
-                command_id=t.get("command_id"),
-                conversation_id=t.get("conversation_id"),
-                originator_conversation_id=t.get("originator_conversation_id")
-            ) for t in transactions_data
-        ]
+        return await transactions_from_documents(transactions_data)
+
+    @strawberry.field
+    @login_required
+    async def mpesa_transactions_connection(
+        self,
+        info: Info,
+        filter: Optional[TransactionFilter] = None,
+        first: int = DEFAULT_PAGE_SIZE,
+        after: Optional[str] = None
+    ) -> Connection[MpesaTransaction]:
+        """M-Pesa transactions newest first, ``first`` at a time after the ``after`` cursor"""
+        agency_id = info.context.user.get("agency")
+        if not agency_id:
+            raise Exception("Agency ID not found")
+
+        query = transaction_query(agency_id, filter)
+        page = await paginate(db.get_collection("mpesa_transactions"), query, first, after)
+        return page.connection(await transactions_from_documents(page.documents))
 
 @strawberry.type
 class Mutation:
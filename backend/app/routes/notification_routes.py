@@ -1,3 +1,4 @@
+import asyncio
 import strawberry
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
@@ -5,6 +6,9 @@ from bson import ObjectId
 from ..config.database import db
 from ..schemas.notification_schemas import Notification, NotificationInput, NotificationUpdateInput
 from ..utils.decorators import login_required
+from ..utils.loaders import Loaders
+from ..utils.pagination import paginate
+from ..schemas.pagination_schemas import Connection
 from strawberry.types import Info
 
 # Constants for optimization
@@ -36,24 +40,48 @@ async def cleanup_old_notifications(agency_id: str) -> None:
             old_ids = [n["_id"] for n in old_notifications]
             await collection.delete_many({"_id": {"$in": old_ids}})
 
-async def get_user_name(user_id: str) -> Optional[str]:
-    """Get user name from users collection."""
-    try:
-        users = db.get_collection("users")
-        user = await users.find_one({"_id": ObjectId(user_id)})
-        if user:
-            # Return the name if available, otherwise return username
-            return user.get("name") or user.get("username")
-    except:
-        pass
+async def get_user_name(user_id: str, loaders: Optional[Loaders] = None) -> Optional[str]:
+    """Get user name from users collection; batched with other loads on ``loaders``."""
+    user = await (loaders or Loaders()).users.load(user_id)
+    if user:
+        # Return the name if available, otherwise return username
+        return user.get("name") or user.get("username")
     return None
 
+async def notifications_from_documents(
+    notifications_data: List[Dict],
+    loaders: Optional[Loaders] = None
+) -> List[Notification]:
+    # Get user names for all notifications in one query
+    loaders = loaders or Loaders()
+    user_ids = list({notification["user_id"] for notification in notifications_data if notification.get("user_id")})
+    names = await asyncio.gather(*(get_user_name(user_id, loaders) for user_id in user_ids))
+    user_names = dict(zip(user_ids, names))
+    
+    return [
+        Notification(
+            id=str(notification["_id"]),
+            type=notification["type"],
+            title=notification["title"],
+            message=notification["message"],
+            entity_id=notification.get("entity_id"),
+            entity_type=notification.get("entity_type"),
+            agency=notification["agency"],
+            user_id=notification["user_id"],
+            user_name=user_names.get(notification["user_id"]),  # Include user name
+            is_read=notification["is_read"],
+            createdAt=notification.get("created_at", datetime.utcnow()),
+            updatedAt=notification.get("updated_at")
+        ) for notification in notifications_data
+    ]
+
 async def get_notifications(
     agency_id: str,
     user_id: str,
     page: int = 1,
     per_page: int = NOTIFICATIONS_PER_PAGE,
-    filter_read: Optional[bool] = None
+    filter_read: Optional[bool] = None,
+    loaders: Optional[Loaders] = None
 ) -> List[Notification]:
     """Get paginated notifications for an agency with optional read/unread filter."""
     collection = db.get_collection("notifications")
@@ -73,37 +101,34 @@ async def get_notifications(
         "created_at", -1
     ).skip(skip).limit(per_page).to_list(None)
     
-    # Get user names for all notifications
-    user_names = {}
-    for notification in notifications_data:
-        if notification.get("user_id") and notification["user_id"] not in user_names:
-            user_names[notification["user_id"]] = await get_user_name(notification["user_id"])
-    
-    return [
-        Notification(
-            id=str(notification["_id"]),
-            type=notification["type"],
-            title=notification["title"],
-            message=notification["message"],
-            entity_id=notification.get("entity_id"),
-            entity_type=notification.get("entity_type"),
-            agency=notification["agency"],
-            user_id=notification["user_id"],
-            user_name=user_names.get(notification["user_id"]),  # Include user name
-            is_read=notification["is_read"],
-            createdAt=notification.get("created_at", datetime.utcnow()),
-            updatedAt=notification.get("updated_at")
-        ) for notification in notifications_data
-    ]
+    return await notifications_from_documents(notifications_data, loaders)
+
+async def get_notifications_page(
+    agency_id: str,
+    first: int,
+    after: Optional[str],
+    filter_read: Optional[bool] = None,
+    loaders: Optional[Loaders] = None
+) -> Connection[Notification]:
+    """Keyset-paginated notifications; unlike ``page`` it does not slow down as you go deeper."""
+    query = {"agency": agency_id}
+    if filter_read is not None:
+        query["is_read"] = filter_read
+    page = await paginate(db.get_collection("notifications"), query, first, after)
+    return page.connection(await notifications_from_documents(page.documents, loaders))
 
-async def get_notification(id: str, user_id: Optional[str] = None) -> Optional[Notification]:
+async def get_notification(
+    id: str,
+    user_id: Optional[str] = None,
+    loaders: Optional[Loaders] = None
+) -> Optional[Notification]:
     collection = db.get_collection("notifications")
     try:
         query = {"_id": ObjectId(id)}
         notification = await collection.find_one(query)
         if notification:
             # Get user name
-            user_name = await get_user_name(notification["user_id"]) if notification.get("user_id") else None
+            user_name = await get_user_name(notification["user_id"], loaders) if notification.get("user_id") else None
             
             return Notification(
                 id=str(notification["_id"]),
@@ -246,12 +271,27 @@ class Query:
         filter_read: Optional[bool] = None
     ) -> List[Notification]:
         agency_id = info.context.user.get("agency")
-        return await get_notifications(agency_id, user_id, page, NOTIFICATIONS_PER_PAGE, filter_read)
+        return await get_notifications(
+            agency_id, user_id, page, NOTIFICATIONS_PER_PAGE, filter_read, info.context.loaders
+        )
+
+    @strawberry.field
+    @login_required
+    async def notifications_connection(
+        self,
+        info: Info,
+        first: int = NOTIFICATIONS_PER_PAGE,
+        after: Optional[str] = None,
+        filter_read: Optional[bool] = None
+    ) -> Connection[Notification]:
+        """Notifications newest first, ``first`` at a time after the ``after`` cursor"""
+        agency_id = info.context.user.get("agency")
+        return await get_notifications_page(agency_id, first, after, filter_read, info.context.loaders)
 
     @strawberry.field
     @login_required
     async def notification(self, info: Info, id: str, user_id: str) -> Optional[Notification]:
-        return await get_notification(id, user_id)
+        return await get_notification(id, user_id, info.context.loaders)
         
     @strawberry.field
     @login_required
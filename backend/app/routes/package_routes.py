@@ -1,5 +1,5 @@
 import strawberry
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 from bson import ObjectId
 from ..config.database import db
@@ -8,40 +8,48 @@ from ..schemas.notification_schemas import NotificationInput
 from ..routes.notification_routes import create_notification
 from ..utils.decorators import login_required, role_required
 from strawberry.types import Info
+from ..utils.pagination import paginate, DEFAULT_PAGE_SIZE
+from ..schemas.pagination_schemas import Connection
+
+def package_from_document(package: Dict) -> Package:
+    return Package(
+        id=str(package["_id"]),
+        name=package["name"],
+        price=package["price"],
+        # Network settings
+        downloadSpeed=package["download_speed"],
+        uploadSpeed=package["upload_speed"],
+        # Burst configuration
+        burstDownload=package.get("burst_download"),
+        burstUpload=package.get("burst_upload"),
+        thresholdDownload=package.get("threshold_download"),
+        thresholdUpload=package.get("threshold_upload"),
+        burstTime=package.get("burst_time"),
+        # MikroTik service configuration
+        serviceType=package.get("service_type"),
+        addressPool=package.get("address_pool"),
+        # Session management
+        sessionTimeout=package.get("session_timeout"),
+        idleTimeout=package.get("idle_timeout"),
+        # QoS and VLAN
+        priority=package.get("priority"),
+        vlanId=package.get("vlan_id"),
+        # Administrative
+        agency=package["agency"],
+        createdAt=package.get("created_at", datetime.utcnow()),
+        updatedAt=package.get("updated_at")
+    )
 
 async def get_packages(agency_id: Optional[str] = None) -> List[Package]:
     collection = db.get_collection("packages")
     query = {"agency": agency_id} if agency_id else {}
     packages_data = await collection.find(query).sort("created_at", -1).to_list(None)
-    return [
-        Package(
-            id=str(package["_id"]),
-            name=package["name"],
-            price=package["price"],
-            # Network settings
-            downloadSpeed=package["download_speed"],
-            uploadSpeed=package["upload_speed"],
-            # Burst configuration
-            burstDownload=package.get("burst_download"),
-            burstUpload=package.get("burst_upload"),
-            thresholdDownload=package.get("threshold_download"),
-            thresholdUpload=package.get("threshold_upload"),
-            burstTime=package.get("burst_time"),
-            # MikroTik service configuration
-            serviceType=package.get("service_type"),
-            addressPool=package.get("address_pool"),
-            # Session management
-            sessionTimeout=package.get("session_timeout"),
-            idleTimeout=package.get("idle_timeout"),
-            # QoS and VLAN
-            priority=package.get("priority"),
-            vlanId=package.get("vlan_id"),
-            # Administrative
-            agency=package["agency"],
-            createdAt=package.get("created_at", datetime.utcnow()),
-            updatedAt=package.get("updated_at")
-        ) for package in packages_data
-    ]
+    return [package_from_document(package) for package in packages_data]
+
+async def get_packages_page(agency_id: Optional[str], first: int, after: Optional[str]) -> Connection[Package]:
+    query = {"agency": agency_id} if agency_id else {}
+    page = await paginate(db.get_collection("packages"), query, first, after)
+    return page.connection([package_from_document(package) for package in page.documents])
 
 async def get_package(id: str) -> Optional[Package]:
     collection = db.get_collection("packages")
@@ -277,6 +285,15 @@ class Query:
         agency_id = info.context.user.get("agency")
         return await get_packages(agency_id)
 
+    @strawberry.field
+    @login_required
+    async def packages_connection(
+        self, info: Info, first: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None
+    ) -> Connection[Package]:
+        """Package rows newest first, ``first`` at a time after the ``after`` cursor"""
+        agency_id = info.context.user.get("agency")
+        return await get_packages_page(agency_id, first, after)
+
     @strawberry.field
     @login_required
     async def package(self, info: Info, id: str) -> Optional[Package]:
@@ -1,5 +1,5 @@
 import strawberry
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 from bson import ObjectId
 from ..config.database import db
@@ -8,40 +8,52 @@ from ..schemas.notification_schemas import NotificationInput
 from ..routes.notification_routes import create_notification
 from ..utils.decorators import login_required, role_required
 from strawberry.types import Info
+from ..utils.pagination import paginate, DEFAULT_PAGE_SIZE
+from ..schemas.pagination_schemas import Connection
+
+def station_from_document(station: Dict, total_customers: int) -> Station:
+    return Station(
+        id=str(station["_id"]),
+        name=station["name"],
+        location=station["location"],
+        address=station["address"],
+        coordinates=station.get("coordinates"),
+        buildingType=station["building_type"],
+        totalCustomers=total_customers,
+        contactPerson=station.get("contact_person"),
+        contactPhone=station.get("contact_phone"),
+        notes=station.get("notes"),
+        agency=station["agency"],
+        status=station.get("status", "active"),
+        createdAt=station.get("created_at", datetime.utcnow()),
+        updatedAt=station.get("updated_at")
+    )
+
+async def get_customer_counts(stations_data: List[Dict]) -> Dict[str, int]:
+    """Customers per station id, in one aggregation over the station index"""
+    station_ids = [str(station["_id"]) for station in stations_data]
+    if not station_ids:
+        return {}
+    counts = await db.get_collection("customers").aggregate([
+        {"$match": {"station": {"$in": station_ids}}},
+        {"$group": {"_id": "$station", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    return {count["_id"]: count["count"] for count in counts}
 
 async def get_stations(agency_id: Optional[str] = None) -> List[Station]:
     collection = db.get_collection("stations")
-    customers_collection = db.get_collection("customers")
     query = {"agency": agency_id} if agency_id else {}
     stations_data = await collection.find(query).sort("created_at", -1).to_list(None)
-    
-    # Get customer counts for each station
-    stations_with_counts = []
-    for station in stations_data:
-        customer_count = await customers_collection.count_documents({"station": str(station["_id"])})
-        stations_with_counts.append({
-            **station,
-            "total_customers": customer_count
-        })
-    
-    return [
-        Station(
-            id=str(station["_id"]),
-            name=station["name"],
-            location=station["location"],
-            address=station["address"],
-            coordinates=station.get("coordinates"),
-            buildingType=station["building_type"],
-            totalCustomers=station["total_customers"],
-            contactPerson=station.get("contact_person"),
-            contactPhone=station.get("contact_phone"),
-            notes=station.get("notes"),
-            agency=station["agency"],
-            status=station.get("status", "active"),
-            createdAt=station.get("created_at", datetime.utcnow()),
-            updatedAt=station.get("updated_at")
-        ) for station in stations_with_counts
-    ]
+    counts = await get_customer_counts(stations_data)
+    return [station_from_document(station, counts.get(str(station["_id"]), 0)) for station in stations_data]
+
+async def get_stations_page(agency_id: Optional[str], first: int, after: Optional[str]) -> Connection[Station]:
+    query = {"agency": agency_id} if agency_id else {}
+    page = await paginate(db.get_collection("stations"), query, first, after)
+    counts = await get_customer_counts(page.documents)
+    return page.connection([
+        station_from_document(station, counts.get(str(station["_id"]), 0)) for station in page.documents
+    ])
 
 async def get_station(id: str) -> Optional[Station]:
     collection = db.get_collection("stations")
@@ -252,6 +264,15 @@ class Query:
         agency_id = info.context.user.get("agency")
         return await get_stations(agency_id)
 
+    @strawberry.field
+    @login_required
+    async def stations_connection(
+        self, info: Info, first: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None
+    ) -> Connection[Station]:
+        """Station rows newest first, ``first`` at a time after the ``after`` cursor"""
+        agency_id = info.context.user.get("agency")
+        return await get_stations_page(agency_id, first, after)
+
     @strawberry.field
     @login_required
     async def station(self, info: Info, id: str) -> Optional[Station]:
@@ -1,48 +1,48 @@
 from ..config.database import db
 from ..schemas.subscription_schema import Subscription, SubscriptionInput, SubscriptionUpdateInput
-from ..schemas.service_schemas import Service
-from ..schemas.user_schema import User
-from typing import List, Optional
+from ..schemas.service_schemas import Service, Tier
+from typing import Dict, List, Optional
 from datetime import datetime
 import strawberry
 from bson import ObjectId
 from ..utils.decorators import login_required, role_required, has_role
 from strawberry.types import Info
 
+def service_from_document(service: Dict) -> Service:
+    return Service(
+        id=str(service["_id"]),
+        name=service["name"],
+        tiers=[
+            Tier(
+                name=tier["name"],
+                price=tier["price"],
+                features=tier["features"]
+            ) for tier in service["tiers"]
+        ],
+        created_at=service.get("created_at", datetime.utcnow()),
+        updated_at=service.get("updated_at")
+    )
+
+def subscription_from_document(sub: Dict) -> Subscription:
+    # service and user are resolved per field through the request's loaders
+    return Subscription(
+        id=str(sub["_id"]),
+        user_id=sub["user_id"],
+        service_id=sub["service_id"],
+        tier_name=sub["tier_name"],
+        status=sub["status"],
+        start_date=sub["start_date"],
+        end_date=sub.get("end_date"),
+        created_at=sub.get("created_at", datetime.utcnow()),
+        updated_at=sub.get("updated_at")
+    )
+
 async def get_service_by_id(service_id: str) -> Optional[Service]:
     collection = db.get_collection("services")
     try:
         service = await collection.find_one({"_id": ObjectId(service_id)})
         if service:
-            return Service(
-                id=str(service["_id"]),
-                name=service["name"],
-                tiers=service["tiers"],
-                created_at=service.get("created_at"),
-                updated_at=service.get("updated_at")
-            )
-    except:
-        return None
-    return None
-
-async def get_user_by_id(user_id: str) -> Optional[User]:
-    collection = db.get_collection("users")
-    try:
-        user = await collection.find_one({"_id": ObjectId(user_id)})
-        if user:
-            return User(
-                id=str(user["_id"]),
-                name=user["name"],
-                email=user["email"],
-                roles=user.get("roles", ["user"]),
-                address=user.get("address"),
-                phone=user.get("phone"),
-                agency=user.get("agency"),
-                is_verified=user.get("is_verified", False),
-                created_at=user.get("created_at"),
-                updated_at=user.get("updated_at"),
-                is_active=user.get("is_active", True)
-            )
+            return service_from_document(service)
     except:
         return None
     return None
@@ -50,47 +50,14 @@ async def get_user_by_id(user_id: str) -> Optional[User]:
 async def get_subscriptions() -> List[Subscription]:
     collection = db.get_collection("subscriptions")
     subscriptions_data = await collection.find({}).to_list(None)
-    subscriptions = []
-    
-    for sub in subscriptions_data:
-        subscription = Subscription(
-            id=str(sub["_id"]),
-            user_id=sub["user_id"],
-            service_id=sub["service_id"],
-            tier_name=sub["tier_name"],
-            status=sub["status"],
-            start_date=sub["start_date"],
-            end_date=sub.get("end_date"),
-            created_at=sub.get("created_at", datetime.utcnow()),
-            updated_at=sub.get("updated_at")
-        )
-        # Resolve related fields
-        subscription.service = await get_service_by_id(sub["service_id"])
-        subscription.user = await get_user_by_id(sub["user_id"])
-        subscriptions.append(subscription)
-    
-    return subscriptions
+    return [subscription_from_document(sub) for sub in subscriptions_data]
 
 async def get_subscription(id: str) -> Optional[Subscription]:
     collection = db.get_collection("subscriptions")
     try:
         sub = await collection.find_one({"_id": ObjectId(id)})
         if sub:
-            subscription = Subscription(
-                id=str(sub["_id"]),
-                user_id=sub["user_id"],
-                service_id=sub["service_id"],
-                tier_name=sub["tier_name"],
-                status=sub["status"],
-                start_date=sub["start_date"],
-                end_date=sub.get("end_date"),
-                created_at=sub.get("created_at", datetime.utcnow()),
-                updated_at=sub.get("updated_at")
-            )
-            # Resolve related fields
-            subscription.service = await get_service_by_id(sub["service_id"])
-            subscription.user = await get_user_by_id(sub["user_id"])
-            return subscription
+            return subscription_from_document(sub)
     except:
         return None
     return None
@@ -98,26 +65,7 @@ async def get_subscription(id: str) -> Optional[Subscription]:
 async def get_user_subscriptions(user_id: str) -> List[Subscription]:
     collection = db.get_collection("subscriptions")
     subscriptions_data = await collection.find({"user_id": user_id}).to_list(None)
-    subscriptions = []
-    
-    for sub in subscriptions_data:
-        subscription = Subscription(
-            id=str(sub["_id"]),
-            user_id=sub["user_id"],
-            service_id=sub["service_id"],
-            tier_name=sub["tier_name"],
-            status=sub["status"],
-            start_date=sub["start_date"],
-            end_date=sub.get("end_date"),
-            created_at=sub.get("created_at", datetime.utcnow()),
-            updated_at=sub.get("updated_at")
-        )
-        # Resolve related fields
-        subscription.service = await get_service_by_id(sub["service_id"])
-        subscription.user = await get_user_by_id(sub["user_id"])
-        subscriptions.append(subscription)
-    
-    return subscriptions
+    return [subscription_from_document(sub) for sub in subscriptions_data]
 
 async def create_subscription(user_id: str, subscription_input: SubscriptionInput) -> Subscription:
     collection = db.get_collection("subscriptions")
@@ -142,14 +90,10 @@ async def create_subscription(user_id: str, subscription_input: SubscriptionInpu
         "updated_at": now
     }
     
-    result = await collection.insert_one(subscription_data)
-    subscription_data["id"] = str(result.inserted_id)
-    
-    subscription = Subscription(**subscription_data)
-    subscription.service = service
-    subscription.user = await get_user_by_id(user_id)
+    # insert_one sets subscription_data["_id"]
+    await collection.insert_one(subscription_data)
     
-    return subscription
+    return subscription_from_document(subscription_data)
 
 async def update_subscription(id: str, subscription_update: SubscriptionUpdateInput) -> Optional[Subscription]:
     collection = db.get_collection("subscriptions")
@@ -170,20 +114,7 @@ async def update_subscription(id: str, subscription_update: SubscriptionUpdateIn
                 return_document=True
             )
             if result:
-                subscription = Subscription(
-                    id=str(result["_id"]),
-                    user_id=result["user_id"],
-                    service_id=result["service_id"],
-                    tier_name=result["tier_name"],
-                    status=result["status"],
-                    start_date=result["start_date"],
-                    end_date=result.get("end_date"),
-                    created_at=result.get("created_at", datetime.utcnow()),
-                    updated_at=result.get("updated_at")
-                )
-                subscription.service = await get_service_by_id(result["service_id"])
-                subscription.user = await get_user_by_id(result["user_id"])
-                return subscription
+                return subscription_from_document(result)
     except:
         return None
     return None
@@ -1,5 +1,5 @@
 import strawberry
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 from bson import ObjectId
 from ..config.database import db
@@ -8,25 +8,33 @@ from ..schemas.notification_schemas import NotificationInput
 from ..routes.notification_routes import create_notification
 from ..utils.decorators import login_required, role_required
 from strawberry.types import Info
+from ..utils.pagination import paginate, DEFAULT_PAGE_SIZE
+from ..schemas.pagination_schemas import Connection
+
+def ticket_from_document(ticket: Dict) -> Ticket:
+    return Ticket(
+        id=str(ticket["_id"]),
+        customer=ticket["customer"],
+        assignedEmployee=ticket.get("assigned_employee"),
+        status=ticket["status"],
+        title=ticket["title"],
+        description=ticket["description"],
+        priority=ticket["priority"],
+        agency=ticket["agency"],
+        createdAt=ticket.get("created_at", datetime.utcnow()),
+        updatedAt=ticket.get("updated_at")
+    )
 
 async def get_tickets(agency_id: Optional[str] = None) -> List[Ticket]:
     collection = db.get_collection("tickets")
     query = {"agency": agency_id} if agency_id else {}
     tickets_data = await collection.find(query).sort("created_at", -1).to_list(None)
-    return [
-        Ticket(
-            id=str(ticket["_id"]),
-            customer=ticket["customer"],
-            assignedEmployee=ticket.get("assigned_employee"),
-            status=ticket["status"],
-            title=ticket["title"],
-            description=ticket["description"],
-            priority=ticket["priority"],
-            agency=ticket["agency"],
-            createdAt=ticket.get("created_at", datetime.utcnow()),
-            updatedAt=ticket.get("updated_at")
-        ) for ticket in tickets_data
-    ]
+    return [ticket_from_document(ticket) for ticket in tickets_data]
+
+async def get_tickets_page(agency_id: Optional[str], first: int, after: Optional[str]) -> Connection[Ticket]:
+    query = {"agency": agency_id} if agency_id else {}
+    page = await paginate(db.get_collection("tickets"), query, first, after)
+    return page.connection([ticket_from_document(ticket) for ticket in page.documents])
 
 async def get_ticket(id: str) -> Optional[Ticket]:
     collection = db.get_collection("tickets")
@@ -203,6 +211,15 @@ class Query:
         agency_id = info.context.user.get("agency")
         return await get_tickets(agency_id)
 
+    @strawberry.field
+    @login_required
+    async def tickets_connection(
+        self, info: Info, first: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None
+    ) -> Connection[Ticket]:
+        """Ticket rows newest first, ``first`` at a time after the ``after`` cursor"""
+        agency_id = info.context.user.get("agency")
+        return await get_tickets_page(agency_id, first, after)
+
     @strawberry.field
     @login_required
     async def ticket(self, info: Info, id: str) -> Optional[Ticket]:
@@ -0,0 +1,70 @@
+import strawberry
+from typing import List, Optional
+from datetime import datetime
+from ..config.database import db
+from ..schemas.usage_schemas import UsageBucket
+from ..utils.decorators import login_required
+from strawberry.types import Info
+
+# Bucket collections maintained incrementally by the radius service
+USAGE_COLLECTIONS = {"hourly": "usage_hourly", "daily": "usage_daily"}
+USAGE_DIMENSIONS = {"customer", "station", "package", "agency"}
+
+async def get_usage(
+    agency_id: str,
+    granularity: str = "daily",
+    dimension: str = "agency",
+    key: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 500
+) -> List[UsageBucket]:
+    if granularity not in USAGE_COLLECTIONS:
+        raise ValueError(f"granularity must be one of {', '.join(USAGE_COLLECTIONS)}")
+    if dimension not in USAGE_DIMENSIONS:
+        raise ValueError(f"dimension must be one of {', '.join(sorted(USAGE_DIMENSIONS))}")
+
+    # Pre-aggregated buckets; the (agency, dimension, bucket) index serves this
+    query = {"agency": agency_id, "dimension": dimension}
+    if dimension == "agency":
+        query["key"] = agency_id
+    elif key:
+        query["key"] = key
+    if since or until:
+        query["bucket"] = {}
+        if since:
+            query["bucket"]["$gte"] = since
+        if until:
+            query["bucket"]["$lt"] = until
+
+    buckets = await db.get_collection(USAGE_COLLECTIONS[granularity]).find(query).sort(
+        "bucket", -1
+    ).limit(min(limit, 5000)).to_list(None)
+    return [
+        UsageBucket(
+            dimension=bucket["dimension"],
+            key=bucket["key"],
+            bucket=bucket["bucket"],
+            inputBytes=bucket["input_bytes"],
+            outputBytes=bucket["output_bytes"],
+            totalBytes=bucket["total_bytes"],
+            sessionTime=bucket["session_time"]
+        ) for bucket in buckets
+    ]
+
+@strawberry.type
+class Query:
+    @strawberry.field
+    @login_required
+    async def usage(
+        self,
+        info: Info,
+        granularity: str = "daily",
+        dimension: str = "agency",
+        key: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 500
+    ) -> List[UsageBucket]:
+        agency_id = info.context.user.get("agency")
+        return await get_usage(agency_id, granularity, dimension, key, since, until, limit)
@@ -1,32 +1,40 @@
 from ..config.database import db
 from ..schemas.user_schema import User, UserInput, UserUpdateInput
 from ..schemas.subscription_schema import Subscription
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 import strawberry
 from passlib.hash import bcrypt
 from bson import ObjectId
 from ..utils.decorators import login_required, role_required, has_role
+from ..utils.principal_cache import principal_cache
 from strawberry.types import Info
+from ..utils.pagination import paginate, DEFAULT_PAGE_SIZE
+from ..schemas.pagination_schemas import Connection
+
+def user_from_document(user: Dict) -> User:
+    return User(
+        id=str(user["_id"]),
+        name=user["name"],
+        email=user["email"],
+        roles=user.get("roles", ["user"]),
+        address=user.get("address"),
+        phone=user.get("phone"),
+        agency=user.get("agency"),
+        is_verified=user.get("is_verified", False),
+        created_at=user.get("created_at", datetime.utcnow()),
+        updated_at=user.get("updated_at"),
+        is_active=user.get("is_active", True)
+    )
 
 async def get_users() -> List[User]:
     collection = db.get_collection("users")
     users_data = await collection.find({}).to_list(None)
-    return [
-        User(
-            id=str(user["_id"]),
-            name=user["name"],
-            email=user["email"],
-            roles=user.get("roles", ["user"]),
-            address=user.get("address"),
-            phone=user.get("phone"),
-            agency=user.get("agency"),
-            is_verified=user.get("is_verified", False),
-            created_at=user.get("created_at", datetime.utcnow()),
-            updated_at=user.get("updated_at"),
-            is_active=user.get("is_active", True)
-        ) for user in users_data
-    ]
+    return [user_from_document(user) for user in users_data]
+
+async def get_users_page(first: int, after: Optional[str]) -> Connection[User]:
+    page = await paginate(db.get_collection("users"), {}, first, after)
+    return page.connection([user_from_document(user) for user in page.documents])
 
 async def get_user(id: str) -> Optional[User]:
     collection = db.get_collection("users")
@@ -89,6 +97,8 @@ async def update_user(id: str, user_input: UserUpdateInput) -> Optional[User]:
                 {"$set": update_data},
                 return_document=True
             )
+            # Roles, agency or is_active may have changed
+            principal_cache.invalidate(id)
             if result:
                 return User(
                     id=str(result["_id"]),
@@ -116,6 +126,7 @@ async def delete_user(id: str) -> bool:
         
         # Then delete the user
         result = await collection.delete_one({"_id": ObjectId(id)})
+        principal_cache.invalidate(id)
         return result.deleted_count > 0
     except:
         return False
@@ -155,6 +166,15 @@ class Query:
         """Get all users (admin only)"""
         return await get_users()
 
+    @strawberry.field
+    @login_required
+    @role_required("admin")
+    async def users_connection(
+        self, info: Info, first: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None
+    ) -> Connection[User]:
+        """User rows newest first, ``first`` at a time after the ``after`` cursor"""
+        return await get_users_page(first, after)
+
     @strawberry.field
     @login_required
     async def user(self, info: Info, id: str) -> Optional[User]:
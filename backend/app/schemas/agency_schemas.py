@@ -30,6 +30,9 @@ class Agency:
     mpesa_b2c_shortcode: Optional[str] = None
     mpesa_b2b_shortcode: Optional[str] = None
     mpesa_initiator_name: Optional[str] = None
+    # RADIUS: user@realm and these NAS identifiers/IPs resolve to this agency
+    realm: Optional[str] = None
+    nas_clients: Optional[List[str]] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     # Sensitive fields excluded from type
@@ -54,6 +57,8 @@ class AgencyInput:
     mpesa_b2b_shortcode: Optional[str] = None
     mpesa_initiator_name: Optional[str] = None
     mpesa_initiator_password: Optional[str] = None
+    realm: Optional[str] = None
+    nas_clients: Optional[List[str]] = None
 
 @strawberry.input
 class AgencyUpdateInput:
@@ -74,3 +79,5 @@ class AgencyUpdateInput:
     mpesa_b2b_shortcode: Optional[str] = None
     mpesa_initiator_name: Optional[str] = None
     mpesa_initiator_password: Optional[str] = None
+    realm: Optional[str] = None
+    nas_clients: Optional[List[str]] = None
@@ -5,6 +5,7 @@ from pymongo import MongoClient
 from bson import ObjectId
 from ..config.database import db
 from ..utils.decorators import login_required
+from strawberry.types import Info
 
 @strawberry.type
 class Agency:
@@ -56,7 +57,7 @@ class AuthResponse:
 class Query:
     @strawberry.field
     @login_required
-    async def user(self, info) -> User:
+    async def user(self, info: Info) -> User:
         if not info.context.user:
             raise Exception("Not authenticated")
             
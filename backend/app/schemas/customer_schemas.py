@@ -1,6 +1,7 @@
 from typing import Optional
 from datetime import datetime
 import strawberry
+from strawberry.types import Info
 
 @strawberry.type
 class CustomerPackage:
@@ -49,6 +50,22 @@ class AccountingData:
     totalMbytes: float = strawberry.field(name="totalMbytes")
     sessionTimeHours: float = strawberry.field(name="sessionTimeHours")
 
+@strawberry.type
+class OnlineSession:
+    username: str
+    sessionId: str = strawberry.field(name="sessionId")
+    station: Optional[str]
+    nasIpAddress: str = strawberry.field(name="nasIpAddress")
+    framedIpAddress: str = strawberry.field(name="framedIpAddress")
+    sessionTime: int = strawberry.field(name="sessionTime")
+    startTime: datetime = strawberry.field(name="startTime")
+    lastUpdate: datetime = strawberry.field(name="lastUpdate")
+
+@strawberry.type
+class OnlineCount:
+    key: Optional[str]
+    count: int
+
 @strawberry.type
 class Customer:
     id: str
@@ -60,12 +77,17 @@ class Customer:
     agency: str
     package: Optional[CustomerPackage]
     station: Optional[CustomerStation]
-    status: str
+    status: str  # Administrative status; sessions do not change it
     expiry: datetime
     password: str  # PPPoE password
     createdAt: datetime = strawberry.field(name="createdAt")
     updatedAt: Optional[datetime] = strawberry.field(name="updatedAt")
 
+    @strawberry.field
+    async def online(self, info: Info) -> bool:
+        """Whether the customer has a live session in radius_sessions"""
+        return bool(await info.context.loaders.customer_sessions.load(self.id))
+
 @strawberry.input
 class CustomerInput:
     name: str
@@ -76,7 +98,7 @@ class CustomerInput:
     address: Optional[str] = None
     package: Optional[str] = None
     station: Optional[str] = None
-    status: Optional[str] = "offline"  # Valid values: "online" or "offline"
+    status: Optional[str] = "offline"  # Administrative; "active", or legacy "online"/"offline", may log in
     expiry: datetime
 
 @strawberry.input
@@ -0,0 +1,25 @@
+import strawberry
+from typing import Awaitable, Callable, Generic, List, Optional, TypeVar
+
+Node = TypeVar("Node")
+
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    end_cursor: Optional[str] = None
+
+@strawberry.type
+class Edge(Generic[Node]):
+    node: Node
+    cursor: str
+
+@strawberry.type
+class Connection(Generic[Node]):
+    edges: List[Edge[Node]]
+    page_info: PageInfo
+    count: strawberry.Private[Optional[Callable[[], Awaitable[int]]]] = None
+
+    @strawberry.field
+    async def total_count(self) -> Optional[int]:
+        """Rows across all pages; costs a count query, so only run when selected"""
+        return await self.count() if self.count else None
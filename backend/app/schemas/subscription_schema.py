@@ -1,6 +1,7 @@
 import strawberry
 from typing import Optional, List, Annotated
 from datetime import datetime
+from strawberry.types import Info
 from .service_schemas import Service, Tier
 
 # Forward reference for User type
@@ -20,14 +21,16 @@ class Subscription:
     
     # Resolved fields
     @strawberry.field
-    async def service(self, info) -> Optional[Service]:
-        from ..routes.service_routes import get_service
-        return await get_service(self.service_id)
+    async def service(self, info: Info) -> Optional[Service]:
+        from ..routes.subscription_routes import service_from_document
+        service = await info.context.loaders.services.load(self.service_id)
+        return service_from_document(service) if service else None
 
     @strawberry.field
-    async def user(self, info) -> Optional[User]:
-        from ..routes.user_routes import get_user
-        return await get_user(self.user_id)
+    async def user(self, info: Info) -> Optional[User]:
+        from ..routes.user_routes import user_from_document
+        user = await info.context.loaders.users.load(self.user_id)
+        return user_from_document(user) if user else None
 
 @strawberry.input
 class SubscriptionInput:
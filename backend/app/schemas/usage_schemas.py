@@ -0,0 +1,12 @@
+from datetime import datetime
+import strawberry
+
+@strawberry.type
+class UsageBucket:
+    dimension: str
+    key: str
+    bucket: datetime
+    inputBytes: int = strawberry.field(name="inputBytes")
+    outputBytes: int = strawberry.field(name="outputBytes")
+    totalBytes: int = strawberry.field(name="totalBytes")
+    sessionTime: int = strawberry.field(name="sessionTime")
@@ -2,6 +2,7 @@ import strawberry
 from datetime import datetime
 from typing import Optional, List, Annotated
 from strawberry.scalars import JSON
+from strawberry.types import Info
 
 # Forward reference for Subscription type
 Subscription = Annotated["Subscription", strawberry.lazy(".subscription_schema")]
@@ -24,15 +25,16 @@ class User:
     
     # Resolved fields for subscriptions
     @strawberry.field
-    async def subscriptions(self, info) -> List[Subscription]:
-        from ..routes.subscription_routes import get_user_subscriptions
-        return await get_user_subscriptions(self.id)
+    async def subscriptions(self, info: Info) -> List[Subscription]:
+        from ..routes.subscription_routes import subscription_from_document
+        subscriptions = await info.context.loaders.user_subscriptions.load(self.id)
+        return [subscription_from_document(sub) for sub in subscriptions]
     
     @strawberry.field
-    async def active_subscriptions(self, info) -> List[Subscription]:
-        from ..routes.subscription_routes import get_user_subscriptions
-        all_subs = await get_user_subscriptions(self.id)
-        return [sub for sub in all_subs if sub.status == "active"]
+    async def active_subscriptions(self, info: Info) -> List[Subscription]:
+        from ..routes.subscription_routes import subscription_from_document
+        subscriptions = await info.context.loaders.user_subscriptions.load(self.id)
+        return [subscription_from_document(sub) for sub in subscriptions if sub["status"] == "active"]
 
 @strawberry.input
 class UserInput:
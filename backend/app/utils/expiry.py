@@ -0,0 +1,79 @@
+"""Customer expiry normalisation.
+
+Alongside ``expiry`` every customer carries ``expiry_epoch``, the same instant
+as integer UTC seconds. The radius service compares it against the clock
+without parsing dates or converting timezones on each login.
+
+Backfill documents written before the field existed (including those whose
+``expiry`` is stored as an ISO string) with:
+
+    python -m app.utils.expiry
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Union
+import asyncio
+from pymongo import UpdateOne
+
+BACKFILL_BATCH_SIZE = 1000
+
+def parse_expiry(value: Union[datetime, str, None]) -> Optional[datetime]:
+    """Parse a stored expiry into an aware UTC datetime; naive values are UTC"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def expiry_epoch(value: Union[datetime, str, None]) -> Optional[int]:
+    """UTC epoch seconds for an expiry, or None when there is none"""
+    expiry = parse_expiry(value)
+    return int(expiry.timestamp()) if expiry else None
+
+def expiry_fields(value: Union[datetime, str, None]) -> Dict[str, Any]:
+    """``expiry`` and ``expiry_epoch`` as they should be written together"""
+    return {"expiry": value, "expiry_epoch": expiry_epoch(value)}
+
+async def backfill_expiry_epoch(database, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Set ``expiry_epoch`` where it is missing and store string expiries as dates"""
+    customers = database.get_collection("customers")
+    cursor = customers.find(
+        {"expiry": {"$nin": [None, ""]}, "$or": [
+            {"expiry_epoch": {"$exists": False}},
+            {"expiry": {"$type": "string"}}
+        ]},
+        {"expiry": 1}
+    )
+    updated = 0
+    operations = []
+    async for customer in cursor:
+        try:
+            expiry = parse_expiry(customer["expiry"])
+        except ValueError:
+            print(f"Skipping customer {customer['_id']}: unparseable expiry {customer['expiry']!r}")
+            continue
+        operations.append(UpdateOne(
+            {"_id": customer["_id"]},
+            # Stored naive like every other backend timestamp
+            {"$set": expiry_fields(expiry.replace(tzinfo=None))}
+        ))
+        if len(operations) >= batch_size:
+            updated += (await customers.bulk_write(operations, ordered=False)).modified_count
+            operations = []
+    if operations:
+        updated += (await customers.bulk_write(operations, ordered=False)).modified_count
+    return updated
+
+async def main() -> None:
+    from ..config.database import db
+
+    await db.connect_to_database()
+    try:
+        updated = await backfill_expiry_epoch(db.get_database())
+        print(f"Backfilled expiry_epoch on {updated} customers")
+    finally:
+        await db.close_database_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,43 @@
+"""Request-scoped DataLoaders.
+
+Resolvers that fetch related documents go through ``info.context.loaders``
+instead of calling find_one per row. Loads issued in the same tick are
+deduplicated and fetched with one ``$in`` query per collection, and repeat
+loads later in the request come from the loader's cache.
+"""
+from functools import partial
+from typing import Dict, List, Optional
+from bson import ObjectId
+from strawberry.dataloader import DataLoader
+from ..config.database import db
+
+async def load_by_id(collection_name: str, keys: List[str]) -> List[Optional[Dict]]:
+    """Documents for string ``keys`` in order; None for missing or malformed ids"""
+    ids = [ObjectId(key) for key in set(keys) if ObjectId.is_valid(key)]
+    documents = {}
+    if ids:
+        async for document in db.get_collection(collection_name).find({"_id": {"$in": ids}}):
+            documents[str(document["_id"])] = document
+    return [documents.get(key) for key in keys]
+
+async def load_by_field(collection_name: str, field: str, keys: List[str]) -> List[List[Dict]]:
+    """Every document whose ``field`` equals each key, grouped per key"""
+    groups: Dict[str, List[Dict]] = {key: [] for key in keys}
+    async for document in db.get_collection(collection_name).find({field: {"$in": list(groups)}}):
+        groups[document[field]].append(document)
+    return [groups[key] for key in keys]
+
+async def load_optional(loader: DataLoader, key: Optional[str]) -> Optional[Dict]:
+    """``loader.load(key)``, or None without a lookup when there is no key"""
+    return await loader.load(key) if key else None
+
+class Loaders:
+    """One loader per relationship; created fresh for every request"""
+
+    def __init__(self):
+        self.users = DataLoader(load_fn=partial(load_by_id, "users"))
+        self.services = DataLoader(load_fn=partial(load_by_id, "services"))
+        self.packages = DataLoader(load_fn=partial(load_by_id, "packages"))
+        self.stations = DataLoader(load_fn=partial(load_by_id, "stations"))
+        self.user_subscriptions = DataLoader(load_fn=partial(load_by_field, "subscriptions", "user_id"))
+        self.customer_sessions = DataLoader(load_fn=partial(load_by_field, "radius_sessions", "customer_id"))
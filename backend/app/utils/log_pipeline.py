@@ -0,0 +1,52 @@
+"""Queue-backed logging for the API.
+
+Log calls only put the record on a bounded queue; a QueueListener thread
+formats and writes it, so resolvers never wait on stdout. When the queue is
+full records are dropped rather than blocking the event loop.
+"""
+from typing import Optional
+import logging
+import logging.handlers
+import queue
+import sys
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_QUEUE_SIZE = 10000
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records unformatted so %-formatting happens on the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def start_logging(level: str = "INFO", queue_size: int = LOG_QUEUE_SIZE) -> None:
+    """Route the root logger through the queue; safe to call more than once"""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler = DeferredQueueHandler(queue.Queue(queue_size))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    _listener = logging.handlers.QueueListener(handler.queue, output)
+    _listener.start()
+
+def stop_logging() -> None:
+    """Write out anything still queued"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,91 @@
+"""Keyset pagination over ``(created_at, _id)``, newest first.
+
+A cursor encodes the sort key of the last row a page returned, so the next
+page is an index range scan starting right after it no matter how deep the
+client has paged; ``skip`` has to walk every earlier row instead. Listing
+queries are backed by ``(agency, created_at, _id)`` indexes in
+``app.config.indexes``.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import base64
+import binascii
+import json
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+from ..schemas.pagination_schemas import Connection, Edge, PageInfo
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+def encode_cursor(document: Dict) -> str:
+    created_at = document.get("created_at")
+    key = [created_at.isoformat() if created_at else None, str(document["_id"])]
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], ObjectId]:
+    try:
+        created_at, object_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (datetime.fromisoformat(created_at) if created_at else None), ObjectId(object_id)
+    except (ValueError, TypeError, binascii.Error, InvalidId):
+        raise ValueError("Invalid cursor") from None
+
+def after_cursor(cursor: str) -> Dict:
+    """Filter for the rows that sort after ``cursor``"""
+    created_at, object_id = decode_cursor(cursor)
+    if created_at is None:
+        # Rows without created_at sort last, ordered by _id alone
+        return {"created_at": None, "_id": {"$lt": object_id}}
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": object_id}},
+        {"created_at": None}
+    ]}
+
+class Page:
+    """One page of documents; ``connection`` pairs them with their GraphQL nodes"""
+
+    def __init__(self, collection, query: Dict, documents: List[Dict], has_next: bool):
+        self.collection = collection
+        self.query = query
+        self.documents = documents
+        self.has_next = has_next
+
+    def connection(self, nodes: List) -> Connection:
+        edges = [
+            Edge(node=node, cursor=encode_cursor(document))
+            for document, node in zip(self.documents, nodes)
+        ]
+        return Connection(
+            edges=edges,
+            page_info=PageInfo(
+                has_next_page=self.has_next,
+                end_cursor=edges[-1].cursor if edges else None
+            ),
+            # Only run if the client selects totalCount
+            count=lambda: self.collection.count_documents(self.query)
+        )
+
+async def paginate(
+    collection,
+    query: Dict,
+    first: int = DEFAULT_PAGE_SIZE,
+    after: Optional[str] = None,
+    projection: Optional[Dict[str, int]] = None
+) -> Page:
+    """Up to ``first`` documents matching ``query`` that sort after ``after``"""
+    if first < 1:
+        raise ValueError("first must be at least 1")
+    limit = min(first, MAX_PAGE_SIZE)
+    if after:
+        query_after = {"$and": [query, after_cursor(after)]} if query else after_cursor(after)
+    else:
+        query_after = query
+    if projection:
+        # Cursors are built from the sort key
+        projection = {**projection, "created_at": 1}
+    # One extra row tells us whether there is another page
+    documents = await collection.find(query_after, projection).sort(SORT).limit(limit + 1).to_list(limit + 1)
+    return Page(collection, query, documents[:limit], len(documents) > limit)
@@ -0,0 +1,154 @@
+"""Automatic persisted queries (APQ) for the GraphQL endpoint.
+
+A client sends ``extensions.persistedQuery.sha256Hash`` in place of the
+query text. Unknown hashes get a ``PersistedQueryNotFound`` error, and the
+client retries once with the text to register it. That is the protocol
+Apollo's persisted query link speaks. Registered texts are kept in an LRU.
+Texts are also what the parser and validation caches are keyed on, so a
+hashed request skips both parsing and validation after the first one.
+
+With ``PERSISTED_QUERIES_ALLOWLIST`` only operations listed in the
+``PERSISTED_QUERIES_MANIFEST`` file are executed. ``PERSISTED_QUERIES_RECORD``
+writes queries registered at runtime back to that file, so a manifest can
+be recorded on staging and shipped to production.
+
+Hashed queries can also be sent over GET. ``GRAPHQL_GET_MAX_AGE`` then marks
+successful responses cacheable, so nginx can cache them.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional
+import hashlib
+import json
+import logging
+import os
+from graphql import GraphQLError
+from strawberry.extensions import SchemaExtension
+from strawberry.fastapi import GraphQLRouter
+from ..config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+class PersistedQueryStore:
+    """Query texts by sha256 hash; manifest entries are pinned, runtime
+    registrations are evicted least recently used first"""
+
+    def __init__(
+        self,
+        max_size: int,
+        manifest: Optional[str] = None,
+        allowlist: bool = False,
+        record: bool = False
+    ):
+        self.max_size = max_size
+        self.manifest = manifest
+        self.allowlist = allowlist
+        self.record = record
+        self.pinned: Dict[str, str] = {}
+        self._queries: "OrderedDict[str, str]" = OrderedDict()
+        if manifest and os.path.exists(manifest):
+            with open(manifest) as f:
+                self.pinned = json.load(f)
+            logger.info("Loaded %d persisted queries from %s", len(self.pinned), manifest)
+
+    def get(self, sha256: str) -> Optional[str]:
+        query = self.pinned.get(sha256)
+        if query is None and not self.allowlist:
+            query = self._queries.get(sha256)
+            if query is not None:
+                self._queries.move_to_end(sha256)
+        return query
+
+    def allows(self, query: str, sha256: Optional[str] = None) -> bool:
+        return not self.allowlist or (sha256 or query_hash(query)) in self.pinned
+
+    def register(self, sha256: str, query: str) -> None:
+        if sha256 in self.pinned:
+            return
+        if self.record and self.manifest:
+            self.pinned[sha256] = query
+            self._write_manifest()
+            return
+        self._queries[sha256] = query
+        self._queries.move_to_end(sha256)
+        while len(self._queries) > self.max_size:
+            self._queries.popitem(last=False)
+
+    def _write_manifest(self) -> None:
+        temporary = f"{self.manifest}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.pinned, f, indent=2, sort_keys=True)
+        os.replace(temporary, self.manifest)
+
+# Shared persisted query store instance
+persisted_queries = PersistedQueryStore(
+    settings.PERSISTED_QUERIES_CACHE_SIZE,
+    settings.PERSISTED_QUERIES_MANIFEST,
+    settings.PERSISTED_QUERIES_ALLOWLIST,
+    settings.PERSISTED_QUERIES_RECORD
+)
+
+def _error(message: str, code: str) -> GraphQLError:
+    return GraphQLError(message, extensions={"code": code})
+
+class PersistedQueries(SchemaExtension):
+    """Resolves ``extensions.persistedQuery`` to the query text before parsing"""
+
+    def __init__(self, store: PersistedQueryStore = persisted_queries):
+        super().__init__()
+        self.store = store
+
+    def on_operation(self) -> Iterator[None]:
+        execution_context = self.execution_context
+        persisted = (execution_context.operation_extensions or {}).get("persistedQuery")
+        query = execution_context.query
+        if isinstance(persisted, dict):
+            sha256 = persisted.get("sha256Hash")
+            if persisted.get("version") != 1 or not isinstance(sha256, str):
+                raise _error("Unsupported persisted query version", "PERSISTED_QUERY_NOT_SUPPORTED")
+            if query is None:
+                query = self.store.get(sha256)
+                if query is None:
+                    # The client retries with the query text
+                    raise _error("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+                execution_context.query = query
+            elif query_hash(query) != sha256:
+                raise _error("provided sha does not match query", "PERSISTED_QUERY_HASH_MISMATCH")
+            elif not self.store.allows(query, sha256):
+                raise _error("Operation is not in the persisted query allowlist", "PERSISTED_QUERY_NOT_ALLOWED")
+            else:
+                self.store.register(sha256, query)
+        elif query is not None and not self.store.allows(query):
+            raise _error("Operation is not in the persisted query allowlist", "PERSISTED_QUERY_NOT_ALLOWED")
+        yield
+        self._set_cache_headers(persisted)
+
+    def _set_cache_headers(self, persisted) -> None:
+        if settings.GRAPHQL_GET_MAX_AGE <= 0 or not persisted:
+            return
+        context = self.execution_context.context
+        request = getattr(context, "request", None)
+        response = getattr(context, "response", None)
+        result = self.execution_context.result
+        if request is None or response is None or request.method != "GET":
+            return
+        if result is None or result.errors:
+            return
+        # Responses hold one tenant's data: only the browser may reuse them.
+        # The bundled nginx keys its cache on the token and takes its
+        # lifetime from X-Accel-Expires, which it does not pass on
+        response.headers["Cache-Control"] = f"private, max-age={settings.GRAPHQL_GET_MAX_AGE}"
+        response.headers["X-Accel-Expires"] = str(settings.GRAPHQL_GET_MAX_AGE)
+        response.headers["Vary"] = "Authorization"
+
+class PersistedQueryRouter(GraphQLRouter):
+    """GraphQLRouter that treats a GET carrying only a persisted query hash
+    as an operation rather than a request for the GraphQL IDE"""
+
+    def should_render_graphql_ide(self, request) -> bool:
+        return (
+            request.query_params.get("extensions") is None
+            and super().should_render_graphql_ide(request)
+        )
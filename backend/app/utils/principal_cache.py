@@ -0,0 +1,71 @@
+"""Authenticated users cached per token.
+
+``get_context`` still verifies the JWT signature and expiry on every
+request, but the users lookup behind it only runs when the cache misses.
+Entries are keyed by ``(user id, jti)``. They expire after
+``AUTH_CACHE_TTL_SECONDS`` and are dropped as soon as this process changes
+the user. In a multi-worker deployment the other workers only see a change
+once the TTL runs out, so the TTL caps how stale roles or agency can be.
+"""
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+import time
+from ..config.settings import settings
+
+Key = Tuple[str, Optional[str]]
+
+class PrincipalCache:
+    """LRU of user documents with a TTL; the least recently used entry is
+    evicted once ``max_size`` is reached"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Key, Tuple[float, Dict]]" = OrderedDict()
+        # user id -> keys of that user's cached tokens, for invalidation
+        self._keys: Dict[str, Set[Key]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str, jti: Optional[str]) -> Optional[Dict]:
+        key = (user_id, jti)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Each request gets its own copy to work with
+        return dict(entry[1])
+
+    def put(self, user_id: str, jti: Optional[str], user: Dict) -> None:
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        key = (user_id, jti)
+        self._entries[key] = (time.monotonic() + self.ttl, dict(user))
+        self._entries.move_to_end(key)
+        self._keys.setdefault(user_id, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, user_id: str) -> None:
+        """Forget every cached token of ``user_id``"""
+        for key in self._keys.pop(str(user_id), ()):
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys.clear()
+
+    def _remove(self, key: Key) -> None:
+        self._entries.pop(key, None)
+        keys = self._keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys[key[0]]
+
+# Shared principal cache instance
+principal_cache = PrincipalCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_SIZE)
@@ -0,0 +1,58 @@
+"""Mongo projections built from the GraphQL selection set.
+
+A resolver that maps a document to a strawberry type normally fetches the
+whole document, even when the client asked for three fields. ``selection``
+reads ``info.selected_fields`` into a tree of the fields the client
+selected, following fragments. ``projection`` maps that tree onto document
+keys. Resolvers also check the tree before running a related lookup, such
+as a customer's package, that nobody asked for.
+"""
+from typing import Dict, Iterable, List, Optional
+from strawberry.types import Info
+from strawberry.types.nodes import FragmentSpread, InlineFragment, Selection
+
+# GraphQL field name -> subtree of the fields selected under it
+SelectionTree = Dict[str, "SelectionTree"]
+
+def _merge(tree: SelectionTree, selections: List[Selection]) -> SelectionTree:
+    for selection in selections:
+        if isinstance(selection, (FragmentSpread, InlineFragment)):
+            _merge(tree, selection.selections)
+        else:
+            # The same field under two aliases selects the union of both
+            _merge(tree.setdefault(selection.name, {}), selection.selections)
+    return tree
+
+def selection(info: Info, *path: str) -> SelectionTree:
+    """Fields selected on the current field, optionally below ``path``
+    (e.g. ``selection(info, "edges", "node")`` for a connection)"""
+    tree: SelectionTree = {}
+    for field in info.selected_fields:
+        _merge(tree, field.selections)
+    for name in path:
+        tree = tree.get(name, {})
+    return tree
+
+def projection(
+    tree: SelectionTree,
+    fields: Dict[str, str],
+    required: Iterable[str] = ()
+) -> Optional[Dict[str, int]]:
+    """Projection for the selected fields; ``fields`` maps GraphQL names to
+    document keys. Returns None (fetch everything) when nothing maps, e.g.
+    a selection made only of ``__typename``."""
+    keys = {fields[name] for name in tree if name in fields}
+    if not keys:
+        return None
+    return {key: 1 for key in keys | set(required)}
+
+class ProjectedDocument(dict):
+    """Document fetched with a projection; keys left out read as None, so
+    the existing converters can build a type whose unselected fields are
+    never resolved"""
+
+    def __missing__(self, key):
+        return None
+
+def projected(document: Dict, fields: Optional[Dict[str, int]]) -> Dict:
+    return ProjectedDocument(document) if fields else document
@@ -0,0 +1,84 @@
+"""Parse and validation overhead per GraphQL request, before and after
+persisted queries with the document caches.
+
+Replays the operations the frontend sends (the gql`...` blocks under
+frontend/graphql) in random order. "uncached" parses and validates every
+request, as the endpoint did before. "persisted" resolves the sha256 hash
+through the persisted query store, then goes through the parser and
+validation caches, as the endpoint does now. No database is needed.
+
+    python -m benchmarks.graphql_cache_bench --requests 20000
+"""
+from pathlib import Path
+from typing import List
+import argparse
+import random
+import re
+import time
+from graphql import parse, specified_rules
+from strawberry.extensions.parser_cache import _get_parse_cache
+from strawberry.extensions.validation_cache import _get_validate_cache
+from strawberry.schema.schema import validate_document
+from app.config.settings import settings
+from app.main import schema
+from app.utils.persisted_queries import PersistedQueryStore, query_hash
+
+OPERATIONS_DIR = Path(__file__).resolve().parents[2] / "frontend" / "graphql"
+GQL_BLOCK = re.compile(r"gql`(.*?)`", re.S)
+
+def load_operations(directory: Path) -> List[str]:
+    operations = []
+    for path in sorted(directory.glob("*.ts")):
+        operations += [block.strip() for block in GQL_BLOCK.findall(path.read_text())]
+    return operations
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def report(label: str, samples: List[float]):
+    print(
+        f"{label:>10}: p50 {percentile(samples, 50) * 1000:8.1f} us  "
+        f"p99 {percentile(samples, 99) * 1000:8.1f} us  "
+        f"mean {sum(samples) / len(samples) * 1000:8.1f} us"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--operations", type=Path, default=OPERATIONS_DIR)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    operations = load_operations(args.operations)
+    graphql_schema = schema._schema
+    # Strawberry's default rules, as on the endpoint
+    rules = tuple(specified_rules)
+    # Same shared caches the ParserCache/ValidationCache extensions use
+    cached_parse = _get_parse_cache(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+    cached_validate = _get_validate_cache(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+    store = PersistedQueryStore(settings.PERSISTED_QUERIES_CACHE_SIZE)
+    hashes = [query_hash(query) for query in operations]
+    for sha256, query in zip(hashes, operations):
+        store.register(sha256, query)
+
+    requests = random.choices(range(len(operations)), k=args.requests)
+    print(f"{len(operations)} operations, {args.requests} requests")
+
+    uncached = []
+    for index in requests:
+        start = time.perf_counter()
+        errors = validate_document(graphql_schema, parse(operations[index]), rules)
+        uncached.append((time.perf_counter() - start) * 1000)
+    report("uncached", uncached)
+
+    persisted = []
+    for index in requests:
+        start = time.perf_counter()
+        errors = cached_validate(graphql_schema, cached_parse(store.get(hashes[index])), rules)
+        persisted.append((time.perf_counter() - start) * 1000)
+    report("persisted", persisted)
+    if errors:
+        print(f"last operation failed validation: {errors[0].message}")
+
+if __name__ == "__main__":
+    main()
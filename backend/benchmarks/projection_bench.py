@@ -0,0 +1,127 @@
+"""Bytes read from MongoDB and latency for a dashboard query, with and
+without selection-set projections.
+
+The query lists customers with a handful of fields plus one subscriber's
+accounting history, which is what the dashboard renders. Runs against the
+database named by the backend's settings (MONGODB_URL / DATABASE_NAME),
+which is wiped and re-seeded, so point it at a scratch database:
+
+    DATABASE_NAME=projection_bench python -m benchmarks.projection_bench \
+        --customers 2000 --history 500 --requests 200
+"""
+from datetime import datetime, timedelta
+from typing import List
+from unittest import mock
+import argparse
+import asyncio
+import random
+import time
+import bson
+from pymongo import monitoring
+from app.config.database import db
+from app.main import schema
+from app.middleware.auth_middleware import Context
+from app.routes import customer_routes
+
+DASHBOARD_QUERY = """
+query Dashboard($username: String!) {
+  customersConnection(first: 100) {
+    edges { node { id name username status expiry package { name } } }
+  }
+  customerAccountingHistory(username: $username, limit: 200) {
+    timestamp totalInputBytes totalOutputBytes
+  }
+}
+"""
+
+class ReplyBytes(monitoring.CommandListener):
+    """Sums the BSON size of every reply the driver receives"""
+
+    def __init__(self):
+        self.total = 0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.total += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def seed(customers: int, history: int) -> List[str]:
+    database = db.get_database()
+    for name in ("users", "packages", "customers", "accounting_history"):
+        await database[name].drop()
+    admin = await database.users.insert_one({"name": "bench", "roles": ["admin"], "agency": "bench"})
+    package = await database.packages.insert_one({
+        "name": "10M", "service_type": "pppoe", "price": 1000,
+        "download_speed": 10, "upload_speed": 5, "agency": "bench"
+    })
+    now = datetime.utcnow()
+    await database.customers.insert_many([{
+        "name": f"Customer {i}", "email": f"c{i}@example.com", "phone": f"0700{i:06d}",
+        "username": f"user{i}", "password": "x" * 60, "address": f"{i} Bench Road",
+        "agency": "bench", "package": str(package.inserted_id), "status": "active",
+        "expiry": now + timedelta(days=30), "created_at": now - timedelta(minutes=i),
+        "updated_at": now
+    } for i in range(customers)])
+    counters = {
+        key: random.randint(0, 2 ** 31) for key in (
+            "session_time", "input_octets", "output_octets", "input_packets", "output_packets",
+            "input_gigawords", "output_gigawords", "nas_port", "idle_timeout", "session_timeout",
+            "total_input_bytes", "total_output_bytes", "total_bytes"
+        )
+    }
+    await database.accounting_history.insert_many([{
+        "meta": {"username": "user0"}, "timestamp": now - timedelta(minutes=i),
+        "session_id": f"{i:08x}", "status": "Interim-Update", **counters,
+        "called_station_id": "bench-nas", "calling_station_id": "AA:BB:CC:DD:EE:FF",
+        "terminate_cause": None, "nas_ip_address": "10.0.0.1", "nas_identifier": "bench-nas",
+        "nas_port_type": "Ethernet", "service_type": "Framed-User", "framed_protocol": "PPP",
+        "framed_ip_address": "10.10.0.2", "mikrotik_rate_limit": "5M/10M",
+        "input_mbytes": 1.0, "output_mbytes": 1.0, "total_mbytes": 2.0, "session_time_hours": 1.0
+    } for i in range(history)])
+    return admin.inserted_id
+
+async def measure(label: str, admin_id, listener: ReplyBytes, requests: int):
+    samples = []
+    listener.total = 0
+    for _ in range(requests):
+        context = Context(request=None, user={"_id": admin_id, "roles": ["admin"], "agency": "bench"})
+        start = time.perf_counter()
+        result = await schema.execute(DASHBOARD_QUERY, variable_values={"username": "user0"}, context_value=context)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert not result.errors, result.errors
+    print(
+        f"{label:>14}: {listener.total / requests / 1024:8.1f} KiB/request  "
+        f"p50 {percentile(samples, 50):7.2f} ms  "
+        f"p99 {percentile(samples, 99):7.2f} ms"
+    )
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    # Registered before the client exists so it sees every command
+    listener = ReplyBytes()
+    monitoring.register(listener)
+    await db.connect_to_database()
+    admin_id = await seed(args.customers, args.history)
+
+    await measure("warmup", admin_id, listener, 20)
+    # Without projections every resolver fetches whole documents
+    with mock.patch.object(customer_routes, "projection", lambda *args, **kwargs: None):
+        await measure("full documents", admin_id, listener, args.requests)
+    await measure("projected", admin_id, listener, args.requests)
+    await db.close_database_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
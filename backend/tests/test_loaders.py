@@ -0,0 +1,130 @@
+from datetime import datetime
+from unittest import mock
+import os
+import unittest
+from bson import ObjectId
+
+# Settings are read at import time; none of these reach a real service here
+for name, value in {
+    "SECRET_KEY": "test-secret",
+    "MONGODB_URL": "mongodb://localhost:27017",
+    "GOOGLE_CLIENT_ID": "test",
+    "GOOGLE_CLIENT_SECRET": "test",
+    "ENCRYPTION_KEY": "o8ZaJmwb4HVndhnGMAbcQ92oVdYSn4qCw5O7yuH0P5Y="
+}.items():
+    os.environ.setdefault(name, value)
+
+from app.config.database import db
+from app.main import schema
+from app.middleware.auth_middleware import Context
+
+ADMIN = {"_id": ObjectId(), "roles": ["admin"]}
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        self._iterator = iter(self.documents)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.documents)
+
+class CountingCollection:
+    """In-memory collection that counts find() calls; only ``{}`` and
+    ``{field: {"$in": [...]}}`` filters, the ones loaders issue"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.finds = 0
+
+    def find(self, query=None, projection=None):
+        self.finds += 1
+        documents = self.documents
+        for field, condition in (query or {}).items():
+            documents = [document for document in documents if document.get(field) in condition["$in"]]
+        return FakeCursor(documents)
+
+def user(index):
+    return {
+        "_id": ObjectId(), "name": f"User {index}", "email": f"user{index}@example.com",
+        "roles": ["user"], "created_at": datetime(2024, 1, 1)
+    }
+
+def service(index):
+    return {
+        "_id": ObjectId(), "name": f"Service {index}",
+        "tiers": [{"name": "basic", "price": 10.0, "features": []}], "created_at": datetime(2024, 1, 1)
+    }
+
+def customer(index):
+    return {
+        "_id": ObjectId(), "name": f"Customer {index}", "email": f"customer{index}@example.com",
+        "phone": "0700000000", "username": f"customer{index}", "agency": "agency-1",
+        "status": "active", "expiry": datetime(2030, 1, 1), "created_at": datetime(2024, 1, 1)
+    }
+
+class LoaderQueryCountTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        users = [user(index) for index in range(10)]
+        services = [service(index) for index in range(3)]
+        subscriptions = [
+            {
+                "_id": ObjectId(), "user_id": str(users[index % len(users)]["_id"]),
+                "service_id": str(services[index % len(services)]["_id"]), "tier_name": "basic",
+                "status": "active", "start_date": datetime(2024, 1, 1)
+            }
+            for index in range(40)
+        ]
+        customers = [customer(index) for index in range(10)]
+        # Every other customer has a live session, the first one two of them
+        sessions = [{"_id": f"nas:{index}", "customer_id": str(customers[index]["_id"])} for index in range(0, 10, 2)]
+        sessions.append({"_id": "nas:extra", "customer_id": str(customers[0]["_id"])})
+        self.collections = {
+            "users": CountingCollection(users),
+            "services": CountingCollection(services),
+            "subscriptions": CountingCollection(subscriptions),
+            "customers": CountingCollection(customers),
+            "radius_sessions": CountingCollection(sessions)
+        }
+        patcher = mock.patch.object(db, "get_collection", lambda name: self.collections[name])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def execute(self, query):
+        result = await schema.execute(query, context_value=Context(request=None, user=ADMIN))
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def finds(self):
+        return {name: collection.finds for name, collection in self.collections.items() if collection.finds}
+
+    async def test_subscriptions_batch_service_and_user(self):
+        data = await self.execute("{ subscriptions { id service { name } user { email } } }")
+        self.assertEqual(len(data["subscriptions"]), 40)
+        self.assertTrue(all(row["service"] and row["user"] for row in data["subscriptions"]))
+        self.assertEqual(self.finds(), {"users": 1, "services": 1, "subscriptions": 1})
+
+    async def test_users_batch_nested_subscriptions(self):
+        data = await self.execute("{ users { id subscriptions { id service { name } } } }")
+        self.assertEqual(sum(len(row["subscriptions"]) for row in data["users"]), 40)
+        self.assertEqual(self.finds(), {"users": 1, "services": 1, "subscriptions": 1})
+
+    async def test_customers_online_from_radius_sessions(self):
+        data = await self.execute("{ customers { username online } }")
+        online = {row["username"] for row in data["customers"] if row["online"]}
+        self.assertEqual(online, {f"customer{index}" for index in range(0, 10, 2)})
+        self.assertEqual(self.collections["radius_sessions"].finds, 1)
+
+if __name__ == "__main__":
+    unittest.main()
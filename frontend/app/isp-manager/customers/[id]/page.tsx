@@ -179,8 +179,8 @@ export default function ViewCustomer({ params }: ViewCustomerProps) {
             </div>
           </div>
           <div className="flex gap-2 mt-2 sm:mt-0">
-            <Badge variant={customer.status === "online" ? "active" : "offline"}>
-              {customer.status === "online" ? "Online" : "Offline"}
+            <Badge variant={customer.online ? "active" : "offline"}>
+              {customer.online ? "Online" : "Offline"}
             </Badge>
             {new Date(customer.expiry) < new Date() && (
               <Badge variant="expired">Expired</Badge>
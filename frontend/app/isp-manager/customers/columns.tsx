@@ -179,19 +179,19 @@ export const columns: ColumnDef<Customer>[] = [
     header: () => <div className="text-fuchsia-500">Address</div>,
   },
   {
-    accessorKey: "status",
+    accessorKey: "online",
     header: () => <div className="text-fuchsia-500">Status</div>,
     cell: ({ row }) => {
-      const status = row.getValue("status") as "online" | "offline";
+      const online = row.getValue("online") as boolean;
       const expiry = new Date(row.original.expiry);
       const isExpired = expiry < new Date();
 
-      const statusVariant = status === "online" ? "active" : "offline";
+      const statusVariant = online ? "active" : "offline";
 
       return (
         <div className="flex gap-2">
           <Badge variant={statusVariant}>
-            {status === "online" ? "Online" : "Offline"}
+            {online ? "Online" : "Offline"}
           </Badge>
           {isExpired && (
             <Badge variant="expired">
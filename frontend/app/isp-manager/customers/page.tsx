@@ -18,7 +18,7 @@ const Page = () => {
 
   const totalCustomers = customers.length;
   const onlineCustomers = customers.filter(
-    (customer) => customer.status === "online"
+    (customer) => customer.online
   ).length;
   const expiredCustomers = customers.filter(
     (customer) => new Date(customer.expiry) < new Date()
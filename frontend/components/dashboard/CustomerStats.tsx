@@ -30,7 +30,7 @@ export function CustomerStats() {
   const customers = data?.customers || [];
   if (customers.length === 0) return <EmptyState />;
 
-  const activeCustomers = customers.filter((c: Customer) => c.status === "online").length;
+  const activeCustomers = customers.filter((c: Customer) => c.online).length;
   const totalCustomers = customers.length;
   const activePercentage = ((activeCustomers / totalCustomers) * 100).toFixed(1);
 
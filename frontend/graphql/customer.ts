@@ -19,7 +19,9 @@ export interface Customer {
     location: string;
     address: string;
   } | null;
-  status: "online" | "offline";
+  // Administrative status; whether a session is live is in `online`
+  status: string;
+  online: boolean;
   expiry: string;
   password: string;  // PPPoE password
   createdAt: string;
@@ -101,6 +103,7 @@ export const GET_CUSTOMERS = gql`
         address
       }
       status
+      online
       expiry
       password
       createdAt
@@ -131,6 +134,7 @@ export const GET_CUSTOMER = gql`
         address
       }
       status
+      online
       expiry
       password
       createdAt
@@ -238,6 +242,7 @@ export const CREATE_CUSTOMER = gql`
         address
       }
       status
+      online
       expiry
       password
       createdAt
@@ -268,6 +273,7 @@ export const UPDATE_CUSTOMER = gql`
         address
       }
       status
+      online
       expiry
       password
       createdAt
@@ -6,6 +6,7 @@ import {
   FetchPolicy,
 } from "@apollo/client";
 import { setContext } from "@apollo/client/link/context";
+import { createPersistedQueryLink } from "@apollo/client/link/persisted-queries";
 import { getAuthToken, formatAuthHeader } from "@/graphql/auth";
 
 const httpLink = createHttpLink({
@@ -13,6 +14,22 @@ const httpLink = createHttpLink({
   credentials: "include",
 });
 
+const sha256 = async (query: string) => {
+  const digest = await crypto.subtle.digest(
+    "SHA-256",
+    new TextEncoder().encode(query)
+  );
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, "0"))
+    .join("");
+};
+
+// Send operation hashes instead of query text; hashed queries go over GET
+// so responses can be cached. Web Crypto is only available in secure contexts.
+const persistedQueryLink = globalThis.crypto?.subtle
+  ? [createPersistedQueryLink({ sha256, useGETForHashedQueries: true })]
+  : [];
+
 const createApolloClient = (serverSide = false, serverSideToken?: string) => {
   const authLink = setContext(async (_, { headers }) => {
     // For server-side rendering, use the passed token if available
@@ -45,7 +62,7 @@ const createApolloClient = (serverSide = false, serverSideToken?: string) => {
   });
 
   return new ApolloClient({
-    link: from([authLink, httpLink]),
+    link: from([authLink, ...persistedQueryLink, httpLink]),
     cache: new InMemoryCache(),
     defaultOptions: {
       watchQuery: {
@@ -12,8 +12,20 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Motor connection pool size; admission control sizes itself from this too
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "10"))
+
+# How long per-session accounting history is kept
+ACCOUNTING_HISTORY_RETENTION = int(os.getenv("RADIUS_ACCOUNTING_HISTORY_DAYS", "90")) * 86400  # seconds
+# How long post-auth events are kept
+POST_AUTH_RETENTION = int(os.getenv("RADIUS_POST_AUTH_RETENTION_DAYS", "30")) * 86400  # seconds
+# How long hourly usage buckets are kept; daily buckets are kept indefinitely
+USAGE_HOURLY_RETENTION = int(os.getenv("RADIUS_USAGE_HOURLY_RETENTION_DAYS", "90")) * 86400  # seconds
+
 class Database:
     client: Optional[AsyncIOMotorClient] = None
+    # Set once collections and indexes exist; buffered writes wait for it
+    ready = False
     MAX_RETRIES = 3
     RETRY_DELAY = 2  # seconds
     
@@ -32,7 +44,7 @@ class Database:
                     mongodb_url,
                     serverSelectionTimeoutMS=5000,
                     connectTimeoutMS=5000,
-                    maxPoolSize=10,
+                    maxPoolSize=MONGODB_MAX_POOL_SIZE,
                     retryWrites=True,
                     retryReads=True
                 )
@@ -77,6 +89,40 @@ class Database:
             if "already exists" not in str(e):
                 logger.error(f"Error creating accounting collection: {e}")
                 
+        try:
+            # Append-only session history; one document per accounting packet
+            await db.create_collection(
+                "accounting_history",
+                timeseries={
+                    "timeField": "timestamp",
+                    "metaField": "meta",
+                    "granularity": "minutes"
+                },
+                expireAfterSeconds=ACCOUNTING_HISTORY_RETENTION
+            )
+            logger.info("Created accounting_history time-series collection")
+        except Exception as e:
+            if "already exists" not in str(e):
+                # Time-series collections need MongoDB 5.0+; fall back to a TTL index
+                logger.warning(f"Time-series collections unavailable, using a regular collection: {e}")
+                await db.accounting_history.create_index(
+                    [("timestamp", ASCENDING)],
+                    expireAfterSeconds=ACCOUNTING_HISTORY_RETENTION
+                )
+
+        try:
+            # History queries filter on username or agency and sort by time
+            await db.accounting_history.create_index([
+                ("meta.username", ASCENDING),
+                ("timestamp", DESCENDING)
+            ])
+            await db.accounting_history.create_index([
+                ("meta.agency", ASCENDING),
+                ("timestamp", DESCENDING)
+            ])
+        except Exception as e:
+            logger.error(f"Error creating accounting_history indexes: {e}")
+
         try:
             # Create post_auth collection with indexes
             await db.create_collection("post_auth")
@@ -93,6 +139,53 @@ class Database:
             if "already exists" not in str(e):
                 logger.error(f"Error creating post_auth collection: {e}")
 
+        try:
+            # Post-auth events age out instead of growing without bound
+            await db.post_auth.create_index(
+                [("timestamp", ASCENDING)],
+                expireAfterSeconds=POST_AUTH_RETENTION
+            )
+        except Exception as e:
+            logger.error(f"Error creating post_auth TTL index: {e}")
+
+        try:
+            # Live sessions keyed by "<nas>:<Acct-Session-Id>"
+            await db.radius_sessions.create_index([
+                ("agency", ASCENDING),
+                ("station", ASCENDING)
+            ])
+            await db.radius_sessions.create_index([("nas_ip_address", ASCENDING)])
+            await db.radius_sessions.create_index([("username", ASCENDING)])
+            # CoA fan-out per customer or package, and the expiry sweep
+            await db.radius_sessions.create_index([("customer_id", ASCENDING)])
+            await db.radius_sessions.create_index([("package", ASCENDING)])
+            # Stale-session reaper
+            await db.radius_sessions.create_index([("last_update", ASCENDING)])
+        except Exception as e:
+            logger.error(f"Error creating radius_sessions indexes: {e}")
+
+        try:
+            # Usage rollups are upserted by (dimension, key, bucket); dashboards
+            # read one agency's buckets for a dimension over a time range
+            for collection_name in ("usage_hourly", "usage_daily"):
+                await db[collection_name].create_index([
+                    ("dimension", ASCENDING),
+                    ("key", ASCENDING),
+                    ("bucket", ASCENDING)
+                ], unique=True)
+                await db[collection_name].create_index([
+                    ("agency", ASCENDING),
+                    ("dimension", ASCENDING),
+                    ("bucket", DESCENDING)
+                ])
+            await db.usage_hourly.create_index(
+                [("bucket", ASCENDING)],
+                expireAfterSeconds=USAGE_HOURLY_RETENTION
+            )
+        except Exception as e:
+            logger.error(f"Error creating usage rollup indexes: {e}")
+        cls.ready = True
+
     @classmethod
     async def verify_connection(cls):
         """Verify database connection is healthy"""
@@ -2,37 +2,122 @@ from fastapi import FastAPI, HTTPException
 from .config.database import db
 import logging
 from .routes import radius_routes
+from .utils.auth_cache import cache_invalidator
+from .utils.accounting import accounting_buffer
+from .utils.post_auth import post_auth_buffer
+from .utils.sessions import session_reaper
+from .utils.rollups import usage_rollups
+from .utils.circuit import database_breaker
+from .utils.snapshot import snapshot_store
+from .utils.spool import accounting_spool
+from .utils.realms import realm_resolver
+from .utils.log_pipeline import log_pipeline
+from .utils.handlers import process_accounting, warm_authorize_cache
+from .radius_server.server import udp_server, RADIUS_UDP_ENABLED
+from .radius_server.coa import coa_dispatcher, RADIUS_COA_ENABLED
+import asyncio
 import os
 from dotenv import load_dotenv
+from typing import Optional
+from pymongo.errors import PyMongoError
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging; records are written by a background thread
+log_pipeline.start()
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(title="Radius API")
 
+# Delay between attempts to finish a degraded start
+PREPARE_RETRY_DELAY = 5  # seconds
+preparing: Optional[asyncio.Task] = None
+
+async def prepare_database(database) -> None:
+    """Setup a degraded start skipped, run once MongoDB answers again"""
+    while True:
+        try:
+            if not db.ready:
+                await db.create_collections_and_indexes()
+            await realm_resolver.refresh(database)
+            await usage_rollups.load_baselines(database)
+            logger.info("Finished database setup after degraded start")
+            return
+        except PyMongoError as e:
+            logger.error(f"Database setup after degraded start failed: {e}")
+            await asyncio.sleep(PREPARE_RETRY_DELAY)
+
 # Database connection events
 @app.on_event("startup")
 async def startup_db_client():
     """Initialize database connection"""
+    # The last-known-good snapshot lets us authorize even if MongoDB is down
+    if snapshot_store.load():
+        realm_resolver.restore(snapshot_store.snapshot.realms)
     try:
         await db.connect_to_database()
         logger.info("Connected to MongoDB")
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
-        raise e
+        if not snapshot_store.loaded:
+            raise e
+        logger.warning("Starting in degraded mode from the on-disk snapshot")
+        database_breaker.trip(e)
+
+    database = db.get_database()
+    if database_breaker.closed:
+        await realm_resolver.refresh(database)
+    realm_resolver.start(database)
+    warm_authorize_cache()
+    cache_invalidator.start(database)
+    accounting_buffer.start()
+    post_auth_buffer.start()
+    if database_breaker.closed:
+        await usage_rollups.load_baselines(database)
+    else:
+        # Buffered writes wait for collections and indexes to exist
+        def on_breaker_close():
+            global preparing
+            if preparing is None:
+                preparing = asyncio.create_task(prepare_database(database))
+        database_breaker.listeners.append(on_breaker_close)
+    usage_rollups.start()
+    session_reaper.start(database)
+    snapshot_store.start(database, database_breaker)
+    accounting_spool.start(
+        lambda body, received_at: process_accounting(database, body, received_at),
+        lambda: database_breaker.closed,
+        # Half-open probe; the breaker only lets it through after reset_timeout
+        lambda: database_breaker.call(lambda: database.command("ping"))
+    )
+    if RADIUS_UDP_ENABLED:
+        await udp_server.start()
+    if RADIUS_COA_ENABLED:
+        # Suspensions, expiries and speed changes reach online subscribers
+        cache_invalidator.listeners.append(coa_dispatcher.on_change)
+        coa_dispatcher.start(database)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     logger.info("Shutting down Radius API")
+    if preparing is not None:
+        preparing.cancel()
+    await cache_invalidator.stop()
+    await coa_dispatcher.stop()
+    await session_reaper.stop()
+    await snapshot_store.stop()
+    await realm_resolver.stop()
+    await accounting_spool.stop()
+    if RADIUS_UDP_ENABLED:
+        await udp_server.stop()
+    # Flush buffered accounting before the connection goes away
+    await accounting_buffer.drain()
+    await post_auth_buffer.drain()
+    await usage_rollups.drain()
     await db.close_database_connection()
+    log_pipeline.stop()
 
 # Include RADIUS routes
 app.include_router(radius_routes.router)
@@ -27,6 +27,26 @@ class RadiusProfile(BaseModel):
     priority: Optional[int] = None  # 1-8 for MikroTik queue priority
     vlan_id: Optional[int] = None    # VLAN ID if using VLANs
     
+    @classmethod
+    def from_package(cls, package: dict) -> "RadiusProfile":
+        """Build a profile from a packages collection document"""
+        return cls(
+            name=package.get("name", "default"),
+            download_speed=package["download_speed"],
+            upload_speed=package["upload_speed"],
+            burst_download=package.get("burst_download"),
+            burst_upload=package.get("burst_upload"),
+            threshold_download=package.get("threshold_download"),
+            threshold_upload=package.get("threshold_upload"),
+            burst_time=package.get("burst_time"),
+            service_type=package.get("service_type"),
+            address_pool=package.get("address_pool"),
+            session_timeout=package.get("session_timeout"),
+            idle_timeout=package.get("idle_timeout"),
+            priority=package.get("priority"),
+            vlan_id=package.get("vlan_id")
+        )
+
     @validator('priority')
     def validate_priority(cls, v):
         if v is not None and not (1 <= v <= 8):
@@ -0,0 +1,391 @@
+"""Dynamic Authorization client (RFC 5176).
+
+Pushes changes to subscribers that are already online: a package whose
+speeds change gets a CoA-Request with the new Mikrotik-Rate-Limit on every
+live session, and a customer who is suspended or expires gets a
+Disconnect-Request. Sessions come from the radius_sessions registry, so
+only NAS devices that actually carry the subscriber are contacted.
+Disabled unless RADIUS_COA_ENABLED is set.
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import ipaddress
+import logging
+import os
+import time
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from ..models.radius_models import RadiusProfile
+from ..utils.handlers import expiry_epoch, is_expired
+from ..utils.subscribers import LOGIN_STATUSES
+from .packet import (
+    COA_REQUEST, COA_ACK, DISCONNECT_REQUEST, DISCONNECT_ACK,
+    PacketError, decode_packet, encode_request, verify_reply
+)
+from .server import ClientTable, RADIUS_CLIENTS
+
+logger = logging.getLogger(__name__)
+
+RADIUS_COA_ENABLED = os.getenv("RADIUS_COA_ENABLED", "false").lower() in ("1", "true", "yes")
+RADIUS_COA_PORT = int(os.getenv("RADIUS_COA_PORT", "3799"))
+# Same format as RADIUS_CLIENTS, which it defaults to
+RADIUS_COA_CLIENTS = os.getenv("RADIUS_COA_CLIENTS", RADIUS_CLIENTS)
+RADIUS_COA_TIMEOUT = float(os.getenv("RADIUS_COA_TIMEOUT", "2"))  # seconds, doubled per retry
+RADIUS_COA_RETRIES = int(os.getenv("RADIUS_COA_RETRIES", "2"))
+RADIUS_COA_CONCURRENCY = int(os.getenv("RADIUS_COA_CONCURRENCY", "256"))  # requests in flight
+RADIUS_COA_NAS_CONCURRENCY = int(os.getenv("RADIUS_COA_NAS_CONCURRENCY", "32"))  # per NAS
+RADIUS_COA_BATCH_SIZE = int(os.getenv("RADIUS_COA_BATCH_SIZE", "500"))  # sessions per fan-out step
+RADIUS_COA_EXPIRY_SWEEP = float(os.getenv("RADIUS_COA_EXPIRY_SWEEP", "60"))  # seconds, 0 to disable
+
+# Package fields that end up in Mikrotik-Rate-Limit
+RATE_LIMIT_FIELDS = {
+    "download_speed", "upload_speed", "burst_download", "burst_upload",
+    "threshold_download", "threshold_upload", "burst_time", "priority"
+}
+# Customer fields that can change what an online subscriber is entitled to
+SESSION_FIELDS = {"status", "expiry", "expiry_epoch", "package"}
+
+SESSION_PROJECTION = {"_id": 0, "username": 1, "session_id": 1, "nas_ip_address": 1, "framed_ip_address": 1}
+
+class _CoaProtocol(asyncio.DatagramProtocol):
+    def __init__(self, client: "CoaClient"):
+        self.client = client
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.client.received(data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        logger.warning("CoA socket error: %s", exc)
+
+class CoaClient:
+    """Sends CoA and Disconnect requests and matches the replies.
+
+    Each NAS has its own identifier pool, sized to the per-NAS concurrency,
+    so a slow NAS holds up only its own requests. Unanswered requests are retransmitted
+    unchanged, as RFC 5176 requires, with the timeout doubling each time.
+    """
+
+    def __init__(
+        self,
+        clients: ClientTable,
+        port: int = RADIUS_COA_PORT,
+        timeout: float = RADIUS_COA_TIMEOUT,
+        retries: int = RADIUS_COA_RETRIES,
+        concurrency: int = RADIUS_COA_CONCURRENCY,
+        nas_concurrency: int = RADIUS_COA_NAS_CONCURRENCY
+    ):
+        self.clients = clients
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.nas_concurrency = min(nas_concurrency, 256)
+        self._limit = asyncio.Semaphore(concurrency)
+        self._identifiers: Dict[str, asyncio.Queue] = {}
+        self._pending: Dict[Tuple[str, int], Tuple[asyncio.Future, bytes, bytes]] = {}
+        self._transport = None
+        self.counters = {
+            "sent": 0, "acked": 0, "naked": 0, "timeouts": 0, "retransmits": 0,
+            "no_secret": 0, "no_address": 0, "unencodable": 0, "bad_replies": 0
+        }
+
+    async def _endpoint(self):
+        if self._transport is None:
+            loop = asyncio.get_running_loop()
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _CoaProtocol(self),
+                local_addr=("0.0.0.0", 0)
+            )
+        return self._transport
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _identifier_pool(self, nas: str) -> asyncio.Queue:
+        pool = self._identifiers.get(nas)
+        if pool is None:
+            # Only as many identifiers as requests we allow in flight to the NAS
+            pool = self._identifiers[nas] = asyncio.Queue()
+            for identifier in range(self.nas_concurrency):
+                pool.put_nowait(identifier)
+        return pool
+
+    def received(self, data: bytes, addr) -> None:
+        entry = self._pending.get((addr[0], data[1])) if len(data) >= 20 else None
+        if entry is None:
+            return
+        future, authenticator, secret = entry
+        if future.done():
+            return
+        if not verify_reply(data, authenticator, secret):
+            self.counters["bad_replies"] += 1
+            logger.warning("Dropping CoA reply with a bad authenticator from %s", addr[0])
+            return
+        try:
+            future.set_result(decode_packet(data))
+        except PacketError as e:
+            self.counters["bad_replies"] += 1
+            logger.warning("Malformed CoA reply from %s: %s", addr[0], e)
+
+    async def send(self, nas: str, code: int, attributes: List[Tuple[str, str]]) -> Optional[bool]:
+        """True on ACK, False on NAK, None when the NAS could not be reached"""
+        try:
+            ipaddress.ip_address(nas)
+        except ValueError:
+            # Sessions seen only by NAS-Identifier have no address to send to
+            self.counters["no_address"] += 1
+            return None
+        secret = self.clients.secret_for(nas)
+        if secret is None:
+            self.counters["no_secret"] += 1
+            return None
+
+        transport = await self._endpoint()
+        pool = self._identifier_pool(nas)
+        # Wait for the NAS's own identifier first, so a NAS that stops
+        # answering does not hold global slots while its pool is empty
+        identifier = await pool.get()
+        try:
+            async with self._limit:
+                try:
+                    data = encode_request(code, identifier, attributes, secret)
+                except (PacketError, ValueError) as e:
+                    self.counters["unencodable"] += 1
+                    logger.warning("Cannot send CoA code %d to %s: %s", code, nas, e)
+                    return None
+                future = asyncio.get_running_loop().create_future()
+                self._pending[(nas, identifier)] = (future, data[4:20], secret)
+                self.counters["sent"] += 1
+                for attempt in range(self.retries + 1):
+                    if attempt:
+                        self.counters["retransmits"] += 1
+                    transport.sendto(data, (nas, self.port))
+                    try:
+                        reply = await asyncio.wait_for(asyncio.shield(future), self.timeout * 2 ** attempt)
+                    except asyncio.TimeoutError:
+                        continue
+                    acked = reply.code in (COA_ACK, DISCONNECT_ACK)
+                    self.counters["acked" if acked else "naked"] += 1
+                    if not acked:
+                        logger.info(
+                            "NAS %s refused CoA code %d for %s: %s",
+                            nas, code, dict(attributes).get("User-Name"), reply.value("Error-Cause")
+                        )
+                    return acked
+                self.counters["timeouts"] += 1
+                return None
+        finally:
+            self._pending.pop((nas, identifier), None)
+            pool.put_nowait(identifier)
+
+    def stats(self) -> Dict:
+        return {**self.counters, "in_flight": len(self._pending)}
+
+def session_attributes(session: Dict) -> List[Tuple[str, str]]:
+    """Attributes that identify one session to the NAS"""
+    attributes = [("User-Name", session["username"]), ("Acct-Session-Id", session["session_id"])]
+    if session.get("framed_ip_address"):
+        attributes.append(("Framed-IP-Address", session["framed_ip_address"]))
+    return attributes
+
+class CoaDispatcher:
+    """Turns customer and package changes into CoA/Disconnect fan-outs.
+
+    Changes are queued and coalesced, so a package edited five times in a
+    row is pushed once with its final rate. Jobs re-read the customer or
+    package when they run rather than trusting the triggering change.
+    Sessions are streamed from radius_sessions in batches and each batch is
+    sent concurrently, within the client's global and per-NAS limits.
+    """
+
+    def __init__(
+        self,
+        client: CoaClient,
+        batch_size: int = RADIUS_COA_BATCH_SIZE,
+        sweep_interval: float = RADIUS_COA_EXPIRY_SWEEP
+    ):
+        self.client = client
+        self.batch_size = batch_size
+        self.sweep_interval = sweep_interval
+        self._jobs: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.counters = {"jobs": 0, "coalesced": 0, "coa": 0, "disconnects": 0, "failed": 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, database) -> None:
+        if self._tasks:
+            return
+        if not len(self.client.clients):
+            logger.warning("CoA enabled without RADIUS_COA_CLIENTS or RADIUS_CLIENTS; nothing will be sent")
+        self._tasks = [asyncio.create_task(self._run(database))]
+        if self.sweep_interval > 0:
+            self._tasks.append(asyncio.create_task(self._sweep(database)))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.client.close()
+
+    def _enqueue(self, kind: str, target: str) -> None:
+        if not self._tasks:
+            return
+        key = (kind, target)
+        if key in self._jobs:
+            self.counters["coalesced"] += 1
+            return
+        self._jobs[key] = None
+        self._wakeup.set()
+
+    def package_changed(self, package_id: str) -> None:
+        """Push the package's current rate limit to its online subscribers"""
+        self._enqueue("package", package_id)
+
+    def customer_changed(self, customer_id: str) -> None:
+        """Disconnect the customer if they may no longer log in, else re-apply their rate"""
+        self._enqueue("customer", customer_id)
+
+    def disconnect_customer(self, customer_id: str) -> None:
+        self._enqueue("disconnect", customer_id)
+
+    def on_change(self, collection_name: str, change: Dict) -> None:
+        """Change stream listener for the customers and packages collections"""
+        operation = change["operationType"]
+        document_id = str(change["documentKey"]["_id"])
+        if operation == "insert":
+            return
+        if operation == "update":
+            description = change.get("updateDescription", {})
+            touched = set(description.get("updatedFields", {})) | set(description.get("removedFields", []))
+            fields = RATE_LIMIT_FIELDS if collection_name == "packages" else SESSION_FIELDS
+            if not {field.split(".")[0] for field in touched} & fields:
+                return
+        if collection_name == "packages":
+            if operation != "delete":
+                self.package_changed(document_id)
+        elif operation == "delete":
+            self.disconnect_customer(document_id)
+        else:
+            self.customer_changed(document_id)
+
+    async def _run(self, database) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._jobs:
+                (kind, target), _ = self._jobs.popitem(last=False)
+                self.counters["jobs"] += 1
+                try:
+                    if kind == "package":
+                        await self.apply_package(database, target)
+                    elif kind == "customer":
+                        await self.apply_customer(database, target)
+                    else:
+                        await self.disconnect(database, target)
+                except PyMongoError as e:
+                    logger.error("CoA %s job for %s failed: %s", kind, target, e)
+
+    async def _sweep(self, database) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                for customer_id in await self.expired_online(database):
+                    self.disconnect_customer(customer_id)
+            except PyMongoError as e:
+                logger.error("CoA expiry sweep failed: %s", e)
+
+    async def expired_online(self, database) -> List[str]:
+        """Customers with a live session whose subscription has run out.
+
+        Catches expiries that happen by the clock passing, which no change
+        stream event announces.
+        """
+        online = await database.get_collection("radius_sessions").distinct("customer_id")
+        ids = [ObjectId(customer_id) for customer_id in online if ObjectId.is_valid(customer_id)]
+        expired = []
+        for start in range(0, len(ids), 1000):
+            cursor = database.get_collection("customers").find(
+                {"_id": {"$in": ids[start:start + 1000]}, "expiry_epoch": {"$lte": int(time.time())}},
+                {"_id": 1}
+            )
+            expired.extend([str(customer["_id"]) async for customer in cursor])
+        return expired
+
+    async def apply_package(self, database, package_id: str) -> Tuple[int, int]:
+        if not ObjectId.is_valid(package_id):
+            return 0, 0
+        package = await database.get_collection("packages").find_one({"_id": ObjectId(package_id)})
+        if not package:
+            return 0, 0
+        rate_limit = RadiusProfile.from_package(package).get_rate_limit()
+        logger.info("Pushing rate limit %s for package %s", rate_limit, package_id)
+        return await self._fan_out(
+            database, {"package": package_id}, COA_REQUEST, [("Mikrotik-Rate-Limit", rate_limit)]
+        )
+
+    async def apply_customer(self, database, customer_id: str) -> Tuple[int, int]:
+        if not ObjectId.is_valid(customer_id):
+            return 0, 0
+        customer = await database.get_collection("customers").find_one(
+            {"_id": ObjectId(customer_id)},
+            {"status": 1, "expiry": 1, "expiry_epoch": 1, "package": 1}
+        )
+        if (
+            not customer
+            or customer.get("status") not in LOGIN_STATUSES
+            or is_expired(expiry_epoch(customer))
+        ):
+            return await self.disconnect(database, customer_id)
+
+        # customers.package is a string id
+        package_id = customer.get("package")
+        if not package_id or not ObjectId.is_valid(package_id):
+            return 0, 0
+        package = await database.get_collection("packages").find_one({"_id": ObjectId(package_id)})
+        if not package:
+            return 0, 0
+        rate_limit = RadiusProfile.from_package(package).get_rate_limit()
+        return await self._fan_out(
+            database, {"customer_id": customer_id}, COA_REQUEST, [("Mikrotik-Rate-Limit", rate_limit)]
+        )
+
+    async def disconnect(self, database, customer_id: str) -> Tuple[int, int]:
+        return await self._fan_out(database, {"customer_id": customer_id}, DISCONNECT_REQUEST, [])
+
+    async def _fan_out(self, database, query: Dict, code: int, extra: List[Tuple[str, str]]) -> Tuple[int, int]:
+        """Send ``code`` to every session matching ``query``; (acknowledged, total)"""
+        acknowledged = total = 0
+        batch: List[Dict] = []
+        async for session in database.get_collection("radius_sessions").find(query, SESSION_PROJECTION):
+            batch.append(session)
+            if len(batch) >= self.batch_size:
+                acknowledged += await self._send_batch(batch, code, extra)
+                total += len(batch)
+                batch = []
+        if batch:
+            acknowledged += await self._send_batch(batch, code, extra)
+            total += len(batch)
+        return acknowledged, total
+
+    async def _send_batch(self, sessions: List[Dict], code: int, extra: List[Tuple[str, str]]) -> int:
+        results = await asyncio.gather(*(
+            self.client.send(session.get("nas_ip_address") or "", code, session_attributes(session) + extra)
+            for session in sessions
+        ))
+        acknowledged = sum(1 for result in results if result)
+        self.counters["coa" if code == COA_REQUEST else "disconnects"] += acknowledged
+        self.counters["failed"] += len(results) - acknowledged
+        return acknowledged
+
+    def stats(self) -> Dict:
+        return {**self.counters, "queued": len(self._jobs), **self.client.stats()}
+
+# Shared dispatcher; only started when RADIUS_COA_ENABLED is set
+coa_dispatcher = CoaDispatcher(CoaClient(ClientTable(RADIUS_COA_CLIENTS)))
@@ -0,0 +1,349 @@
+"""RADIUS packet codec (RFC 2865 / RFC 2866 / RFC 5176).
+
+Only the attributes FreeRADIUS sends us from MikroTik NAS devices and the
+ones our authorize replies use are in the dictionary; anything else is
+carried through by number and ignored by the handlers.
+"""
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import hmac
+import ipaddress
+import os
+import struct
+
+# Packet codes
+ACCESS_REQUEST = 1
+ACCESS_ACCEPT = 2
+ACCESS_REJECT = 3
+ACCOUNTING_REQUEST = 4
+ACCOUNTING_RESPONSE = 5
+DISCONNECT_REQUEST = 40
+DISCONNECT_ACK = 41
+DISCONNECT_NAK = 42
+COA_REQUEST = 43
+COA_ACK = 44
+COA_NAK = 45
+
+# Requests whose authenticator is an MD5 over the packet rather than random
+SIGNED_REQUESTS = (ACCOUNTING_REQUEST, DISCONNECT_REQUEST, COA_REQUEST)
+
+HEADER_LENGTH = 20
+MAX_PACKET_LENGTH = 4096
+
+VENDOR_SPECIFIC = 26
+MESSAGE_AUTHENTICATOR = 80
+MIKROTIK_VENDOR_ID = 14988
+
+# Attribute dictionary: number -> (name, type, enumerated values)
+ATTRIBUTES: Dict[int, Tuple[str, str, Optional[Dict[int, str]]]] = {
+    1: ("User-Name", "string", None),
+    2: ("User-Password", "octets", None),
+    3: ("CHAP-Password", "octets", None),
+    4: ("NAS-IP-Address", "ipaddr", None),
+    5: ("NAS-Port", "integer", None),
+    6: ("Service-Type", "integer", {
+        1: "Login-User", 2: "Framed-User", 3: "Callback-Login-User",
+        4: "Callback-Framed-User", 5: "Outbound-User", 6: "Administrative-User",
+        7: "NAS-Prompt-User", 8: "Authenticate-Only", 9: "Callback-NAS-Prompt",
+        10: "Call-Check", 11: "Callback-Administrative"
+    }),
+    7: ("Framed-Protocol", "integer", {
+        1: "PPP", 2: "SLIP", 3: "ARAP", 4: "Gandalf-SLML",
+        5: "Xylogics-IPX-SLIP", 6: "X.75-Synchronous", 7: "GPRS-PDP-Context"
+    }),
+    8: ("Framed-IP-Address", "ipaddr", None),
+    18: ("Reply-Message", "string", None),
+    24: ("State", "octets", None),
+    25: ("Class", "octets", None),
+    27: ("Session-Timeout", "integer", None),
+    28: ("Idle-Timeout", "integer", None),
+    30: ("Called-Station-Id", "string", None),
+    31: ("Calling-Station-Id", "string", None),
+    32: ("NAS-Identifier", "string", None),
+    40: ("Acct-Status-Type", "integer", {
+        1: "Start", 2: "Stop", 3: "Interim-Update", 7: "Accounting-On", 8: "Accounting-Off"
+    }),
+    41: ("Acct-Delay-Time", "integer", None),
+    42: ("Acct-Input-Octets", "integer", None),
+    43: ("Acct-Output-Octets", "integer", None),
+    44: ("Acct-Session-Id", "string", None),
+    45: ("Acct-Authentic", "integer", {1: "RADIUS", 2: "Local", 3: "Remote"}),
+    46: ("Acct-Session-Time", "integer", None),
+    47: ("Acct-Input-Packets", "integer", None),
+    48: ("Acct-Output-Packets", "integer", None),
+    49: ("Acct-Terminate-Cause", "integer", {
+        1: "User-Request", 2: "Lost-Carrier", 3: "Lost-Service", 4: "Idle-Timeout",
+        5: "Session-Timeout", 6: "Admin-Reset", 7: "Admin-Reboot", 8: "Port-Error",
+        9: "NAS-Error", 10: "NAS-Request", 11: "NAS-Reboot", 12: "Port-Unneeded",
+        13: "Port-Preempted", 14: "Port-Suspended", 15: "Service-Unavailable",
+        16: "Callback", 17: "User-Error", 18: "Host-Request"
+    }),
+    52: ("Acct-Input-Gigawords", "integer", None),
+    53: ("Acct-Output-Gigawords", "integer", None),
+    55: ("Event-Timestamp", "integer", None),
+    60: ("CHAP-Challenge", "octets", None),
+    61: ("NAS-Port-Type", "integer", {
+        0: "Async", 1: "Sync", 2: "ISDN", 3: "ISDN-V120", 4: "ISDN-V110",
+        5: "Virtual", 15: "Ethernet", 19: "Wireless-802.11"
+    }),
+    64: ("Tunnel-Type", "tagged-integer", {13: "VLAN"}),
+    65: ("Tunnel-Medium-Type", "tagged-integer", {6: "IEEE-802"}),
+    80: ("Message-Authenticator", "octets", None),
+    81: ("Tunnel-Private-Group-Id", "string", None),
+    87: ("NAS-Port-Id", "string", None),
+    88: ("Framed-Pool", "string", None),
+    101: ("Error-Cause", "integer", {
+        201: "Residual-Session-Context-Removed", 401: "Unsupported-Attribute",
+        402: "Missing-Attribute", 403: "NAS-Identification-Mismatch", 404: "Invalid-Request",
+        405: "Unsupported-Service", 503: "Session-Context-Not-Found",
+        504: "Session-Context-Not-Removable", 506: "Resources-Unavailable"
+    }),
+}
+
+# MikroTik vendor-specific attributes (vendor 14988)
+MIKROTIK_ATTRIBUTES: Dict[int, Tuple[str, str, Optional[Dict[int, str]]]] = {
+    1: ("Mikrotik-Recv-Limit", "integer", None),
+    2: ("Mikrotik-Xmit-Limit", "integer", None),
+    3: ("Mikrotik-Group", "string", None),
+    8: ("Mikrotik-Rate-Limit", "string", None),
+    10: ("Mikrotik-Address-List", "string", None),
+}
+
+# Reverse lookups: name -> (vendor id or None, number, type, values by number, values by name)
+ATTRIBUTES_BY_NAME: Dict[str, Tuple[Optional[int], int, str, Optional[Dict[int, str]], Optional[Dict[str, int]]]] = {}
+for _vendor, _table in ((None, ATTRIBUTES), (MIKROTIK_VENDOR_ID, MIKROTIK_ATTRIBUTES)):
+    for _number, (_name, _type, _values) in _table.items():
+        ATTRIBUTES_BY_NAME[_name] = (
+            _vendor, _number, _type, _values,
+            {label: value for value, label in _values.items()} if _values else None
+        )
+
+class PacketError(ValueError):
+    """Raised for malformed or unverifiable packets"""
+
+class Packet:
+    """A decoded RADIUS packet.
+
+    ``attributes`` maps attribute names to lists of raw values (bytes) so the
+    codec never has to guess how a handler wants to read them.
+    """
+
+    def __init__(self, code: int, identifier: int, authenticator: bytes, attributes: Dict[str, List[bytes]], raw: bytes = b""):
+        self.code = code
+        self.identifier = identifier
+        self.authenticator = authenticator
+        self.attributes = attributes
+        self.raw = raw
+
+    def get(self, name: str) -> Optional[bytes]:
+        values = self.attributes.get(name)
+        return values[0] if values else None
+
+    def value(self, name: str):
+        """First value of ``name`` decoded according to the dictionary"""
+        raw = self.get(name)
+        if raw is None:
+            return None
+        return decode_value(name, raw)
+
+    def to_dict(self) -> Dict[str, str]:
+        """Attribute names to decoded string values, as rlm_rest would send them"""
+        result = {}
+        for name in self.attributes:
+            if name in ("User-Password", "CHAP-Password", "Message-Authenticator"):
+                continue
+            value = self.value(name)
+            if isinstance(value, bytes):
+                # Octets are rendered the way FreeRADIUS prints them
+                value = "0x" + value.hex()
+            result[name] = value if isinstance(value, str) else str(value)
+        return result
+
+def decode_value(name: str, raw: bytes):
+    definition = ATTRIBUTES_BY_NAME.get(name)
+    if definition is None:
+        return raw
+    _, _, kind, values, _ = definition
+    if kind == "string":
+        return raw.decode("utf-8", errors="replace")
+    if kind == "ipaddr" and len(raw) == 4:
+        return str(ipaddress.IPv4Address(raw))
+    if kind in ("integer", "tagged-integer") and len(raw) == 4:
+        number = struct.unpack("!I", raw)[0]
+        if kind == "tagged-integer":
+            number &= 0xFFFFFF
+        return values.get(number, str(number)) if values else number
+    return raw
+
+def decode_packet(data: bytes) -> Packet:
+    if len(data) < HEADER_LENGTH:
+        raise PacketError("packet shorter than header")
+    code, identifier, length = struct.unpack("!BBH", data[:4])
+    if length < HEADER_LENGTH or length > MAX_PACKET_LENGTH or length > len(data):
+        raise PacketError(f"invalid length {length}")
+    authenticator = data[4:20]
+    attributes: Dict[str, List[bytes]] = {}
+    position = HEADER_LENGTH
+    while position < length:
+        if position + 2 > length:
+            raise PacketError("truncated attribute header")
+        number, attr_length = data[position], data[position + 1]
+        if attr_length < 2 or position + attr_length > length:
+            raise PacketError(f"invalid length for attribute {number}")
+        value = data[position + 2:position + attr_length]
+        position += attr_length
+        if number == VENDOR_SPECIFIC and len(value) >= 4:
+            _decode_vendor(value, attributes)
+            continue
+        name = ATTRIBUTES[number][0] if number in ATTRIBUTES else f"Attr-{number}"
+        attributes.setdefault(name, []).append(value)
+    return Packet(code, identifier, authenticator, attributes, data[:length])
+
+def _decode_vendor(value: bytes, attributes: Dict[str, List[bytes]]) -> None:
+    vendor_id = struct.unpack("!I", value[:4])[0]
+    position = 4
+    while position + 2 <= len(value):
+        number, attr_length = value[position], value[position + 1]
+        if attr_length < 2 or position + attr_length > len(value):
+            return
+        if vendor_id == MIKROTIK_VENDOR_ID and number in MIKROTIK_ATTRIBUTES:
+            name = MIKROTIK_ATTRIBUTES[number][0]
+        else:
+            name = f"Vendor-{vendor_id}-Attr-{number}"
+        attributes.setdefault(name, []).append(value[position + 2:position + attr_length])
+        position += attr_length
+
+def encode_attribute(name: str, value: str) -> bytes:
+    """Encode one named attribute from its dictionary name and string value"""
+    definition = ATTRIBUTES_BY_NAME.get(name)
+    if definition is None:
+        raise PacketError(f"unknown attribute {name}")
+    vendor_id, number, kind, _, values = definition
+    if kind == "string":
+        payload = value.encode("utf-8")
+    elif kind == "ipaddr":
+        payload = ipaddress.IPv4Address(value).packed
+    elif kind in ("integer", "tagged-integer"):
+        number_value = values[value] if values and value in values else int(value)
+        payload = struct.pack("!I", number_value)
+        if kind == "tagged-integer":
+            payload = b"\x00" + payload[1:]
+    else:
+        payload = value.encode("utf-8") if isinstance(value, str) else value
+    if len(payload) > 247:
+        raise PacketError(f"value too long for {name}")
+    if vendor_id is None:
+        return bytes((number, len(payload) + 2)) + payload
+    vendor_attr = bytes((number, len(payload) + 2)) + payload
+    return bytes((VENDOR_SPECIFIC, len(vendor_attr) + 6)) + struct.pack("!I", vendor_id) + vendor_attr
+
+def decrypt_password(encrypted: bytes, secret: bytes, authenticator: bytes) -> str:
+    """Recover a PAP User-Password (RFC 2865 section 5.2)"""
+    if not encrypted or len(encrypted) % 16:
+        raise PacketError("invalid User-Password length")
+    result = bytearray()
+    previous = authenticator
+    for offset in range(0, len(encrypted), 16):
+        block = encrypted[offset:offset + 16]
+        digest = hashlib.md5(secret + previous).digest()
+        result.extend(a ^ b for a, b in zip(block, digest))
+        previous = block
+    return result.rstrip(b"\x00").decode("utf-8", errors="replace")
+
+def encrypt_password(password: str, secret: bytes, authenticator: bytes) -> bytes:
+    """Hide a PAP User-Password; used by clients and benchmarks"""
+    data = password.encode("utf-8")
+    data += b"\x00" * (-len(data) % 16 if data else 16)
+    result = bytearray()
+    previous = authenticator
+    for offset in range(0, len(data), 16):
+        digest = hashlib.md5(secret + previous).digest()
+        block = bytes(a ^ b for a, b in zip(data[offset:offset + 16], digest))
+        result.extend(block)
+        previous = block
+    return bytes(result)
+
+def verify_chap(packet: Packet, password: str) -> bool:
+    """Check CHAP-Password against a known cleartext password"""
+    chap = packet.get("CHAP-Password")
+    if not chap or len(chap) != 17:
+        return False
+    challenge = packet.get("CHAP-Challenge") or packet.authenticator
+    expected = hashlib.md5(chap[:1] + password.encode("utf-8") + challenge).digest()
+    return hmac.compare_digest(expected, chap[1:])
+
+def _message_authenticator_offset(data: bytes) -> Optional[int]:
+    position = HEADER_LENGTH
+    while position + 2 <= len(data):
+        number, attr_length = data[position], data[position + 1]
+        if attr_length < 2:
+            return None
+        if number == MESSAGE_AUTHENTICATOR and attr_length == 18:
+            return position + 2
+        position += attr_length
+    return None
+
+def verify_message_authenticator(packet: Packet, secret: bytes, required: bool = False) -> bool:
+    """Validate Message-Authenticator (RFC 3579); packets without one pass
+    unless ``required``"""
+    offset = _message_authenticator_offset(packet.raw)
+    if offset is None:
+        return not required
+    received = packet.raw[offset:offset + 16]
+    zeroed = packet.raw[:offset] + b"\x00" * 16 + packet.raw[offset + 16:]
+    expected = hmac.new(secret, zeroed, hashlib.md5).digest()
+    return hmac.compare_digest(expected, received)
+
+def verify_accounting_request(packet: Packet, secret: bytes) -> bool:
+    """Accounting-Request authenticators are an MD5 over the packet (RFC 2866)"""
+    raw = packet.raw
+    expected = hashlib.md5(raw[:4] + b"\x00" * 16 + raw[HEADER_LENGTH:] + secret).digest()
+    return hmac.compare_digest(expected, packet.authenticator)
+
+def encode_reply(
+    code: int,
+    request: Packet,
+    secret: bytes,
+    attributes: bytes = b"",
+    message_authenticator: bool = True
+) -> bytes:
+    """Build a response packet with a valid Response Authenticator"""
+    if message_authenticator:
+        attributes += bytes((MESSAGE_AUTHENTICATOR, 18)) + b"\x00" * 16
+    length = HEADER_LENGTH + len(attributes)
+    if length > MAX_PACKET_LENGTH:
+        raise PacketError("reply too large")
+    header = struct.pack("!BBH", code, request.identifier, length)
+    if message_authenticator:
+        signed = hmac.new(secret, header + request.authenticator + attributes, hashlib.md5).digest()
+        attributes = attributes[:-16] + signed
+    authenticator = hashlib.md5(header + request.authenticator + attributes + secret).digest()
+    return header + authenticator + attributes
+
+def encode_request(
+    code: int,
+    identifier: int,
+    attributes: List[Tuple[str, str]],
+    secret: bytes,
+    password: Optional[str] = None
+) -> bytes:
+    """Build a request packet for the CoA client, benchmarks and test tooling"""
+    body = b"".join(encode_attribute(name, value) for name, value in attributes)
+    if code in SIGNED_REQUESTS:
+        header = struct.pack("!BBH", code, identifier, HEADER_LENGTH + len(body))
+        authenticator = hashlib.md5(header + b"\x00" * 16 + body + secret).digest()
+        return header + authenticator + body
+    authenticator = os.urandom(16)
+    if password is not None:
+        encrypted = encrypt_password(password, secret, authenticator)
+        body = bytes((2, len(encrypted) + 2)) + encrypted + body
+    # Message-Authenticator first, as the Blast-RADIUS mitigations ask
+    body = bytes((MESSAGE_AUTHENTICATOR, 18)) + b"\x00" * 16 + body
+    header = struct.pack("!BBH", code, identifier, HEADER_LENGTH + len(body))
+    signed = hmac.new(secret, header + authenticator + body, hashlib.md5).digest()
+    return header + authenticator + body[:2] + signed + body[18:]
+
+def verify_reply(reply: bytes, request_authenticator: bytes, secret: bytes) -> bool:
+    """Check a response's authenticator against the request that caused it"""
+    expected = hashlib.md5(reply[:4] + request_authenticator + reply[HEADER_LENGTH:] + secret).digest()
+    return hmac.compare_digest(expected, reply[4:20])
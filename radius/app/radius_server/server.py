@@ -0,0 +1,301 @@
+"""Optional in-process RADIUS server.
+
+Accepts Access-Request and Accounting-Request packets straight from the NAS
+and runs them through the same handlers as the rlm_rest endpoints, removing
+the FreeRADIUS -> HTTP hop. Disabled unless RADIUS_UDP_ENABLED is set.
+"""
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+import asyncio
+import hmac
+import ipaddress
+import logging
+import os
+import time
+from ..config.database import db
+from ..utils.handlers import (
+    authorize_user, process_accounting, record_post_auth
+)
+from ..utils.admission import AdmissionRejected
+from ..utils.circuit import DatabaseUnavailable
+from .packet import (
+    ACCESS_REQUEST, ACCESS_ACCEPT, ACCESS_REJECT, ACCOUNTING_REQUEST, ACCOUNTING_RESPONSE,
+    Packet, PacketError, decode_packet, decrypt_password, encode_attribute, encode_reply,
+    verify_accounting_request, verify_chap, verify_message_authenticator
+)
+
+logger = logging.getLogger(__name__)
+
+# Listener settings (override through the environment)
+RADIUS_UDP_ENABLED = os.getenv("RADIUS_UDP_ENABLED", "false").lower() in ("1", "true", "yes")
+RADIUS_UDP_HOST = os.getenv("RADIUS_UDP_HOST", "0.0.0.0")
+RADIUS_AUTH_PORT = int(os.getenv("RADIUS_AUTH_PORT", "1812"))
+RADIUS_ACCT_PORT = int(os.getenv("RADIUS_ACCT_PORT", "1813"))
+# NAS shared secrets, e.g. "10.0.0.1=secret,10.0.1.0/24=other"
+RADIUS_CLIENTS = os.getenv("RADIUS_CLIENTS", "")
+# Drop Access-Requests without Message-Authenticator; forged replies to
+# them are possible (Blast-RADIUS, CVE-2024-3596). Only turn off for NAS
+# devices that cannot send it.
+RADIUS_REQUIRE_MESSAGE_AUTHENTICATOR = os.getenv(
+    "RADIUS_REQUIRE_MESSAGE_AUTHENTICATOR", "true"
+).lower() in ("1", "true", "yes")
+# Retransmissions seen within this window get the original reply
+RADIUS_DUPLICATE_WINDOW = float(os.getenv("RADIUS_DUPLICATE_WINDOW", "10"))  # seconds
+
+class ClientTable:
+    """Shared secrets by NAS address, with CIDR ranges as a fallback"""
+
+    def __init__(self, spec: str = ""):
+        self._hosts: Dict[str, bytes] = {}
+        self._networks = []
+        for entry in filter(None, (part.strip() for part in spec.split(","))):
+            address, _, secret = entry.partition("=")
+            if not secret:
+                logger.warning(f"Ignoring RADIUS client without a secret: {address}")
+                continue
+            network = ipaddress.ip_network(address.strip(), strict=False)
+            if network.num_addresses == 1:
+                self._hosts[str(network.network_address)] = secret.encode("utf-8")
+            else:
+                self._networks.append((network, secret.encode("utf-8")))
+
+    def __len__(self) -> int:
+        return len(self._hosts) + len(self._networks)
+
+    def secret_for(self, address: str) -> Optional[bytes]:
+        secret = self._hosts.get(address)
+        if secret is not None or not self._networks:
+            return secret
+        ip = ipaddress.ip_address(address)
+        for network, network_secret in self._networks:
+            if ip in network:
+                return network_secret
+        return None
+
+class DuplicateCache:
+    """Recent requests keyed by source, identifier and authenticator.
+
+    A key with a ``None`` reply is still in flight, so retransmissions are
+    dropped instead of being processed twice.
+    """
+
+    def __init__(self, window: float = RADIUS_DUPLICATE_WINDOW):
+        self.window = window
+        self._entries: "OrderedDict[tuple, Tuple[float, Optional[bytes]]]" = OrderedDict()
+
+    def _purge(self, now: float) -> None:
+        while self._entries:
+            key, (expires, _) = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            self._entries.popitem(last=False)
+
+    def lookup(self, key) -> Tuple[bool, Optional[bytes]]:
+        self._purge(time.monotonic())
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        return True, entry[1]
+
+    def begin(self, key) -> None:
+        self._entries[key] = (time.monotonic() + self.window, None)
+
+    def complete(self, key, reply: Optional[bytes]) -> None:
+        if reply is None:
+            # Nothing was sent, so let the NAS retry
+            self._entries.pop(key, None)
+        else:
+            self._entries[key] = (time.monotonic() + self.window, reply)
+            self._entries.move_to_end(key)
+
+# Per-customer values that would only churn the reply_attribute cache
+UNCACHED_REPLY_ATTRIBUTES = {"Session-Timeout"}
+
+@lru_cache(maxsize=4096)
+def reply_attribute(name: str, value: str) -> bytes:
+    """Encoded reply attribute; cached because replies repeat per package"""
+    try:
+        return encode_attribute(name, value)
+    except (PacketError, ValueError) as e:
+        # Logged once per distinct value thanks to the cache
+        logger.warning(f"Cannot send {name}={value} over UDP: {str(e)}")
+        return b""
+
+def encode_reply_attributes(reply: Dict) -> bytes:
+    """Turn the reply:* part of a rest-module response into RADIUS attributes"""
+    parts = []
+    for key, attribute in reply.items():
+        if not key.startswith("reply:"):
+            continue
+        name = key[len("reply:"):]
+        encode = reply_attribute.__wrapped__ if name in UNCACHED_REPLY_ATTRIBUTES else reply_attribute
+        for value in attribute.get("value", []):
+            parts.append(encode(name, str(value)))
+    return b"".join(parts)
+
+class RadiusProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: "RadiusUdpServer"):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.server.received(self.transport, data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        logger.warning(f"RADIUS socket error: {str(exc)}")
+
+class RadiusUdpServer:
+    """Authentication and accounting listeners sharing one client table"""
+
+    def __init__(
+        self,
+        clients: ClientTable,
+        host: str = RADIUS_UDP_HOST,
+        auth_port: int = RADIUS_AUTH_PORT,
+        acct_port: int = RADIUS_ACCT_PORT,
+        require_message_authenticator: bool = RADIUS_REQUIRE_MESSAGE_AUTHENTICATOR
+    ):
+        self.clients = clients
+        self.host = host
+        self.auth_port = auth_port
+        self.acct_port = acct_port
+        self.require_message_authenticator = require_message_authenticator
+        self.duplicates = DuplicateCache()
+        self._transports = []
+        self._tasks = set()
+        self.counters = {
+            "received": 0, "accepted": 0, "rejected": 0, "accounting": 0,
+            "duplicates": 0, "dropped": 0, "malformed": 0, "shed": 0, "errors": 0
+        }
+
+    async def start(self) -> None:
+        if not len(self.clients):
+            logger.warning("RADIUS UDP server enabled without RADIUS_CLIENTS; every packet will be dropped")
+        loop = asyncio.get_running_loop()
+        for port in (self.auth_port, self.acct_port):
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: RadiusProtocol(self),
+                local_addr=(self.host, port)
+            )
+            self._transports.append(transport)
+        logger.info(f"RADIUS UDP server listening on {self.host}:{self.auth_port}/{self.acct_port}")
+
+    async def stop(self) -> None:
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def received(self, transport, data: bytes, addr) -> None:
+        self.counters["received"] += 1
+        secret = self.clients.secret_for(addr[0])
+        if secret is None:
+            self.counters["dropped"] += 1
+            logger.warning("Dropping RADIUS packet from unknown client %s", addr[0])
+            return
+        try:
+            packet = decode_packet(data)
+        except PacketError as e:
+            self.counters["malformed"] += 1
+            logger.warning("Malformed RADIUS packet from %s: %s", addr[0], e)
+            return
+
+        key = (addr, packet.identifier, packet.authenticator)
+        seen, reply = self.duplicates.lookup(key)
+        if seen:
+            self.counters["duplicates"] += 1
+            if reply is not None:
+                transport.sendto(reply, addr)
+            return
+        self.duplicates.begin(key)
+
+        task = asyncio.create_task(self._handle(transport, packet, secret, addr, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, transport, packet: Packet, secret: bytes, addr, key) -> None:
+        reply = None
+        try:
+            if packet.code == ACCESS_REQUEST:
+                reply = await self._access(packet, secret)
+            elif packet.code == ACCOUNTING_REQUEST:
+                reply = await self._accounting(packet, secret)
+            else:
+                self.counters["dropped"] += 1
+                logger.warning("Unsupported RADIUS code %d from %s", packet.code, addr[0])
+        except (AdmissionRejected, DatabaseUnavailable):
+            # Unanswered, so the NAS retransmits once the storm has passed
+            self.counters["shed"] += 1
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error("Error processing RADIUS packet from %s: %s", addr[0], e)
+        self.duplicates.complete(key, reply)
+        if reply is not None:
+            transport.sendto(reply, addr)
+
+    def _reject(self, packet: Packet, secret: bytes, message: str) -> bytes:
+        self.counters["rejected"] += 1
+        record_post_auth({**packet.to_dict(), "Packet-Type": "Access-Reject", "Reply-Message": message})
+        return encode_reply(ACCESS_REJECT, packet, secret, reply_attribute("Reply-Message", message))
+
+    async def _access(self, packet: Packet, secret: bytes) -> Optional[bytes]:
+        if not verify_message_authenticator(packet, secret, self.require_message_authenticator):
+            self.counters["dropped"] += 1
+            logger.warning("Dropping Access-Request with a missing or bad Message-Authenticator")
+            return None
+
+        username = packet.value("User-Name")
+        if not username:
+            return self._reject(packet, secret, "Login invalid")
+
+        reply = await authorize_user(
+            db.get_database(),
+            username,
+            packet.value("NAS-IP-Address") or "",
+            packet.value("NAS-Identifier") or ""
+        )
+        password = reply.get("control:Cleartext-Password", {}).get("value", [None])[0]
+        if password is None:
+            message = reply.get("reply:Reply-Message", {}).get("value", ["Login invalid"])[0]
+            return self._reject(packet, secret, message)
+
+        # Authenticate locally against the credential authorize returned
+        encrypted = packet.get("User-Password")
+        if encrypted is not None:
+            valid = hmac.compare_digest(
+                decrypt_password(encrypted, secret, packet.authenticator).encode("utf-8"),
+                password.encode("utf-8")
+            )
+        else:
+            valid = verify_chap(packet, password)
+        if not valid:
+            logger.warning("Invalid password for customer: %s", username)
+            return self._reject(packet, secret, "Wrong Password")
+
+        self.counters["accepted"] += 1
+        record_post_auth({**packet.to_dict(), "Packet-Type": "Access-Accept"})
+        return encode_reply(ACCESS_ACCEPT, packet, secret, encode_reply_attributes(reply))
+
+    async def _accounting(self, packet: Packet, secret: bytes) -> Optional[bytes]:
+        if not verify_accounting_request(packet, secret):
+            self.counters["dropped"] += 1
+            logger.warning("Dropping Accounting-Request with a bad authenticator")
+            return None
+
+        status = await process_accounting(db.get_database(), packet.to_dict())
+        if status >= 500:
+            # No response, so the NAS retransmits once we can record it
+            return None
+        self.counters["accounting"] += 1
+        return encode_reply(ACCOUNTING_RESPONSE, packet, secret, message_authenticator=False)
+
+    def stats(self) -> Dict:
+        return {**self.counters, "in_flight": len(self._tasks)}
+
+# Shared server instance; only started when RADIUS_UDP_ENABLED is set
+udp_server = RadiusUdpServer(ClientTable(RADIUS_CLIENTS))
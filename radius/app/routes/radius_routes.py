@@ -1,80 +1,47 @@
 from fastapi import APIRouter, HTTPException, Depends, Response, Request
-from typing import Dict, Optional
-from ..models.radius_models import RadiusProfile
+from fastapi.responses import StreamingResponse
+from typing import Optional, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from datetime import datetime, timedelta, timezone
-from bson import ObjectId
 from ..config.database import db
+from ..utils.auth_cache import authorize_cache
+from ..utils.accounting import accounting_buffer
+from ..utils.replies import format_radius_response, package_replies
+from ..utils.handlers import authorize_user, authenticate_user, process_accounting, record_post_auth
+from ..utils.post_auth import post_auth_buffer
+from ..utils.sessions import session_reaper
+from ..utils.rollups import usage_rollups
+from ..utils.live import live_feed, LIVE_FEED_MAX_SUBSCRIBERS
+from ..utils.admission import admission, AdmissionRejected
+from ..utils.circuit import database_breaker, DatabaseUnavailable
+from ..utils.snapshot import snapshot_store
+from ..utils.spool import accounting_spool
+from ..utils.realms import realm_resolver
+from ..utils.log_pipeline import log_pipeline
+from ..radius_server.server import udp_server, RADIUS_UDP_ENABLED
+from ..radius_server.coa import coa_dispatcher, RADIUS_COA_ENABLED
+import hmac
 import logging
 import json
-import pytz
+import os
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger("radius_routes")
 
-# Configure timezone
-TIMEZONE = pytz.timezone('Africa/Nairobi')  # East Africa timezone
-
 router = APIRouter(prefix="/radius", tags=["radius"])
 
+# Bearer token for the operator endpoints (live feed, CoA). Without one they
+# only answer loopback clients. They must not be proxied through nginx.
+RADIUS_API_TOKEN = os.getenv("RADIUS_API_TOKEN", "")
+LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
 async def get_database() -> AsyncIOMotorDatabase:
     return db.get_database()
 
-def format_radius_response(data: Dict) -> Dict:
-    """Format response according to FreeRADIUS REST module specs"""
-    # FreeRADIUS expects a flat structure with control:XXX and reply:XXX
-    response = {}
-    
-    # Control attributes that should go in the control section
-    control_attrs = {
-        "Cleartext-Password",
-        "NT-Password",
-        "LM-Password",
-        "Password-With-Header",
-        "Auth-Type"
-    }
-    
-    for key, value in data.items():
-        if key in control_attrs:
-            if isinstance(value, dict):
-                response[f"control:{key}"] = value
-            else:
-                response[f"control:{key}"] = {"value": [str(value)], "op": ":="}
-        else:
-            if isinstance(value, dict):
-                response[f"reply:{key}"] = value
-            else:
-                response[f"reply:{key}"] = {"value": [str(value)], "op": ":="}
-    
-    return response
-
-def get_current_time():
-    """Get current time in East Africa timezone"""
-    # Get UTC time first
-    utc_now = datetime.now(timezone.utc)
-    # Convert to East Africa timezone
-    return utc_now.astimezone(TIMEZONE)
-
-def convert_to_timezone(dt):
-    """Convert datetime to East Africa timezone"""
-    if dt is None:
-        return None
-    if isinstance(dt, str):
-        # Parse string to datetime, assuming UTC if no timezone specified
-        try:
-            dt = datetime.fromisoformat(dt.replace('Z', '+00:00'))
-        except ValueError:
-            # If parsing fails, assume it's UTC
-            dt = datetime.fromisoformat(dt).replace(tzinfo=timezone.utc)
-    if dt.tzinfo is None:
-        # If datetime has no timezone, assume it's UTC
-        dt = dt.replace(tzinfo=timezone.utc)
-    # Convert to East Africa timezone
-    return dt.astimezone(TIMEZONE)
+def nas_of(body) -> Tuple[str, str]:
+    """NAS-IP-Address and NAS-Identifier from JSON keys or attribute names"""
+    return (
+        body.get("nas_ip_address", body.get("NAS-IP-Address", "")),
+        body.get("nas_identifier", body.get("NAS-Identifier", ""))
+    )
 
 @router.post("/authorize")
 async def radius_authorize(
@@ -85,7 +52,7 @@ async def radius_authorize(
     FreeRADIUS authorization endpoint
     POST /radius/authorize
     """
-    logger.info("Processing authorization request")
+    logger.debug("Processing authorization request")
     
     try:
         body = await request.json()
@@ -93,10 +60,12 @@ async def radius_authorize(
         body = {}
     
     username = body.get("username", "")
+    nas_ip_address, nas_identifier = nas_of(body)
     if not username:
         # Extract from User-Name if not in body
         form = await request.form()
         username = form.get("User-Name", "")
+        nas_ip_address, nas_identifier = nas_of(form)
     
     if not username:
         logger.warning("No username provided in request")
@@ -104,77 +73,100 @@ async def radius_authorize(
             "Reply-Message": "Login invalid"
         })
     
-    # Find customer by username
-    logger.info(f"Authorization request for user: {username}")
-    customer = await db.get_collection("customers").find_one({
-        "username": username
-    })
-    
-    if not customer:
-        logger.warning(f"Customer not found: {username}")
-        return format_radius_response({
-            "Reply-Message": "Login invalid"
-        })
-    
-    # Check if customer is active
-    if customer.get("status") != "active":
-        logger.warning(f"Customer {username} is not active. Status: {customer.get('status')}")
-        return format_radius_response({
-            "Reply-Message": "Login disabled"
-        })
-    
-    # Check if customer's package has expired
-    if customer.get("expiry"):
-        expiry_date = convert_to_timezone(customer["expiry"])
-        current_time = get_current_time()
-        
-        if current_time > expiry_date:
-            logger.warning(f"Customer {username} package expired. Expiry: {expiry_date}, Current: {current_time}")
-            return format_radius_response({
-                "Reply-Message": "Access time expired"
-            })
+    try:
+        return await authorize_user(db, username, nas_ip_address, nas_identifier)
+    except (AdmissionRejected, DatabaseUnavailable):
+        # Fail fast so FreeRADIUS does not sit out its own timeout
+        return Response(status_code=503)
 
-    # Build response according to FreeRADIUS REST module specs
-    reply = {
-        "Cleartext-Password": customer["password"]
+@router.get("/stats")
+async def radius_stats():
+    """Runtime counters for the RADIUS hot paths"""
+    stats = {
+        "authorize_cache": authorize_cache.stats(),
+        "package_replies": package_replies.stats(),
+        "accounting_buffer": accounting_buffer.stats(),
+        "admission": admission.stats(),
+        "post_auth_buffer": post_auth_buffer.stats(),
+        "sessions": session_reaper.stats(),
+        "usage_rollups": usage_rollups.stats(),
+        "live_feed": live_feed.stats(),
+        "circuit_breaker": database_breaker.stats(),
+        "snapshot": snapshot_store.stats(),
+        "accounting_spool": accounting_spool.stats(),
+        "realms": realm_resolver.stats(),
+        "logging": log_pipeline.stats()
     }
-    
-    # If customer has a package, get package details
-    if customer.get("package"):
-        package = await db.get_collection("packages").find_one({"_id": ObjectId(customer["package"])})
-        if package:
-            # Convert package to RadiusProfile
-            profile = RadiusProfile(
-                name=package.get("name", "default"),
-                download_speed=package["download_speed"],
-                upload_speed=package["upload_speed"],
-                burst_download=package.get("burst_download"),
-                burst_upload=package.get("burst_upload"),
-                threshold_download=package.get("threshold_download"),
-                threshold_upload=package.get("threshold_upload"),
-                burst_time=package.get("burst_time"),
-                service_type=package.get("service_type"),
-                address_pool=package.get("address_pool"),
-                session_timeout=package.get("session_timeout"),
-                idle_timeout=package.get("idle_timeout"),
-                priority=package.get("priority"),
-                vlan_id=package.get("vlan_id")
-            )
-            
-            # Add profile attributes
-            reply.update({
-                "Mikrotik-Rate-Limit": profile.get_rate_limit()
-            })
-            
-            # Add additional profile attributes
-            for attr in profile.to_radius_attributes():
-                if attr.name not in reply:
-                    reply[attr.name] = attr.value
-        else:
-            logger.warning(f"Package not found for customer {username}: {customer['package']}")
-    
-    logger.info(f"Authorization successful for {username}")
-    return format_radius_response(reply)
+    if RADIUS_UDP_ENABLED:
+        stats["udp_server"] = udp_server.stats()
+    if RADIUS_COA_ENABLED:
+        stats["coa"] = coa_dispatcher.stats()
+    return stats
+
+def require_internal(request: Request) -> None:
+    """Token check for endpoints that expose or act on every tenant's sessions"""
+    if RADIUS_API_TOKEN:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), RADIUS_API_TOKEN.encode()):
+            raise HTTPException(status_code=401, detail="Invalid token")
+    elif request.client is None or request.client.host not in LOOPBACK_HOSTS:
+        raise HTTPException(status_code=403, detail="Internal endpoint")
+
+@router.get("/live/top", dependencies=[Depends(require_internal)])
+async def radius_live_top(
+    request: Request,
+    agency: Optional[str] = None,
+    nas: Optional[str] = None,
+    limit: int = 20
+):
+    """
+    Server-sent events with the heaviest online sessions of one agency
+    GET /radius/live/top?agency=...&nas=...&limit=20
+    """
+    if not agency:
+        raise HTTPException(status_code=400, detail="agency is required")
+    if live_feed.subscribers() >= LIVE_FEED_MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Too many live feed subscribers")
+
+    async def events():
+        # Subscribed only once streaming starts, and always unsubscribed on
+        # the way out, so an early disconnect cannot leave a topic behind
+        feed = live_feed.subscribe(agency, nas, limit)
+        try:
+            async for payload in feed:
+                if await request.is_disconnected():
+                    break
+                yield f"data: {payload}\n\n"
+        finally:
+            await feed.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def require_coa() -> None:
+    if not coa_dispatcher.running:
+        raise HTTPException(status_code=503, detail="CoA is disabled")
+
+@router.post("/coa/package/{package_id}", status_code=202, dependencies=[Depends(require_internal), Depends(require_coa)])
+async def radius_coa_package(package_id: str):
+    """Push a package's rate limit to every online subscriber on it"""
+    coa_dispatcher.package_changed(package_id)
+    return {"queued": True}
+
+@router.post("/coa/customer/{customer_id}", status_code=202, dependencies=[Depends(require_internal), Depends(require_coa)])
+async def radius_coa_customer(customer_id: str):
+    """Re-apply a customer's rate limit, or disconnect them if they may no longer log in"""
+    coa_dispatcher.customer_changed(customer_id)
+    return {"queued": True}
+
+@router.post("/coa/disconnect/{customer_id}", status_code=202, dependencies=[Depends(require_internal), Depends(require_coa)])
+async def radius_coa_disconnect(customer_id: str):
+    """Disconnect every session of a customer"""
+    coa_dispatcher.disconnect_customer(customer_id)
+    return {"queued": True}
 
 @router.post("/auth")
 async def radius_authenticate(
@@ -185,7 +177,7 @@ async def radius_authenticate(
     FreeRADIUS authentication endpoint
     POST /radius/auth
     """
-    logger.info("Processing authentication request")
+    logger.debug("Processing authentication request")
     
     try:
         body = await request.json()
@@ -195,11 +187,13 @@ async def radius_authenticate(
     # Try to get credentials from JSON body first, then form data
     username = body.get("username")
     password = body.get("password")
+    nas_ip_address, nas_identifier = nas_of(body)
     
     if not username or not password:
         form = await request.form()
         username = form.get("User-Name")
         password = form.get("User-Password")
+        nas_ip_address, nas_identifier = nas_of(form)
     
     if not username or not password:
         logger.warning("Missing username or password")
@@ -207,44 +201,12 @@ async def radius_authenticate(
             "Reply-Message": "Login invalid"
         })
     
-    # Find customer by username
-    logger.info(f"Authentication request for user: {username}")
-    customer = await db.get_collection("customers").find_one({
-        "username": username
-    })
-    
-    if not customer:
-        logger.warning(f"Customer not found: {username}")
-        return format_radius_response({
-            "Reply-Message": "Login invalid"
-        })
-    
-    # Check password
-    if customer["password"] != password:
-        logger.warning(f"Invalid password for customer: {username}")
-        return format_radius_response({
-            "Reply-Message": "Wrong Password"
-        })
-    
-    # Check if customer's package has expired
-    if customer.get("expiry"):
-        expiry_date = convert_to_timezone(customer["expiry"])
-        current_time = get_current_time()
-        
-        if current_time > expiry_date:
-            logger.warning(f"Customer {username} package expired. Expiry: {expiry_date}, Current: {current_time}")
-            return format_radius_response({
-                "Reply-Message": "Access time expired"
-            })
-    
-    # Set customer status to online
-    await db.get_collection("customers").update_one(
-        {"_id": customer["_id"]},
-        {"$set": {"status": "online"}}
-    )
-    logger.info(f"Set customer {username} status to online")
-    
-    logger.info(f"Authentication successful for {username}")
+    try:
+        rejection = await authenticate_user(db, username, password, nas_ip_address, nas_identifier)
+    except (AdmissionRejected, DatabaseUnavailable):
+        return Response(status_code=503)
+    if rejection:
+        return rejection
     return Response(status_code=204)
 
 @router.post("/accounting")
@@ -260,163 +222,18 @@ async def radius_accounting(
         # Try to get JSON data first
         try:
             body = await request.json()
-            logger.info(f"Received accounting JSON data: {json.dumps(body, default=str)}")
         except json.JSONDecodeError:
             # If not JSON, try form data
             form = await request.form()
             body = dict(form)
-            logger.info(f"Received accounting form data: {json.dumps(body, default=str)}")
-        
-        # Get required fields with fallbacks for both formats
-        username = body.get("username", body.get("User-Name"))
-        session_id = body.get("session_id", body.get("Acct-Session-Id"))
-        status = body.get("status", body.get("Acct-Status-Type"))
+        log_pipeline.payload(logger, "accounting", body)
         
-        if not username or not session_id or not status:
-            logger.error("Missing required fields in accounting request")
-            return Response(status_code=400)
-        
-        # Get customer details
-        customer = await db.get_collection("customers").find_one({
-            "username": username
-        })
-        
-        if not customer:
-            logger.error(f"Customer not found for accounting: {username}")
-            return Response(status_code=404)
-
-        def safe_int(value, default=0):
-            """Safely convert value to int, return default if empty or invalid"""
-            if not value or value == "":
-                return default
-            try:
-                return int(value)
-            except (ValueError, TypeError):
-                return default
-        
-        # Get current time in East Africa timezone
-        current_time = get_current_time()
-        
-        # Structure accounting data
-        accounting_data = {
-            "username": username,
-            "session_id": session_id,
-            "customer_id": str(customer["_id"]),
-            "agency": customer["agency"],
-            "package": customer.get("package"),
-            "status": status,
-            "session_time": safe_int(body.get("Acct-Session-Time", body.get("session_time", 0))),
-            "input_octets": safe_int(body.get("Acct-Input-Octets", body.get("input_octets", 0))),
-            "output_octets": safe_int(body.get("Acct-Output-Octets", body.get("output_octets", 0))),
-            "input_packets": safe_int(body.get("Acct-Input-Packets", body.get("input_packets", 0))),
-            "output_packets": safe_int(body.get("Acct-Output-Packets", body.get("output_packets", 0))),
-            "input_gigawords": safe_int(body.get("Acct-Input-Gigawords", body.get("input_gigawords", 0))),
-            "output_gigawords": safe_int(body.get("Acct-Output-Gigawords", body.get("output_gigawords", 0))),
-            "called_station_id": body.get("Called-Station-Id", body.get("called_station_id", "")),
-            "calling_station_id": body.get("Calling-Station-Id", body.get("calling_station_id", "")),
-            "terminate_cause": body.get("Acct-Terminate-Cause", body.get("terminate_cause", "")),
-            "nas_ip_address": body.get("NAS-IP-Address", body.get("nas_ip_address", "")),
-            "nas_identifier": body.get("NAS-Identifier", body.get("nas_identifier", "")),
-            "nas_port": body.get("NAS-Port", body.get("nas_port", "")),
-            "nas_port_type": body.get("NAS-Port-Type", body.get("nas_port_type", "")),
-            "service_type": body.get("Service-Type", body.get("service_type", "")),
-            "framed_protocol": body.get("Framed-Protocol", body.get("framed_protocol", "")),
-            "framed_ip_address": body.get("Framed-IP-Address", body.get("framed_ip_address", "")),
-            "idle_timeout": safe_int(body.get("Idle-Timeout", body.get("idle_timeout", 0))),
-            "session_timeout": safe_int(body.get("Session-Timeout", body.get("session_timeout", 0))),
-            "mikrotik_rate_limit": body.get("Mikrotik-Rate-Limit", body.get("mikrotik_rate_limit", "")),
-            "timestamp": current_time,
-            "last_update": current_time
-        }
-        
-        # Calculate total bytes (including gigawords)
-        total_input = (accounting_data["input_gigawords"] * (2**32)) + accounting_data["input_octets"]
-        total_output = (accounting_data["output_gigawords"] * (2**32)) + accounting_data["output_octets"]
-        
-        # Add calculated fields
-        accounting_data.update({
-            "total_input_bytes": total_input,
-            "total_output_bytes": total_output,
-            "total_bytes": total_input + total_output,
-            "input_mbytes": round(total_input / (1024 * 1024), 2),
-            "output_mbytes": round(total_output / (1024 * 1024), 2),
-            "total_mbytes": round((total_input + total_output) / (1024 * 1024), 2),
-            "session_time_hours": round(accounting_data["session_time"] / 3600, 2)
-        })
-        
-        # Store accounting data
-        try:
-            # Update or create a single record per username
-            result = await db.get_collection("accounting").update_one(
-                {
-                    "username": username  # Only use username as the unique key
-                },
-                {
-                    "$set": {
-                        **accounting_data,
-                        "last_update": current_time,
-                        "last_session_id": session_id,
-                        "last_status": status
-                    }
-                },
-                upsert=True
-            )
-            
-            if result.upserted_id:
-                logger.info(f"Created new accounting record for {username}")
-            else:
-                logger.info(f"Updated existing accounting record for {username}")
-            
-            # Update customer's last_seen and usage_stats if this is a stop record
-            if status == "Stop":
-                session_start_time = current_time - timedelta(seconds=accounting_data["session_time"])
-                update_data = {
-                    "last_seen": current_time,
-                    "last_session": {
-                        "session_id": session_id,
-                        "start_time": session_start_time,
-                        "end_time": current_time,
-                        "duration": accounting_data["session_time"],
-                        "input_bytes": total_input,
-                        "output_bytes": total_output,
-                        "terminate_cause": accounting_data["terminate_cause"],
-                        "framed_ip": accounting_data["framed_ip_address"],
-                        "rate_limit": accounting_data["mikrotik_rate_limit"]
-                    }
-                }
-                
-                # Update customer's usage stats
-                result = await db.get_collection("customers").update_one(
-                    {"_id": customer["_id"]},
-                    {
-                        "$set": update_data,
-                        "$inc": {
-                            "total_sessions": 1,
-                            "total_online_time": accounting_data["session_time"],
-                            "total_input_bytes": total_input,
-                            "total_output_bytes": total_output
-                        }
-                    }
-                )
-                logger.info(f"Updated customer {username} usage stats: {result.modified_count} document(s) modified")
-            
-            # Update customer status based on accounting status
-            if status == "Stop":
-                # Set customer status to offline when session stops
-                await db.get_collection("customers").update_one(
-                    {"_id": customer["_id"]},
-                    {"$set": {"status": "offline"}}
-                )
-                logger.info(f"Set customer {username} status to offline")
-            
-            return Response(status_code=204)
-            
-        except Exception as e:
-            logger.error(f"Failed to store accounting data: {str(e)}")
-            return Response(status_code=500)
+        return Response(status_code=await process_accounting(db, body))
             
+    except (AdmissionRejected, DatabaseUnavailable):
+        return Response(status_code=503)
     except Exception as e:
-        logger.error(f"Error processing accounting request: {str(e)}")
+        logger.error("Error processing accounting request: %s", e)
         return Response(status_code=500)
 
 @router.post("/post-auth")
@@ -432,19 +249,16 @@ async def radius_post_auth(
         # Try to get JSON data first
         try:
             body = await request.json()
-            logger.info(f"Received post-auth JSON data: {json.dumps(body, default=str)}")
         except json.JSONDecodeError:
             # If not JSON, try form data
             form = await request.form()
             body = dict(form)
-            logger.info(f"Received post-auth form data: {json.dumps(body, default=str)}")
-        
-        # Just log the data without saving
-        username = body.get("username", body.get("User-Name", "unknown"))
-        logger.info(f"Post-auth request for user: {username}")
+        log_pipeline.payload(logger, "post-auth", body)
         
+        # Queue the event for the batched post_auth writer
+        record_post_auth(body)
         return Response(status_code=204)
             
     except Exception as e:
-        logger.error(f"Error processing post-auth request: {str(e)}")
+        logger.error("Error processing post-auth request: %s", e)
         return Response(status_code=500) 
\ No newline at end of file
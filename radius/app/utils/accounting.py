@@ -0,0 +1,170 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+import logging
+import os
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from .batching import BatchWriter, unwritten_documents
+
+logger = logging.getLogger(__name__)
+
+# Flush triggers (override through the environment)
+ACCOUNTING_FLUSH_INTERVAL = float(os.getenv("RADIUS_ACCOUNTING_FLUSH_INTERVAL", "1.0"))  # seconds
+ACCOUNTING_BATCH_SIZE = int(os.getenv("RADIUS_ACCOUNTING_BATCH_SIZE", "500"))
+# Past this many buffered operations new packets go to the spool instead,
+# and history rows kept for retry are capped at the same number
+ACCOUNTING_MAX_PENDING = int(os.getenv("RADIUS_ACCOUNTING_MAX_PENDING", "20000"))
+
+# Sessions remembered per customer so a retried usage update is not counted twice
+COUNTED_SESSIONS = int(os.getenv("RADIUS_COUNTED_SESSIONS", "50"))
+
+# Fields stored in accounting_history metadata rather than in each measurement
+HISTORY_META_FIELDS = ("username", "agency")
+
+def history_record(accounting_data: Dict) -> Dict:
+    """Shape an accounting packet for the accounting_history time-series collection"""
+    record = {
+        key: value for key, value in accounting_data.items()
+        if key not in HISTORY_META_FIELDS and key != "last_update"
+    }
+    record["meta"] = {field: accounting_data.get(field) for field in HISTORY_META_FIELDS}
+    return record
+
+class AccountingBuffer(BatchWriter):
+    """Write-behind buffer for radius_accounting.
+
+    Interim updates carry cumulative counters, so only the newest update per
+    session needs to reach the ``accounting`` "latest" view; older ones are
+    coalesced away; the same goes for the ``radius_sessions`` registry. Every
+    packet is also appended to ``accounting_history``.
+    Customer usage updates from Stop packets ($inc) are queued individually
+    and guarded by the session key: the key is pushed onto the customer's
+    ``counted_sessions`` in the same update, which only matches while the
+    key is absent, so retrying a write that already applied changes nothing.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = ACCOUNTING_FLUSH_INTERVAL,
+        max_batch: int = ACCOUNTING_BATCH_SIZE,
+        max_pending: int = ACCOUNTING_MAX_PENDING
+    ):
+        super().__init__("accounting", flush_interval, max_batch)
+        self.max_pending = max_pending
+        self._sessions: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self._session_ops: "OrderedDict[Tuple[str, str], Union[UpdateOne, DeleteOne]]" = OrderedDict()
+        self._customer_updates: List[UpdateOne] = []
+        self._history: List[Dict] = []
+        self.coalesced = 0
+        # Packets diverted to the spool while the buffer was full
+        self.overflows = 0
+        # History rows given up on after failed flushes
+        self.dropped = 0
+
+    def pending(self) -> int:
+        return len(self._sessions) + len(self._session_ops) + len(self._customer_updates) + len(self._history)
+
+    def full(self) -> bool:
+        return self.pending() >= self.max_pending
+
+    def submit(
+        self,
+        username: str,
+        session_id: str,
+        accounting_set: Dict,
+        customer_id=None,
+        customer_update: Optional[Dict] = None,
+        usage_key: Optional[str] = None,
+        history_record: Optional[Dict] = None,
+        session_operation: Optional[Union[UpdateOne, DeleteOne]] = None
+    ) -> None:
+        key = (username, session_id)
+        if key in self._sessions:
+            self.coalesced += 1
+            self._sessions.move_to_end(key)
+        self._sessions[key] = accounting_set
+        if session_operation is not None:
+            # Start/Interim upserts are idempotent, so only the newest matters
+            self._session_ops.pop(key, None)
+            self._session_ops[key] = session_operation
+        if history_record:
+            self._history.append(history_record)
+        if customer_update:
+            self._customer_updates.append(UpdateOne(
+                {"_id": customer_id, "counted_sessions": {"$ne": usage_key}},
+                {
+                    **customer_update,
+                    "$push": {"counted_sessions": {"$each": [usage_key], "$slice": -COUNTED_SESSIONS}}
+                }
+            ))
+        self.notify()
+
+    def _take_batch(self):
+        batch = (self._sessions, self._session_ops, self._customer_updates, self._history)
+        self._sessions = OrderedDict()
+        self._session_ops = OrderedDict()
+        self._customer_updates = []
+        self._history = []
+        return batch
+
+    async def _write_batch(self, database, batch) -> int:
+        sessions, session_ops, customer_updates, history = batch
+        written = 0
+        if history:
+            await database.get_collection("accounting_history").insert_many(history, ordered=False)
+            written += len(history)
+            history.clear()
+        if sessions:
+            # Ordered so that the newest session wins the per-username document
+            await database.get_collection("accounting").bulk_write([
+                UpdateOne({"username": username}, {"$set": accounting_set}, upsert=True)
+                for (username, _), accounting_set in sessions.items()
+            ], ordered=True)
+            written += len(sessions)
+            sessions.clear()
+        if session_ops:
+            await database.get_collection("radius_sessions").bulk_write(
+                list(session_ops.values()), ordered=False
+            )
+            written += len(session_ops)
+            session_ops.clear()
+        if customer_updates:
+            await database.get_collection("customers").bulk_write(customer_updates, ordered=False)
+            written += len(customer_updates)
+        return written
+
+    def _restore_batch(self, batch, error: Exception) -> None:
+        sessions, session_ops, customer_updates, history = batch
+        # Time-series collections do not enforce unique _id, so retrying after a
+        # network error can duplicate a few history rows; better than losing them
+        self._history = unwritten_documents(history, error) + self._history
+        if len(self._history) > self.max_pending:
+            dropped = len(self._history) - self.max_pending
+            self.dropped += dropped
+            logger.error(f"Dropping {dropped} accounting history rows after repeated flush failures")
+            del self._history[:dropped]
+        # Keep anything newer that arrived while the batch was in flight
+        for key, accounting_set in sessions.items():
+            if key not in self._sessions:
+                self._sessions[key] = accounting_set
+        for key, operation in session_ops.items():
+            if key not in self._session_ops:
+                self._session_ops[key] = operation
+        # Customer updates are guarded by their session key, so the ones that
+        # already applied before e.g. a network error match nothing on retry
+        if isinstance(error, BulkWriteError) and not sessions and not session_ops and not history:
+            # Unordered customer writes: only the reported failures need a retry
+            failed = {write_error["index"] for write_error in error.details.get("writeErrors", [])}
+            customer_updates = [op for index, op in enumerate(customer_updates) if index in failed]
+        self._customer_updates = customer_updates + self._customer_updates
+
+    def stats(self) -> Dict:
+        return {
+            **super().stats(),
+            "coalesced": self.coalesced,
+            "overflows": self.overflows,
+            "dropped": self.dropped
+        }
+
+# Shared buffer instance
+accounting_buffer = AccountingBuffer()
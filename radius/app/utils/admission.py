@@ -0,0 +1,193 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Concurrent database-bound requests; defaults to the Motor pool size
+RADIUS_MAX_CONCURRENCY = int(
+    os.getenv("RADIUS_MAX_CONCURRENCY", os.getenv("MONGODB_MAX_POOL_SIZE", "10"))
+)
+# Accounting can never take more than this many of those slots
+RADIUS_ACCOUNTING_CONCURRENCY = int(
+    os.getenv("RADIUS_ACCOUNTING_CONCURRENCY", str(max(1, RADIUS_MAX_CONCURRENCY // 2)))
+)
+# Queued requests are shed once they could not finish inside the rest module
+# timeout (3.0s in mods-available/rest); keep some headroom for the reply
+RADIUS_ADMISSION_TIMEOUT = float(os.getenv("RADIUS_ADMISSION_TIMEOUT", "2.5"))  # seconds
+
+# Lower value wins; logins beat accounting when both are waiting. Post-auth
+# events are buffered and never wait on the database in the request path.
+PRIORITIES = {"authorize": 0, "auth": 0, "accounting": 1}
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of being queued past its deadline"""
+
+class _Waiter:
+    __slots__ = ("endpoint", "future", "enqueued")
+
+    def __init__(self, endpoint: str, future: asyncio.Future):
+        self.endpoint = endpoint
+        self.future = future
+        self.enqueued = time.monotonic()
+
+class _EndpointStats:
+    __slots__ = ("active", "queued", "admitted", "shed", "wait_total", "wait_max", "service_ewma")
+
+    def __init__(self):
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.service_ewma = 0.0
+
+class AdmissionController:
+    """Bounded, prioritised access to the database for the RADIUS handlers.
+
+    During a NAS reboot every subscriber re-authenticates at once. Rather than
+    letting all of them pile onto the Motor pool until FreeRADIUS times out,
+    requests take a slot here first. Free slots go to the highest-priority
+    waiter, and a request whose expected wait already exceeds the budget is
+    rejected immediately so FreeRADIUS can fail fast and the NAS can retry.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = RADIUS_MAX_CONCURRENCY,
+        limits: Optional[Dict[str, int]] = None,
+        timeout: float = RADIUS_ADMISSION_TIMEOUT
+    ):
+        self.max_concurrency = max_concurrency
+        self.limits = limits or {"accounting": RADIUS_ACCOUNTING_CONCURRENCY}
+        self.timeout = timeout
+        self.active = 0
+        self._queues: Dict[int, Deque[_Waiter]] = {
+            priority: deque() for priority in sorted(set(PRIORITIES.values()))
+        }
+        self._stats: Dict[str, _EndpointStats] = {endpoint: _EndpointStats() for endpoint in PRIORITIES}
+
+    def _can_run(self, endpoint: str) -> bool:
+        limit = self.limits.get(endpoint, self.max_concurrency)
+        return self.active < self.max_concurrency and self._stats[endpoint].active < limit
+
+    def _expected_wait(self, endpoint: str) -> float:
+        """Rough queueing delay for a new request at ``endpoint``'s priority"""
+        priority = PRIORITIES[endpoint]
+        ahead = sum(len(queue) for level, queue in self._queues.items() if level <= priority)
+        service = self._stats[endpoint].service_ewma
+        return (ahead + 1) * service / max(1, self.limits.get(endpoint, self.max_concurrency))
+
+    def _grant(self, endpoint: str) -> None:
+        self.active += 1
+        self._stats[endpoint].active += 1
+        self._stats[endpoint].admitted += 1
+
+    def _dispatch(self) -> None:
+        for queue in self._queues.values():
+            skipped = deque()
+            while queue and self.active < self.max_concurrency:
+                waiter = queue.popleft()
+                if waiter.future.done():
+                    continue
+                if not self._can_run(waiter.endpoint):
+                    skipped.append(waiter)
+                    continue
+                self._stats[waiter.endpoint].queued -= 1
+                self._grant(waiter.endpoint)
+                self._record_wait(waiter.endpoint, time.monotonic() - waiter.enqueued)
+                waiter.future.set_result(None)
+            # Waiters held back by a per-endpoint limit keep their place
+            queue.extendleft(reversed(skipped))
+
+    def _record_wait(self, endpoint: str, waited: float) -> None:
+        stats = self._stats[endpoint]
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+
+    def _shed(self, endpoint: str, reason: str) -> AdmissionRejected:
+        self._stats[endpoint].shed += 1
+        # Storms shed thousands of requests; the counters in stats() carry the signal
+        logger.debug(f"Shedding {endpoint} request: {reason}")
+        return AdmissionRejected(reason)
+
+    async def acquire(self, endpoint: str) -> None:
+        priority = PRIORITIES[endpoint]
+        queue = self._queues[priority]
+        waiting = any(self._queues[level] for level in self._queues if level <= priority)
+        if not waiting and self._can_run(endpoint):
+            self._grant(endpoint)
+            return
+        if self._expected_wait(endpoint) > self.timeout:
+            raise self._shed(endpoint, "expected wait exceeds budget")
+
+        waiter = _Waiter(endpoint, asyncio.get_running_loop().create_future())
+        queue.append(waiter)
+        self._stats[endpoint].queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                # Granted just as the budget ran out; use the slot
+                return
+            self._abandon(waiter, queue)
+            raise self._shed(endpoint, "queued past budget")
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted but never used; no service time to learn from
+                self.release(endpoint)
+            else:
+                self._abandon(waiter, queue)
+            raise
+
+    def _abandon(self, waiter: _Waiter, queue: Deque[_Waiter]) -> None:
+        waiter.future.cancel()
+        queue.remove(waiter)
+        self._stats[waiter.endpoint].queued -= 1
+
+    def release(self, endpoint: str, service_time: Optional[float] = None) -> None:
+        self.active -= 1
+        stats = self._stats[endpoint]
+        stats.active -= 1
+        if service_time is not None:
+            stats.service_ewma = service_time if not stats.service_ewma else (
+                0.9 * stats.service_ewma + 0.1 * service_time
+            )
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, endpoint: str):
+        """Hold a database slot for ``endpoint``; raises AdmissionRejected when shed"""
+        await self.acquire(endpoint)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(endpoint, time.monotonic() - start)
+
+    def stats(self) -> Dict:
+        endpoints = {}
+        for endpoint, stats in self._stats.items():
+            waited = stats.admitted or 1
+            endpoints[endpoint] = {
+                "active": stats.active,
+                "queue_depth": stats.queued,
+                "admitted": stats.admitted,
+                "shed": stats.shed,
+                "avg_wait_ms": round(stats.wait_total / waited * 1000, 3),
+                "max_wait_ms": round(stats.wait_max * 1000, 3),
+                "service_ms": round(stats.service_ewma * 1000, 3)
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "endpoints": endpoints
+        }
+
+# Shared controller instance
+admission = AdmissionController()
@@ -0,0 +1,233 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import os
+import time
+from pymongo.errors import OperationFailure, PyMongoError
+from .replies import package_replies
+
+logger = logging.getLogger(__name__)
+
+# Cache sizing and lifetime (override through the environment)
+AUTH_CACHE_SIZE = int(os.getenv("RADIUS_AUTH_CACHE_SIZE", "50000"))
+AUTH_CACHE_TTL = float(os.getenv("RADIUS_AUTH_CACHE_TTL", "300"))  # seconds
+
+# Customer fields that change the outcome of an authorize request. Updates that
+# only touch other fields (usage counters, last_seen, ...) keep the cache warm.
+AUTHORIZE_FIELDS = {"username", "password", "status", "expiry", "expiry_epoch", "package", "agency"}
+
+# (agency the request was scoped to, or None, username)
+CacheKey = Tuple[Optional[str], str]
+
+class AuthorizeCache:
+    """Bounded LRU cache of fully resolved /radius/authorize replies.
+
+    Entries are keyed by the realm-resolved (agency, username) and expire
+    after ``ttl`` seconds or when the customer's subscription expires,
+    whichever comes first. Each customer agency is its own LRU partition;
+    when the cache is full the largest partition gives up its oldest entry,
+    so one big tenant cannot push every other tenant out. Reverse indexes on
+    customer and package ids let change-stream events drop affected entries.
+    """
+
+    def __init__(self, max_size: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: Dict[CacheKey, dict] = {}
+        self._partitions: "Dict[Optional[str], OrderedDict[CacheKey, None]]" = {}
+        # A customer can be cached under both its scoped and unscoped key
+        self._by_customer: Dict[str, Set[CacheKey]] = {}
+        self._by_package: Dict[str, Set[CacheKey]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: CacheKey) -> Optional[Tuple[Dict, Optional[float]]]:
+        """The cached reply and the subscription expiry it was cached with"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry["deadline"] <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._partitions[entry["agency"]].move_to_end(key)
+        self.hits += 1
+        return entry["reply"], entry["expiry_ts"]
+
+    def put(
+        self,
+        key: CacheKey,
+        reply: Dict,
+        customer_id: str,
+        agency: Optional[str] = None,
+        package_id: Optional[str] = None,
+        expiry_ts: Optional[float] = None,
+        ttl: Optional[float] = None
+    ) -> None:
+        """Cache a reply; ``agency`` is the customer's, ``expiry_ts`` the
+        subscription expiry as a UTC epoch.
+
+        ``ttl`` shortens the lifetime for replies built from older data.
+        """
+        lifetime = self.ttl if ttl is None else min(self.ttl, ttl)
+        if expiry_ts is not None:
+            lifetime = min(lifetime, expiry_ts - time.time())
+        if lifetime <= 0:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = {
+            "reply": reply,
+            "customer_id": customer_id,
+            "agency": agency,
+            "package_id": package_id,
+            "expiry_ts": expiry_ts,
+            "deadline": time.monotonic() + lifetime
+        }
+        self._partitions.setdefault(agency, OrderedDict())[key] = None
+        self._by_customer.setdefault(customer_id, set()).add(key)
+        if package_id:
+            self._by_package.setdefault(package_id, set()).add(key)
+
+        while len(self._entries) > self.max_size:
+            largest = max(self._partitions.values(), key=len)
+            self._remove(next(iter(largest)))
+            self.evictions += 1
+
+    def invalidate(self, key: CacheKey) -> None:
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+
+    def invalidate_customer(self, customer_id: str) -> None:
+        for key in list(self._by_customer.get(customer_id, ())):
+            self.invalidate(key)
+
+    def invalidate_package(self, package_id: str) -> None:
+        for key in list(self._by_package.get(package_id, ())):
+            self.invalidate(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._partitions.clear()
+        self._by_customer.clear()
+        self._by_package.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "partitions": len(self._partitions),
+            "largest_partition": max(map(len, self._partitions.values()), default=0),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        partition = self._partitions[entry["agency"]]
+        del partition[key]
+        if not partition:
+            del self._partitions[entry["agency"]]
+        customer_id = entry["customer_id"]
+        if customer_id in self._by_customer:
+            self._by_customer[customer_id].discard(key)
+            if not self._by_customer[customer_id]:
+                del self._by_customer[customer_id]
+        package_id = entry["package_id"]
+        if package_id and package_id in self._by_package:
+            self._by_package[package_id].discard(key)
+            if not self._by_package[package_id]:
+                del self._by_package[package_id]
+
+# Shared cache instance
+authorize_cache = AuthorizeCache()
+
+class ChangeStreamInvalidator:
+    """Drops cached authorize replies when customers or packages change.
+
+    Change streams need a replica set (a single-node replica set is enough for
+    local development). Against a standalone server the watcher logs a warning
+    and the cache falls back to TTL-based expiry.
+    """
+
+    RETRY_DELAY = 5  # seconds
+
+    def __init__(self, cache: AuthorizeCache):
+        self.cache = cache
+        # Called with (collection name, change) after the cache is updated
+        self.listeners: List[Callable[[str, Dict], None]] = []
+        self._tasks = []
+
+    def start(self, database) -> None:
+        self._tasks = [
+            asyncio.create_task(self._watch(database, "customers", self._on_customer_change)),
+            asyncio.create_task(self._watch(database, "packages", self._on_package_change))
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _watch(self, database, collection_name: str, handler) -> None:
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        resume_token = None
+        while True:
+            try:
+                async with database[collection_name].watch(
+                    pipeline, resume_after=resume_token
+                ) as stream:
+                    logger.info(f"Watching {collection_name} for authorize cache invalidation")
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        handler(change)
+                        for listener in self.listeners:
+                            try:
+                                listener(collection_name, change)
+                            except Exception:
+                                # A broken listener must not stop invalidation
+                                logger.exception(f"Change listener failed for {collection_name}")
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                # Standalone servers reject $changeStream; there is nothing to retry
+                if e.code in (40573, 40324) or "replica set" in str(e):
+                    logger.warning(
+                        f"Change streams unavailable for {collection_name}, "
+                        f"authorize cache relies on TTL only: {e}"
+                    )
+                    return
+                logger.error(f"Change stream on {collection_name} failed: {e}")
+                resume_token = None
+            except PyMongoError as e:
+                logger.error(f"Change stream on {collection_name} interrupted: {e}")
+            # Anything we missed while disconnected may be stale
+            self.cache.clear()
+            await asyncio.sleep(self.RETRY_DELAY)
+
+    def _on_customer_change(self, change: Dict) -> None:
+        if change["operationType"] == "update":
+            description = change.get("updateDescription", {})
+            touched = set(description.get("updatedFields", {})) | set(description.get("removedFields", []))
+            if not {field.split(".")[0] for field in touched} & AUTHORIZE_FIELDS:
+                return
+        self.cache.invalidate_customer(str(change["documentKey"]["_id"]))
+
+    def _on_package_change(self, change: Dict) -> None:
+        package_id = str(change["documentKey"]["_id"])
+        package_replies.invalidate(package_id)
+        self.cache.invalidate_package(package_id)
+
+cache_invalidator = ChangeStreamInvalidator(authorize_cache)
@@ -0,0 +1,109 @@
+from typing import Any, Dict, List
+import asyncio
+import logging
+from pymongo.errors import BulkWriteError
+from ..config.database import db
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+def unwritten_documents(documents: List[Dict], error: Exception) -> List[Dict]:
+    """Documents from a failed unordered insert_many that still need writing.
+
+    insert_many assigns ``_id`` in place, so documents that made it in before
+    the failure come back as duplicate-key errors on retry and are dropped.
+    """
+    if not isinstance(error, BulkWriteError):
+        return documents
+    failed = {
+        write_error["index"] for write_error in error.details.get("writeErrors", [])
+        if write_error.get("code") != DUPLICATE_KEY
+    }
+    return [document for index, document in enumerate(documents) if index in failed]
+
+class BatchWriter:
+    """Base class for buffers that write to MongoDB in the background.
+
+    Subclasses collect operations in memory and implement ``pending``,
+    ``_take_batch``, ``_write_batch`` and ``_restore_batch``. A background task
+    flushes every ``flush_interval`` seconds, or sooner once ``max_batch``
+    operations are waiting. ``drain`` stops the task and flushes what is left,
+    so nothing acknowledged to FreeRADIUS is lost on a graceful shutdown.
+    """
+
+    def __init__(self, name: str, flush_interval: float, max_batch: int):
+        self.name = name
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self.flushes = 0
+        self.written = 0
+        self.errors = 0
+
+    def pending(self) -> int:
+        raise NotImplementedError
+
+    def _take_batch(self) -> Any:
+        """Detach and return everything currently buffered"""
+        raise NotImplementedError
+
+    async def _write_batch(self, database, batch: Any) -> int:
+        """Write a detached batch, returning the number of operations written"""
+        raise NotImplementedError
+
+    def _restore_batch(self, batch: Any, error: Exception) -> None:
+        """Put back the parts of a failed batch that should be retried"""
+        raise NotImplementedError
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def drain(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def notify(self) -> None:
+        """Wake the flusher early when a full batch is waiting"""
+        if self.pending() >= self.max_batch:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self.pending() or not db.ready:
+                # Writing before setup would create accounting_history as a
+                # plain collection without its time-series options and TTL
+                return
+            batch = self._take_batch()
+            try:
+                written = await self._write_batch(db.get_database(), batch)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"{self.name} flush failed: {str(e)}")
+                self._restore_batch(batch, e)
+                return
+            self.flushes += 1
+            self.written += written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "pending": self.pending(),
+            "flushes": self.flushes,
+            "written": self.written,
+            "errors": self.errors
+        }
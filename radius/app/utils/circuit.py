@@ -0,0 +1,117 @@
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+import asyncio
+import logging
+import os
+import time
+from pymongo.errors import ConnectionFailure, ExecutionTimeout
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failures that open the breaker
+DB_BREAKER_FAILURES = int(os.getenv("RADIUS_DB_BREAKER_FAILURES", "5"))
+# How long the breaker stays open before a single probe request is let through
+DB_BREAKER_RESET = float(os.getenv("RADIUS_DB_BREAKER_RESET", "10"))  # seconds
+# A lookup slower than this counts as a failure; keep it under the rest
+# module timeout so the fallback still answers in time
+DB_CALL_TIMEOUT = float(os.getenv("RADIUS_DB_CALL_TIMEOUT", "1.5"))  # seconds
+
+T = TypeVar("T")
+
+class DatabaseUnavailable(Exception):
+    """Raised instead of waiting on a database that is down or too slow"""
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open probe -> closed.
+
+    While open, callers get DatabaseUnavailable immediately and fall back to
+    the on-disk snapshot instead of tying up admission slots on a database
+    that is not answering.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = DB_BREAKER_FAILURES,
+        reset_timeout: float = DB_BREAKER_RESET,
+        call_timeout: float = DB_CALL_TIMEOUT
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.call_timeout = call_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        # Called when the breaker closes again after being open
+        self.listeners: List[Callable[[], None]] = []
+
+    @property
+    def closed(self) -> bool:
+        return self.state == self.CLOSED
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            # Let exactly one request find out whether the database is back
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def success(self) -> None:
+        reopened = self.state != self.CLOSED
+        if reopened:
+            logger.info("Database reachable again, closing circuit breaker")
+        self.state = self.CLOSED
+        self.failures = 0
+        if reopened:
+            for listener in self.listeners:
+                listener()
+
+    def failure(self, error: BaseException) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip(error)
+
+    def trip(self, error: Optional[BaseException] = None) -> None:
+        if self.state != self.OPEN:
+            self.trips += 1
+            logger.error(f"Opening database circuit breaker: {error!r}")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+    async def call(self, operation: Callable[[], Awaitable[T]]) -> T:
+        if not self.allow():
+            self.rejected += 1
+            raise DatabaseUnavailable("circuit open")
+        try:
+            result = await asyncio.wait_for(operation(), self.call_timeout)
+        except (ConnectionFailure, ExecutionTimeout, asyncio.TimeoutError) as e:
+            self.failure(e)
+            raise DatabaseUnavailable(str(e) or type(e).__name__) from e
+        except Exception:
+            # The database answered, even if with an error
+            self.success()
+            raise
+        except asyncio.CancelledError:
+            if self.state == self.HALF_OPEN:
+                # The probe never finished; let a later request try again
+                self.state = self.OPEN
+            raise
+        self.success()
+        return result
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected
+        }
+
+# Shared breaker for the hot-path customer lookups
+database_breaker = CircuitBreaker()
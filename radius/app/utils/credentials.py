@@ -0,0 +1,38 @@
+from typing import List
+import hashlib
+import struct
+
+_MASK = 0xFFFFFFFF
+
+def _rotl(value: int, shift: int) -> int:
+    return ((value << shift) | (value >> (32 - shift))) & _MASK
+
+def _md4(data: bytes) -> bytes:
+    """Pure-Python MD4 (RFC 1320) for OpenSSL builds that no longer ship it"""
+    message = data + b"\x80" + b"\x00" * ((55 - len(data)) % 64) + struct.pack("<Q", len(data) * 8)
+    state = [0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476]
+    rounds = (
+        (lambda x, y, z: (x & y) | (~x & z), 0, list(range(16)), (3, 7, 11, 19)),
+        (lambda x, y, z: (x & y) | (x & z) | (y & z), 0x5A827999,
+         [0, 4, 8, 12, 1, 5, 9, 13, 2, 6, 10, 14, 3, 7, 11, 15], (3, 5, 9, 13)),
+        (lambda x, y, z: x ^ y ^ z, 0x6ED9EBA1,
+         [0, 8, 4, 12, 2, 10, 6, 14, 1, 9, 5, 13, 3, 11, 7, 15], (3, 9, 11, 15)),
+    )
+    for offset in range(0, len(message), 64):
+        words: List[int] = list(struct.unpack("<16I", message[offset:offset + 64]))
+        a, b, c, d = state
+        for function, constant, order, shifts in rounds:
+            for step, index in enumerate(order):
+                a = _rotl((a + function(b, c, d) + words[index] + constant) & _MASK, shifts[step % 4])
+                a, b, c, d = d, a, b, c
+        state = [(value + delta) & _MASK for value, delta in zip(state, (a, b, c, d))]
+    return struct.pack("<4I", *state)
+
+def nt_password_hash(password: str) -> str:
+    """NT-Password (MD4 of the UTF-16LE password) as FreeRADIUS expects it, in hex"""
+    data = password.encode("utf-16-le")
+    try:
+        digest = hashlib.new("md4", data).digest()
+    except ValueError:
+        digest = _md4(data)
+    return "0x" + digest.hex()
@@ -0,0 +1,462 @@
+from typing import Dict, Optional
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import time
+import pytz
+from .auth_cache import authorize_cache
+from .accounting import accounting_buffer, history_record
+from .replies import (
+    format_radius_response, build_authorize_reply, apply_session_timeout, package_replies
+)
+from .credentials import nt_password_hash
+from .admission import admission
+from .post_auth import post_auth_buffer
+from .sessions import session_key, session_operation, clear_nas_sessions, NAS_RESET_STATUSES
+from .rollups import usage_rollups
+from .live import live_rates
+from .circuit import database_breaker, DatabaseUnavailable
+from .snapshot import snapshot_store
+from .spool import accounting_spool
+from .realms import realm_resolver
+from .subscribers import (
+    resolve_subscriber, find_subscriber, AUTHENTICATE_PROJECTION, ACCOUNTING_PROJECTION, LOGIN_STATUSES
+)
+
+logger = logging.getLogger(__name__)
+
+# Configure timezone
+TIMEZONE = pytz.timezone('Africa/Nairobi')  # East Africa timezone
+
+# "rest": FreeRADIUS calls /radius/auth after /radius/authorize.
+# "local": authorize returns every credential FreeRADIUS needs to check PAP,
+# CHAP and MS-CHAPv2 itself.
+RADIUS_AUTH_MODE = os.getenv("RADIUS_AUTH_MODE", "rest").lower()
+LOCAL_AUTH = RADIUS_AUTH_MODE == "local"
+
+def get_current_time():
+    """Get current time in East Africa timezone"""
+    # Get UTC time first
+    utc_now = datetime.now(timezone.utc)
+    # Convert to East Africa timezone
+    return utc_now.astimezone(TIMEZONE)
+
+def convert_to_timezone(dt):
+    """Convert datetime to East Africa timezone"""
+    if dt is None:
+        return None
+    if isinstance(dt, str):
+        # Parse string to datetime, assuming UTC if no timezone specified
+        try:
+            dt = datetime.fromisoformat(dt.replace('Z', '+00:00'))
+        except ValueError:
+            # If parsing fails, assume it's UTC
+            dt = datetime.fromisoformat(dt).replace(tzinfo=timezone.utc)
+    if dt.tzinfo is None:
+        # If datetime has no timezone, assume it's UTC
+        dt = dt.replace(tzinfo=timezone.utc)
+    # Convert to East Africa timezone
+    return dt.astimezone(TIMEZONE)
+
+def expiry_epoch(customer: Dict) -> Optional[int]:
+    """Subscription expiry as UTC epoch seconds, or None when there is none"""
+    epoch = customer.get("expiry_epoch")
+    if epoch is not None:
+        return epoch
+    # Customers the backend has not backfilled yet
+    if customer.get("expiry"):
+        return int(convert_to_timezone(customer["expiry"]).timestamp())
+    return None
+
+def is_expired(epoch: Optional[int]) -> bool:
+    """Integer comparison against the clock; no datetime or timezone work"""
+    return epoch is not None and time.time() > epoch
+
+def _expired_reply(username: str, epoch: int) -> Dict:
+    logger.warning("Customer %s package expired at %s", username, datetime.fromtimestamp(epoch, TIMEZONE))
+    return format_radius_response({
+        "Reply-Message": "Access time expired"
+    })
+
+def safe_int(value, default=0):
+    """Safely convert value to int, return default if empty or invalid"""
+    if not value or value == "":
+        return default
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return default
+
+def _login_rejection(username: str, customer: Optional[Dict]) -> Optional[Dict]:
+    """Reject reply when ``customer`` may not log in, else ``None``"""
+    if not customer:
+        logger.warning("Customer not found: %s", username)
+        return format_radius_response({
+            "Reply-Message": "Login invalid"
+        })
+
+    # Check if customer is active
+    if customer.get("status") not in LOGIN_STATUSES:
+        logger.warning("Customer %s is not active. Status: %s", username, customer.get("status"))
+        return format_radius_response({
+            "Reply-Message": "Login disabled"
+        })
+
+    # Check if customer's package has expired
+    expiry = expiry_epoch(customer)
+    if is_expired(expiry):
+        return _expired_reply(username, expiry)
+    return None
+
+def _accept_reply(customer: Dict, template: Optional[Dict]) -> Dict:
+    return build_authorize_reply(
+        customer["password"],
+        template,
+        nt_password=nt_password_hash(customer["password"]) if LOCAL_AUTH else None
+    )
+
+def _snapshot_customer(username: str, agency: Optional[str]) -> Optional[Dict]:
+    """Customer from the last-known-good snapshot while the database is down"""
+    if not snapshot_store.loaded:
+        # Nothing to fall back to; an unanswered request beats rejecting everyone
+        raise DatabaseUnavailable("no snapshot loaded")
+    logger.warning("Database unavailable, using snapshot for %s", username)
+    return snapshot_store.lookup(username, agency)
+
+async def authorize_user(database, username: str, nas_ip_address: str = "", nas_identifier: str = "") -> Dict:
+    """Build the authorize reply for ``username`` in rest-module format.
+
+    ``username`` may carry a realm; it and the NAS pick the agency the
+    lookup is scoped to. Rejections carry only ``reply:Reply-Message``;
+    accepted users also get their credential under
+    ``control:Cleartext-Password`` (plus ``control:NT-Password`` in local
+    auth mode).
+    """
+    username, agency = realm_resolver.resolve(username, nas_ip_address, nas_identifier)
+    key = (agency, username)
+
+    # Serve repeat authorizations from the in-process cache
+    cached = authorize_cache.get(key)
+    if cached is not None:
+        logger.debug("Authorization served from cache for %s", username)
+        # Session-Timeout counts down to expiry, so it is never cached
+        return apply_session_timeout(*cached)
+
+    # Find customer and package by username in one round trip
+    logger.debug("Authorization request for user: %s", username)
+    try:
+        async with admission.slot("authorize"):
+            customer = await database_breaker.call(lambda: resolve_subscriber(database, username, agency))
+    except DatabaseUnavailable:
+        customer = _snapshot_customer(username, agency)
+        rejection = _login_rejection(username, customer)
+        if rejection is not None:
+            return rejection
+        # Not cached: the next request should go back to the database
+        logger.debug("Authorization successful for %s (snapshot)", username)
+        expiry = expiry_epoch(customer)
+        return apply_session_timeout(_accept_reply(customer, customer["template"]), expiry)
+
+    rejection = _login_rejection(username, customer)
+    if rejection is not None:
+        return rejection
+
+    # Build response from the compiled package template
+    template = None
+
+    # If customer has a package, use the resolved package details
+    if customer.get("package"):
+        package = customer["package_doc"]
+        if package:
+            template = package_replies.get(package)
+        else:
+            logger.warning("Package not found for customer %s: %s", username, customer["package"])
+
+    logger.debug("Authorization successful for %s", username)
+    expiry = expiry_epoch(customer)
+    response = _accept_reply(customer, template)
+    authorize_cache.put(
+        key,
+        response,
+        customer_id=str(customer["_id"]),
+        agency=customer.get("agency"),
+        package_id=customer.get("package"),
+        expiry_ts=expiry
+    )
+    return apply_session_timeout(response, expiry)
+
+def warm_authorize_cache() -> int:
+    """Seed the authorize cache from the snapshot if it is fresher than the cache TTL"""
+    age = snapshot_store.age()
+    if age is None or age >= authorize_cache.ttl:
+        return 0
+    warmed = 0
+    # Agencies reached through a realm or NAS are cached under their scope
+    scoped = realm_resolver.agencies
+    for username, customer in snapshot_store.snapshot.customers():
+        if warmed >= authorize_cache.max_size:
+            break
+        expiry = expiry_epoch(customer)
+        if is_expired(expiry):
+            continue
+        template = snapshot_store.snapshot.templates.get(customer.get("package") or "")
+        agency = customer.get("agency")
+        authorize_cache.put(
+            (agency if agency in scoped else None, username),
+            _accept_reply(customer, template),
+            customer_id=customer["_id"],
+            agency=agency,
+            package_id=customer.get("package"),
+            expiry_ts=expiry,
+            # Entries must not outlive what a cache miss at snapshot time would have
+            ttl=authorize_cache.ttl - age
+        )
+        warmed += 1
+    logger.info(f"Warmed authorize cache with {warmed} customers from snapshot")
+    return warmed
+
+async def authenticate_user(
+    database, username: str, password: str, nas_ip_address: str = "", nas_identifier: str = ""
+) -> Optional[Dict]:
+    """Check a cleartext password, returning ``None`` on success or a reject reply"""
+    username, agency = realm_resolver.resolve(username, nas_ip_address, nas_identifier)
+    async with admission.slot("auth"):
+        return await _authenticate(database, username, password, agency)
+
+async def _authenticate(database, username: str, password: str, agency: Optional[str]) -> Optional[Dict]:
+    # Find customer by username
+    logger.debug("Authentication request for user: %s", username)
+    try:
+        customer = await database_breaker.call(
+            lambda: find_subscriber(database, username, AUTHENTICATE_PROJECTION, agency)
+        )
+    except DatabaseUnavailable:
+        customer = _snapshot_customer(username, agency)
+
+    if not customer:
+        logger.warning("Customer not found: %s", username)
+        return format_radius_response({
+            "Reply-Message": "Login invalid"
+        })
+
+    # Check password
+    if customer["password"] != password:
+        logger.warning("Invalid password for customer: %s", username)
+        return format_radius_response({
+            "Reply-Message": "Wrong Password"
+        })
+
+    # Check if customer's package has expired
+    expiry = expiry_epoch(customer)
+    if is_expired(expiry):
+        return _expired_reply(username, expiry)
+
+    logger.debug("Authentication successful for %s", username)
+    return None
+
+async def process_accounting(database, body: Dict, received_at: Optional[datetime] = None) -> int:
+    """Queue an accounting packet, returning the HTTP status for the rest module.
+
+    ``body`` may use either the rest-module JSON keys or RADIUS attribute names.
+    While the database is down or the write buffer is full the packet is
+    spooled to disk and acknowledged; ``received_at`` carries its arrival
+    time through the later replay.
+    """
+    if received_at is None and accounting_spool.pending():
+        # Counters are cumulative; a live packet must not overtake older
+        # spooled ones of the same session, so it waits its turn
+        accounting_spool.append(body, get_current_time())
+        return 204
+
+    # Get required fields with fallbacks for both formats
+    username = body.get("username", body.get("User-Name"))
+    session_id = body.get("session_id", body.get("Acct-Session-Id"))
+    status = body.get("status", body.get("Acct-Status-Type"))
+
+    if status in NAS_RESET_STATUSES:
+        # Sent without a username when the NAS boots or shuts down
+        nas_ip_address = body.get("NAS-IP-Address", body.get("nas_ip_address", ""))
+        nas_identifier = body.get("NAS-Identifier", body.get("nas_identifier", ""))
+        if not nas_ip_address and not nas_identifier:
+            logger.error("%s without a NAS address", status)
+            return 400
+        try:
+            async with admission.slot("accounting"):
+                cleared = await database_breaker.call(
+                    lambda: clear_nas_sessions(database, nas_ip_address, nas_identifier)
+                )
+        except DatabaseUnavailable:
+            accounting_spool.append(body, received_at or get_current_time())
+            return 204
+        logger.info("%s from %s: cleared %d sessions", status, nas_ip_address or nas_identifier, cleared)
+        return 204
+
+    if not username or not session_id or not status:
+        logger.error("Missing required fields in accounting request")
+        return 400
+
+    if accounting_buffer.full():
+        # Writes are falling behind; park live packets on disk rather than
+        # stalling every request on a flush, and retry replays later
+        if received_at is not None:
+            return 503
+        accounting_buffer.overflows += 1
+        accounting_spool.append(body, get_current_time())
+        logger.warning("Accounting buffer full, spooled %s accounting for %s", status, username)
+        return 204
+
+    nas_ip_address = body.get("NAS-IP-Address", body.get("nas_ip_address", ""))
+    nas_identifier = body.get("NAS-Identifier", body.get("nas_identifier", ""))
+    username, agency = realm_resolver.resolve(username, nas_ip_address, nas_identifier)
+
+    # Get customer details
+    try:
+        async with admission.slot("accounting"):
+            customer = await database_breaker.call(
+                lambda: find_subscriber(database, username, ACCOUNTING_PROJECTION, agency)
+            )
+    except DatabaseUnavailable:
+        # Acknowledge now and replay once the database is back
+        accounting_spool.append(body, received_at or get_current_time())
+        logger.warning("Database unavailable, spooled %s accounting for %s", status, username)
+        return 204
+
+    if not customer:
+        logger.error("Customer not found for accounting: %s", username)
+        return 404
+
+    # Get current time in East Africa timezone, or when a spooled packet arrived
+    current_time = received_at or get_current_time()
+
+    # Structure accounting data
+    accounting_data = {
+        "username": username,
+        "session_id": session_id,
+        "customer_id": str(customer["_id"]),
+        "agency": customer["agency"],
+        "package": customer.get("package"),
+        "status": status,
+        "session_time": safe_int(body.get("Acct-Session-Time", body.get("session_time", 0))),
+        "input_octets": safe_int(body.get("Acct-Input-Octets", body.get("input_octets", 0))),
+        "output_octets": safe_int(body.get("Acct-Output-Octets", body.get("output_octets", 0))),
+        "input_packets": safe_int(body.get("Acct-Input-Packets", body.get("input_packets", 0))),
+        "output_packets": safe_int(body.get("Acct-Output-Packets", body.get("output_packets", 0))),
+        "input_gigawords": safe_int(body.get("Acct-Input-Gigawords", body.get("input_gigawords", 0))),
+        "output_gigawords": safe_int(body.get("Acct-Output-Gigawords", body.get("output_gigawords", 0))),
+        "called_station_id": body.get("Called-Station-Id", body.get("called_station_id", "")),
+        "calling_station_id": body.get("Calling-Station-Id", body.get("calling_station_id", "")),
+        "terminate_cause": body.get("Acct-Terminate-Cause", body.get("terminate_cause", "")),
+        "nas_ip_address": nas_ip_address,
+        "nas_identifier": nas_identifier,
+        "nas_port": body.get("NAS-Port", body.get("nas_port", "")),
+        "nas_port_type": body.get("NAS-Port-Type", body.get("nas_port_type", "")),
+        "service_type": body.get("Service-Type", body.get("service_type", "")),
+        "framed_protocol": body.get("Framed-Protocol", body.get("framed_protocol", "")),
+        "framed_ip_address": body.get("Framed-IP-Address", body.get("framed_ip_address", "")),
+        "idle_timeout": safe_int(body.get("Idle-Timeout", body.get("idle_timeout", 0))),
+        "session_timeout": safe_int(body.get("Session-Timeout", body.get("session_timeout", 0))),
+        "mikrotik_rate_limit": body.get("Mikrotik-Rate-Limit", body.get("mikrotik_rate_limit", "")),
+        "timestamp": current_time,
+        "last_update": current_time
+    }
+
+    # Calculate total bytes (including gigawords)
+    total_input = (accounting_data["input_gigawords"] * (2**32)) + accounting_data["input_octets"]
+    total_output = (accounting_data["output_gigawords"] * (2**32)) + accounting_data["output_octets"]
+
+    # Add calculated fields
+    accounting_data.update({
+        "total_input_bytes": total_input,
+        "total_output_bytes": total_output,
+        "total_bytes": total_input + total_output,
+        "input_mbytes": round(total_input / (1024 * 1024), 2),
+        "output_mbytes": round(total_output / (1024 * 1024), 2),
+        "total_mbytes": round((total_input + total_output) / (1024 * 1024), 2),
+        "session_time_hours": round(accounting_data["session_time"] / 3600, 2)
+    })
+
+    if received_at is not None and usage_rollups.is_stale(accounting_data):
+        # Its usage is already inside the later packet's counters; counting it
+        # or storing it as the latest state would roll the session back
+        accounting_spool.stale += 1
+        logger.warning("Dropping stale spooled %s for %s session %s", status, username, session_id)
+        return 204
+
+    # Queue accounting data for the write-behind buffer
+    try:
+        customer_update = None
+
+        # Update customer's last_seen and usage_stats if this is a stop record
+        if status == "Stop":
+            session_start_time = current_time - timedelta(seconds=accounting_data["session_time"])
+            update_data = {
+                "last_seen": current_time,
+                "last_session": {
+                    "session_id": session_id,
+                    "start_time": session_start_time,
+                    "end_time": current_time,
+                    "duration": accounting_data["session_time"],
+                    "input_bytes": total_input,
+                    "output_bytes": total_output,
+                    "terminate_cause": accounting_data["terminate_cause"],
+                    "framed_ip": accounting_data["framed_ip_address"],
+                    "rate_limit": accounting_data["mikrotik_rate_limit"]
+                }
+            }
+            customer_update = {
+                "$set": update_data,
+                "$inc": {
+                    "total_sessions": 1,
+                    "total_online_time": accounting_data["session_time"],
+                    "total_input_bytes": total_input,
+                    "total_output_bytes": total_output
+                }
+            }
+
+        # Counter deltas feed the usage buckets and the live rate table
+        delta = usage_rollups.record(accounting_data, customer.get("station"))
+        rates = live_rates.update(accounting_data, delta)
+
+        # Update the per-username "latest" record and append to history
+        accounting_buffer.submit(
+            username,
+            session_id,
+            {
+                **accounting_data,
+                "last_update": current_time,
+                "last_session_id": session_id,
+                "last_status": status
+            },
+            customer_id=customer["_id"],
+            customer_update=customer_update,
+            usage_key=session_key(nas_ip_address, nas_identifier, session_id),
+            history_record=history_record(accounting_data),
+            session_operation=session_operation(accounting_data, customer.get("station"), rates)
+        )
+        logger.debug("Queued %s accounting update for %s", status, username)
+        return 204
+
+    except Exception as e:
+        logger.error("Failed to store accounting data: %s", e)
+        return 500
+
+def record_post_auth(body: Dict) -> None:
+    """Queue a post-auth event; ``body`` uses rest-module keys or attribute names"""
+    nas_ip_address = body.get("NAS-IP-Address", body.get("nas_ip_address", ""))
+    nas_identifier = body.get("NAS-Identifier", body.get("nas_identifier", ""))
+    # Store the realm-stripped name under the agency the request was scoped to
+    username, agency = realm_resolver.resolve(
+        body.get("username", body.get("User-Name", "unknown")), nas_ip_address, nas_identifier
+    )
+    post_auth_buffer.submit({
+        "username": username,
+        "agency": body.get("agency") or agency,
+        "result": body.get("result", body.get("Packet-Type", "")),
+        "reply_message": body.get("reply_message", body.get("Reply-Message", "")),
+        "nas_ip_address": nas_ip_address,
+        "nas_identifier": nas_identifier,
+        "nas_port_id": body.get("NAS-Port-Id", body.get("nas_port_id", "")),
+        "called_station_id": body.get("Called-Station-Id", body.get("called_station_id", "")),
+        "calling_station_id": body.get("Calling-Station-Id", body.get("calling_station_id", "")),
+        "timestamp": get_current_time()
+    })
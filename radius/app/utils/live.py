@@ -0,0 +1,156 @@
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+import asyncio
+import heapq
+import json
+import logging
+import os
+import time
+from .sessions import session_key, SESSION_STALE_AFTER
+
+logger = logging.getLogger(__name__)
+
+# How often the live feed is recomputed and pushed to subscribers
+LIVE_FEED_INTERVAL = float(os.getenv("RADIUS_LIVE_FEED_INTERVAL", "2.0"))  # seconds
+LIVE_FEED_MAX_TOP = 100
+# Open /radius/live/top streams across all topics
+LIVE_FEED_MAX_SUBSCRIBERS = int(os.getenv("RADIUS_LIVE_FEED_MAX_SUBSCRIBERS", "50"))
+
+class LiveRates:
+    """Current upload/download rate of every online session, in memory.
+
+    Rates come from the counter deltas the usage rollups already compute,
+    divided by the Acct-Session-Time delta so NAS-side timing rather than
+    packet arrival jitter sets the interval. Acct-Input is what the
+    subscriber sent (upload) and Acct-Output what they received (download).
+    """
+
+    def __init__(self, stale_after: float = SESSION_STALE_AFTER):
+        self.stale_after = stale_after
+        self._sessions: Dict[str, Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def update(self, accounting_data: Dict, delta: Optional[Tuple[int, int, int]]) -> Optional[Tuple[int, int]]:
+        """Record a packet's rates; returns (download_bps, upload_bps) when known"""
+        key = session_key(
+            accounting_data["nas_ip_address"],
+            accounting_data["nas_identifier"],
+            accounting_data["session_id"]
+        )
+        if accounting_data["status"] == "Stop":
+            self._sessions.pop(key, None)
+            return None
+        if delta is None or delta[2] <= 0:
+            return None
+        upload_bps = delta[0] * 8 // delta[2]
+        download_bps = delta[1] * 8 // delta[2]
+        self._sessions[key] = {
+            "username": accounting_data["username"],
+            "agency": accounting_data["agency"],
+            "nas_ip_address": accounting_data["nas_ip_address"],
+            "framed_ip_address": accounting_data["framed_ip_address"],
+            "download_bps": download_bps,
+            "upload_bps": upload_bps,
+            "updated": time.monotonic()
+        }
+        return download_bps, upload_bps
+
+    def prune(self) -> None:
+        cutoff = time.monotonic() - self.stale_after
+        for key in [key for key, session in self._sessions.items() if session["updated"] < cutoff]:
+            del self._sessions[key]
+
+    def top(self, agency: Optional[str] = None, nas: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Heaviest sessions by combined rate, optionally for one agency or NAS"""
+        sessions = (
+            session for session in self._sessions.values()
+            if (agency is None or session["agency"] == agency)
+            and (nas is None or session["nas_ip_address"] == nas)
+        )
+        heaviest = heapq.nlargest(limit, sessions, key=lambda session: session["download_bps"] + session["upload_bps"])
+        return [
+            {field: value for field, value in session.items() if field != "updated"}
+            for session in heaviest
+        ]
+
+# Shared rate table
+live_rates = LiveRates()
+
+class LiveFeed:
+    """Coalesced top-N broadcaster.
+
+    Subscribers asking for the same (agency, NAS, N) share a topic. Once per
+    interval each active topic is computed and serialised once, then handed
+    to every subscriber's one-slot queue; a slow consumer simply skips to
+    the latest snapshot. Nothing runs while nobody is subscribed.
+    """
+
+    def __init__(self, rates: LiveRates, interval: float = LIVE_FEED_INTERVAL):
+        self.rates = rates
+        self.interval = interval
+        self._topics: Dict[tuple, Set[asyncio.Queue]] = {}
+        self._latest: Dict[tuple, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.ticks = 0
+
+    def subscribers(self) -> int:
+        return sum(len(subscribers) for subscribers in self._topics.values())
+
+    async def subscribe(self, agency: Optional[str], nas: Optional[str], limit: int) -> AsyncIterator[str]:
+        """Yield JSON snapshots until the caller stops iterating"""
+        topic = (agency, nas, max(1, min(limit, LIVE_FEED_MAX_TOP)))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._topics.setdefault(topic, set()).add(queue)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        try:
+            # New subscribers get the current snapshot without waiting a tick
+            if topic not in self._latest:
+                self._latest[topic] = self._snapshot(topic)
+            yield self._latest[topic]
+            while True:
+                yield await queue.get()
+        finally:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._topics[topic]
+                    self._latest.pop(topic, None)
+
+    def _snapshot(self, topic: tuple) -> str:
+        agency, nas, limit = topic
+        return json.dumps({
+            "agency": agency,
+            "nas": nas,
+            "top": self.rates.top(agency, nas, limit),
+            "timestamp": time.time()
+        })
+
+    async def _run(self) -> None:
+        try:
+            while self._topics:
+                await asyncio.sleep(self.interval)
+                self.rates.prune()
+                self.ticks += 1
+                for topic, subscribers in list(self._topics.items()):
+                    payload = self._snapshot(topic)
+                    self._latest[topic] = payload
+                    for queue in subscribers:
+                        if queue.full():
+                            queue.get_nowait()
+                        queue.put_nowait(payload)
+        finally:
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "sessions": len(self.rates),
+            "topics": len(self._topics),
+            "subscribers": self.subscribers(),
+            "ticks": self.ticks
+        }
+
+# Shared feed instance
+live_feed = LiveFeed(live_rates)
@@ -0,0 +1,183 @@
+"""Non-blocking logging for the RADIUS hot path.
+
+Handlers only put the unformatted record on a bounded queue; a
+QueueListener thread does the %-formatting, JSON encoding and stdout
+writes. Per-packet payloads are logged at DEBUG for a sample of packets,
+and each logger is rate limited so a flood of rejects or errors cannot
+take the process down with it. Limits apply per logger and function, which
+for the request handlers means per endpoint.
+
+    RADIUS_LOG_LEVEL           root level (INFO)
+    RADIUS_LOG_FORMAT          "text" or "json"
+    RADIUS_LOG_PAYLOAD_SAMPLE  share of packets whose body is logged at DEBUG
+    RADIUS_LOG_RATE_LIMIT      records per second per call site, 0 for no limit
+"""
+from typing import Dict, Optional, TextIO
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+RADIUS_LOG_LEVEL = os.getenv("RADIUS_LOG_LEVEL", "INFO").upper()
+RADIUS_LOG_FORMAT = os.getenv("RADIUS_LOG_FORMAT", "text").lower()
+RADIUS_LOG_PAYLOAD_SAMPLE = float(os.getenv("RADIUS_LOG_PAYLOAD_SAMPLE", "0.01"))
+RADIUS_LOG_RATE_LIMIT = float(os.getenv("RADIUS_LOG_RATE_LIMIT", "50"))
+RADIUS_LOG_QUEUE_SIZE = int(os.getenv("RADIUS_LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# LogRecord attributes; anything else on a record came in through ``extra``
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+class LazyJson:
+    """Serialises its value only if the record is actually formatted"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self) -> str:
+        return json.dumps(self.value, default=str)
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per logger and function.
+
+    Records over the limit are dropped and counted; the next record that
+    gets through carries the count as ``suppressed``.
+    """
+
+    def __init__(self, rate: float = RADIUS_LOG_RATE_LIMIT, burst: Optional[float] = None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst or rate
+        self._buckets: Dict[tuple, list] = {}
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        key = (record.name, record.funcName)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            # tokens, last refill, suppressed since the last record let through
+            bucket = self._buckets[key] = [self.burst, now, 0]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            bucket[2] += 1
+            self.suppressed += 1
+            return False
+        bucket[0] = tokens - 1
+        if bucket[2]:
+            record.suppressed = bucket[2]
+            bucket[2] = 0
+        return True
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{message} [{suppressed} similar suppressed]" if suppressed else message
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra`` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records as they are; the stock handler formats them in the
+    caller's thread. Log arguments must not be mutated after the call.
+    """
+
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block a request on logging
+            self.dropped += 1
+
+class LogPipeline:
+    """Owns the queue handler on the root logger and its listener thread"""
+
+    def __init__(self, sample: float = RADIUS_LOG_PAYLOAD_SAMPLE):
+        self.sample = sample
+        self.handler: Optional[DeferredQueueHandler] = None
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.rate_limit: Optional[RateLimitFilter] = None
+        self.sampled = 0
+
+    def start(
+        self,
+        level: str = RADIUS_LOG_LEVEL,
+        log_format: str = RADIUS_LOG_FORMAT,
+        rate_limit: float = RADIUS_LOG_RATE_LIMIT,
+        queue_size: int = RADIUS_LOG_QUEUE_SIZE,
+        stream: Optional[TextIO] = None
+    ) -> None:
+        if self.listener is not None:
+            return
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter(TEXT_FORMAT))
+        self.handler = DeferredQueueHandler(queue.Queue(queue_size))
+        self.rate_limit = RateLimitFilter(rate_limit)
+        self.handler.addFilter(self.rate_limit)
+
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(level)
+        self.listener = logging.handlers.QueueListener(self.handler.queue, output)
+        self.listener.start()
+
+    def stop(self) -> None:
+        """Write out whatever is queued and detach from the root logger"""
+        if self.listener is None:
+            return
+        self.listener.stop()
+        logging.getLogger().removeHandler(self.handler)
+        self.listener = None
+
+    def payload(self, logger: logging.Logger, label: str, body) -> None:
+        """Log a packet body for a sample of packets; free unless DEBUG is on"""
+        if logger.isEnabledFor(logging.DEBUG) and random.random() < self.sample:
+            self.sampled += 1
+            # Attribute the record (and its rate limit) to the calling endpoint
+            logger.debug("%s payload: %s", label, LazyJson(body), stacklevel=2)
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self.handler.queue.qsize() if self.handler else 0,
+            "dropped": self.handler.dropped if self.handler else 0,
+            "suppressed": self.rate_limit.suppressed if self.rate_limit else 0,
+            "sampled_payloads": self.sampled
+        }
+
+# Shared pipeline; started by app.main
+log_pipeline = LogPipeline()
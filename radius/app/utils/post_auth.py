@@ -0,0 +1,77 @@
+from collections import deque
+from typing import Deque, Dict, List
+import logging
+import os
+from .batching import BatchWriter, unwritten_documents
+
+logger = logging.getLogger(__name__)
+
+# Flush triggers and ring size (override through the environment)
+POST_AUTH_FLUSH_INTERVAL = float(os.getenv("RADIUS_POST_AUTH_FLUSH_INTERVAL", "2.0"))  # seconds
+POST_AUTH_BATCH_SIZE = int(os.getenv("RADIUS_POST_AUTH_BATCH_SIZE", "1000"))
+# Oldest events are dropped once this many are waiting to be written
+POST_AUTH_BUFFER_SIZE = int(os.getenv("RADIUS_POST_AUTH_BUFFER_SIZE", "50000"))
+
+class PostAuthBuffer(BatchWriter):
+    """Ring buffer of post-auth events written to ``post_auth`` in batches.
+
+    Auth-attempt history is analytics, not billing, so under sustained
+    pressure the oldest events are dropped rather than slowing logins down.
+    Events carry the agency their realm or NAS resolved to. Events from
+    unscoped requests get the agency of the only customer with that
+    username, looked up for the whole batch with one ``$in`` query at flush
+    time; usernames shared by several agencies are left without one.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = POST_AUTH_FLUSH_INTERVAL,
+        max_batch: int = POST_AUTH_BATCH_SIZE,
+        capacity: int = POST_AUTH_BUFFER_SIZE
+    ):
+        super().__init__("post_auth", flush_interval, max_batch)
+        self._events: Deque[Dict] = deque(maxlen=capacity)
+        self.dropped = 0
+
+    def pending(self) -> int:
+        return len(self._events)
+
+    def submit(self, event: Dict) -> None:
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+        self.notify()
+
+    def _take_batch(self) -> List[Dict]:
+        batch = list(self._events)
+        self._events.clear()
+        return batch
+
+    async def _write_batch(self, database, batch: List[Dict]) -> int:
+        unresolved = {event["username"] for event in batch if not event.get("agency")}
+        if unresolved:
+            matches: Dict[str, set] = {}
+            async for customer in database.get_collection("customers").find(
+                {"username": {"$in": list(unresolved)}},
+                {"_id": 0, "username": 1, "agency": 1}
+            ):
+                matches.setdefault(customer["username"], set()).add(customer.get("agency"))
+            agencies = {username: found.pop() for username, found in matches.items() if len(found) == 1}
+            for event in batch:
+                if not event.get("agency"):
+                    event["agency"] = agencies.get(event["username"])
+        await database.get_collection("post_auth").insert_many(batch, ordered=False)
+        return len(batch)
+
+    def _restore_batch(self, batch: List[Dict], error: Exception) -> None:
+        # Retry the failed events ahead of newer ones, within the ring size
+        retry = unwritten_documents(batch, error)
+        restored = deque(retry + list(self._events), maxlen=self._events.maxlen)
+        self.dropped += len(retry) + len(self._events) - len(restored)
+        self._events = restored
+
+    def stats(self) -> Dict:
+        return {**super().stats(), "dropped": self.dropped}
+
+# Shared buffer instance
+post_auth_buffer = PostAuthBuffer()
@@ -0,0 +1,103 @@
+from typing import Dict, Optional, Set, Tuple
+import asyncio
+import logging
+import os
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# user<delimiter>realm; only the last delimiter counts, so "a@b@realm" keeps "a@b"
+RADIUS_REALM_DELIMITER = os.getenv("RADIUS_REALM_DELIMITER", "@")
+RADIUS_REALM_REFRESH = float(os.getenv("RADIUS_REALM_REFRESH", "60"))  # seconds
+
+class RealmResolver:
+    """Maps a request to the agency whose subscribers it refers to.
+
+    ``user@realm`` selects the agency whose ``realm`` matches and strips the
+    realm; otherwise a NAS listed in an agency's ``nas_clients`` (by
+    NAS-Identifier, then NAS-IP-Address) does. Requests matching neither
+    keep the legacy lookup by username across all agencies.
+    """
+
+    def __init__(self, interval: float = RADIUS_REALM_REFRESH):
+        self.interval = interval
+        self._realms: Dict[str, str] = {}
+        self._nas: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.realm_matches = 0
+        self.nas_matches = 0
+        self.unscoped = 0
+
+    @property
+    def agencies(self) -> Set[str]:
+        """Agencies that any realm or NAS resolves to"""
+        return set(self._realms.values()) | set(self._nas.values())
+
+    def mapping(self) -> Dict[str, Dict[str, str]]:
+        return {"realms": dict(self._realms), "nas": dict(self._nas)}
+
+    def restore(self, mapping: Dict[str, Dict[str, str]]) -> None:
+        """Reuse a mapping saved in the snapshot until the database answers"""
+        self._realms = dict(mapping.get("realms", {}))
+        self._nas = dict(mapping.get("nas", {}))
+
+    async def refresh(self, database) -> None:
+        realms: Dict[str, str] = {}
+        nas: Dict[str, str] = {}
+        async for agency in database.get_collection("agencies").find({}, {"realm": 1, "nas_clients": 1}):
+            agency_id = str(agency["_id"])
+            if agency.get("realm"):
+                realms[agency["realm"].lower()] = agency_id
+            for client in agency.get("nas_clients") or []:
+                if client in nas and nas[client] != agency_id:
+                    logger.warning(f"NAS {client} is listed by more than one agency; using {agency_id}")
+                nas[client] = agency_id
+        self._realms, self._nas = realms, nas
+
+    def resolve(self, username: str, nas_ip_address: str = "", nas_identifier: str = "") -> Tuple[str, Optional[str]]:
+        """The username to look up and the agency to scope it to, if any"""
+        name, delimiter, realm = username.rpartition(RADIUS_REALM_DELIMITER)
+        if delimiter and name:
+            agency = self._realms.get(realm.lower())
+            if agency is not None:
+                self.realm_matches += 1
+                return name, agency
+        agency = self._nas.get(nas_identifier) if nas_identifier else None
+        if agency is None and nas_ip_address:
+            agency = self._nas.get(nas_ip_address)
+        if agency is not None:
+            self.nas_matches += 1
+        else:
+            self.unscoped += 1
+        return username, agency
+
+    def start(self, database) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(database))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, database) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh(database)
+            except PyMongoError as e:
+                # Keep resolving with the previous mapping
+                logger.error(f"Realm refresh failed: {str(e)}")
+
+    def stats(self) -> Dict:
+        return {
+            "realms": len(self._realms),
+            "nas_clients": len(self._nas),
+            "realm_matches": self.realm_matches,
+            "nas_matches": self.nas_matches,
+            "unscoped": self.unscoped
+        }
+
+# Shared resolver instance
+realm_resolver = RealmResolver()
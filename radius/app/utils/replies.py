@@ -0,0 +1,116 @@
+from typing import Dict, Optional
+import logging
+import time
+from ..models.radius_models import RadiusProfile
+
+logger = logging.getLogger(__name__)
+
+# Control attributes that should go in the control section
+CONTROL_ATTRS = {
+    "Cleartext-Password",
+    "NT-Password",
+    "LM-Password",
+    "Password-With-Header",
+    "Auth-Type"
+}
+
+# Package fields that affect the compiled reply
+PACKAGE_REPLY_FIELDS = (
+    "name", "download_speed", "upload_speed", "burst_download", "burst_upload",
+    "threshold_download", "threshold_upload", "burst_time", "service_type",
+    "address_pool", "session_timeout", "idle_timeout", "priority", "vlan_id"
+)
+
+def format_radius_response(data: Dict) -> Dict:
+    """Format response according to FreeRADIUS REST module specs"""
+    # FreeRADIUS expects a flat structure with control:XXX and reply:XXX
+    response = {}
+
+    for key, value in data.items():
+        if key in CONTROL_ATTRS:
+            if isinstance(value, dict):
+                response[f"control:{key}"] = value
+            else:
+                response[f"control:{key}"] = {"value": [str(value)], "op": ":="}
+        else:
+            if isinstance(value, dict):
+                response[f"reply:{key}"] = value
+            else:
+                response[f"reply:{key}"] = {"value": [str(value)], "op": ":="}
+
+    return response
+
+def compile_package_reply(package: Dict) -> Dict:
+    """Turn a package document into ready-made reply:* attributes"""
+    profile = RadiusProfile.from_package(package)
+    reply = {"Mikrotik-Rate-Limit": profile.get_rate_limit()}
+    for attr in profile.to_radius_attributes():
+        if attr.name not in reply:
+            reply[attr.name] = attr.value
+    return format_radius_response(reply)
+
+def package_version(package: Dict):
+    """Version key used to detect stale compiled templates"""
+    if package.get("updated_at") is not None:
+        return package["updated_at"]
+    return tuple(package.get(field) for field in PACKAGE_REPLY_FIELDS)
+
+class PackageReplyRegistry:
+    """Compiled reply templates keyed by package id and version.
+
+    Replies depend only on the package document, so each package is compiled
+    once and reused until its ``updated_at`` changes. Callers merge the
+    per-customer control attributes into a copy of the template.
+    """
+
+    def __init__(self):
+        self._templates: Dict[str, tuple] = {}
+        self.compiles = 0
+
+    def get(self, package: Dict) -> Dict:
+        package_id = str(package["_id"])
+        version = package_version(package)
+        cached = self._templates.get(package_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        template = compile_package_reply(package)
+        self._templates[package_id] = (version, template)
+        self.compiles += 1
+        return template
+
+    def invalidate(self, package_id: str) -> None:
+        self._templates.pop(package_id, None)
+
+    def stats(self) -> Dict:
+        return {"templates": len(self._templates), "compiles": self.compiles}
+
+# Shared registry instance
+package_replies = PackageReplyRegistry()
+
+def build_authorize_reply(
+    password: str,
+    template: Optional[Dict] = None,
+    nt_password: Optional[str] = None
+) -> Dict:
+    """Merge the per-customer credentials into a compiled package template"""
+    response = {"control:Cleartext-Password": {"value": [str(password)], "op": ":="}}
+    if nt_password:
+        response["control:NT-Password"] = {"value": [nt_password], "op": ":="}
+    if template:
+        response.update(template)
+    return response
+
+def apply_session_timeout(reply: Dict, expiry_ts: Optional[float], now: Optional[float] = None) -> Dict:
+    """Cap ``reply:Session-Timeout`` at the seconds left on the subscription.
+
+    The NAS then ends the session when the subscription expires, so expired
+    customers need no sweep or disconnect. The package's own session_timeout
+    still applies when it is shorter. Returns a copy; ``reply`` may be shared.
+    """
+    if expiry_ts is None:
+        return reply
+    remaining = max(1, int(expiry_ts - (time.time() if now is None else now)))
+    package_timeout = reply.get("reply:Session-Timeout")
+    if package_timeout is not None:
+        remaining = min(remaining, int(package_timeout["value"][0]))
+    return {**reply, "reply:Session-Timeout": {"value": [str(remaining)], "op": ":="}}
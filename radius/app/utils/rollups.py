@@ -0,0 +1,214 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from .batching import BatchWriter
+from .sessions import session_key
+
+logger = logging.getLogger(__name__)
+
+# Flush triggers (override through the environment); a batch is one write per
+# touched bucket, however many packets fed it
+ROLLUP_FLUSH_INTERVAL = float(os.getenv("RADIUS_ROLLUP_FLUSH_INTERVAL", "5.0"))  # seconds
+ROLLUP_BATCH_SIZE = int(os.getenv("RADIUS_ROLLUP_BATCH_SIZE", "2000"))
+# Sessions whose last counters are remembered for delta computation
+ROLLUP_TRACKED_SESSIONS = int(os.getenv("RADIUS_ROLLUP_TRACKED_SESSIONS", "200000"))
+
+# Bucket collections by granularity
+ROLLUP_COLLECTIONS = {"hourly": "usage_hourly", "daily": "usage_daily"}
+# Accounting fields each usage dimension is keyed by
+ROLLUP_DIMENSIONS = {"customer": "customer_id", "station": "station", "package": "package", "agency": "agency"}
+
+# Acct-*-Octets are 32-bit counters; Gigawords count their wraps
+OCTET_WRAP = 2**32
+
+def counter_delta(current: int, previous: int, wraps: bool = True) -> int:
+    """Growth of a cumulative counter between two accounting packets.
+
+    Byte totals already include Gigawords (see process_accounting). A NAS
+    that does not send Gigawords wraps at 2**32, which shows up as a large
+    drop; any other drop means the counters restarted.
+    """
+    if current >= previous:
+        return current - previous
+    if wraps and previous < OCTET_WRAP and previous - current > OCTET_WRAP // 2:
+        return current + OCTET_WRAP - previous
+    return current
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Start of the hour or day ``timestamp`` falls in, in its own timezone"""
+    if granularity == "daily":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+class UsageRollups(BatchWriter):
+    """Incremental hourly and daily usage per customer, station, package and agency.
+
+    Accounting packets carry cumulative counters, so each one is turned into
+    a delta against the previous packet of its session. Deltas are summed in
+    memory per bucket and ``$inc``-ed into ``usage_hourly``/``usage_daily``
+    on flush. The last counters per session are loaded from
+    ``radius_sessions`` on startup; a session seen for the first time
+    mid-way (e.g. reaped, or older than the registry) only counts from its
+    next packet.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = ROLLUP_FLUSH_INTERVAL,
+        max_batch: int = ROLLUP_BATCH_SIZE,
+        tracked_sessions: int = ROLLUP_TRACKED_SESSIONS
+    ):
+        super().__init__("usage_rollups", flush_interval, max_batch)
+        self.tracked_sessions = tracked_sessions
+        self._baselines: "OrderedDict[str, Tuple[int, int, int]]" = OrderedDict()
+        self._buckets: Dict[tuple, List] = {}
+        self.untracked = 0
+
+    def pending(self) -> int:
+        return len(self._buckets)
+
+    async def load_baselines(self, database) -> None:
+        """Seed per-session counters from the live-session registry"""
+        async for session in database.get_collection("radius_sessions").find(
+            {}, {"total_input_bytes": 1, "total_output_bytes": 1, "session_time": 1}
+        ).sort("last_update", 1):
+            if session["_id"] in self._baselines:
+                # Loaded late (degraded start); counters seen since are newer
+                continue
+            self._remember(session["_id"], (
+                session.get("total_input_bytes", 0),
+                session.get("total_output_bytes", 0),
+                session.get("session_time", 0)
+            ))
+        logger.info(f"Loaded usage baselines for {len(self._baselines)} sessions")
+
+    def _remember(self, key: str, counters: Tuple[int, int, int]) -> None:
+        self._baselines[key] = counters
+        self._baselines.move_to_end(key)
+        while len(self._baselines) > self.tracked_sessions:
+            self._baselines.popitem(last=False)
+
+    def is_stale(self, accounting_data: Dict) -> bool:
+        """Whether a packet is older than the session's baseline, e.g. an
+        Interim-Update replayed from the spool after a later one was counted"""
+        previous = self._baselines.get(session_key(
+            accounting_data["nas_ip_address"],
+            accounting_data["nas_identifier"],
+            accounting_data["session_id"]
+        ))
+        return previous is not None and accounting_data["session_time"] < previous[2]
+
+    def record(self, accounting_data: Dict, station: Optional[str] = None) -> Optional[Tuple[int, int, int]]:
+        """Add a packet's usage to its buckets.
+
+        Returns the (input bytes, output bytes, session time) delta since the
+        session's previous packet, or None when there is no baseline.
+        """
+        key = session_key(
+            accounting_data["nas_ip_address"],
+            accounting_data["nas_identifier"],
+            accounting_data["session_id"]
+        )
+        counters = (
+            accounting_data["total_input_bytes"],
+            accounting_data["total_output_bytes"],
+            accounting_data["session_time"]
+        )
+        status = accounting_data["status"]
+        if status == "Start":
+            previous = (0, 0, 0)
+        else:
+            previous = self._baselines.get(key)
+
+        if status == "Stop":
+            self._baselines.pop(key, None)
+        else:
+            self._remember(key, counters)
+        if previous is None:
+            self.untracked += 1
+            return None
+
+        delta = (
+            counter_delta(counters[0], previous[0]),
+            counter_delta(counters[1], previous[1]),
+            counter_delta(counters[2], previous[2], wraps=False)
+        )
+        if not any(delta):
+            return delta
+        values = {**accounting_data, "station": station}
+        for granularity, collection_name in ROLLUP_COLLECTIONS.items():
+            bucket = bucket_start(accounting_data["timestamp"], granularity)
+            for dimension, field in ROLLUP_DIMENSIONS.items():
+                if not values.get(field):
+                    continue
+                totals = self._buckets.setdefault(
+                    (collection_name, dimension, values[field], bucket),
+                    [0, 0, 0, accounting_data["agency"]]
+                )
+                totals[0] += delta[0]
+                totals[1] += delta[1]
+                totals[2] += delta[2]
+        self.notify()
+        return delta
+
+    def _take_batch(self):
+        batch = self._buckets
+        self._buckets = {}
+        return batch
+
+    async def _write_batch(self, database, batch) -> int:
+        by_collection: Dict[str, List[UpdateOne]] = {}
+        for (collection_name, dimension, key, bucket), (input_bytes, output_bytes, session_time, agency) in batch.items():
+            by_collection.setdefault(collection_name, []).append(UpdateOne(
+                {"dimension": dimension, "key": key, "bucket": bucket},
+                {
+                    "$inc": {
+                        "input_bytes": input_bytes,
+                        "output_bytes": output_bytes,
+                        "total_bytes": input_bytes + output_bytes,
+                        "session_time": session_time
+                    },
+                    "$setOnInsert": {"agency": agency}
+                },
+                upsert=True
+            ))
+        written = 0
+        for collection_name in list(by_collection):
+            await database.get_collection(collection_name).bulk_write(
+                by_collection[collection_name], ordered=False
+            )
+            written += len(by_collection[collection_name])
+            # Written buckets must not be retried if a later collection fails
+            for bucket_key in [bucket_key for bucket_key in batch if bucket_key[0] == collection_name]:
+                del batch[bucket_key]
+        return written
+
+    def _restore_batch(self, batch, error: Exception) -> None:
+        # $inc is not idempotent: after a partial unordered write only the
+        # reported failures go back
+        if isinstance(error, BulkWriteError):
+            failed_collection = next(iter(batch))[0]
+            keys = [key for key in batch if key[0] == failed_collection]
+            failed = {write_error["index"] for write_error in error.details.get("writeErrors", [])}
+            for index, key in enumerate(keys):
+                if index not in failed:
+                    del batch[key]
+        for key, (input_bytes, output_bytes, session_time, agency) in batch.items():
+            totals = self._buckets.setdefault(key, [0, 0, 0, agency])
+            totals[0] += input_bytes
+            totals[1] += output_bytes
+            totals[2] += session_time
+
+    def stats(self) -> Dict:
+        return {
+            **super().stats(),
+            "tracked_sessions": len(self._baselines),
+            "untracked": self.untracked
+        }
+
+# Shared rollup instance
+usage_rollups = UsageRollups()
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple, Union
+import asyncio
+import logging
+import os
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# A session with no accounting packet for this long is considered gone; keep
+# it comfortably above the NAS interim interval
+SESSION_STALE_AFTER = float(os.getenv("RADIUS_SESSION_STALE_AFTER", "900"))  # seconds
+SESSION_REAP_INTERVAL = float(os.getenv("RADIUS_SESSION_REAP_INTERVAL", "60"))  # seconds
+
+# Accounting-On/Off: the NAS (re)started, so none of its sessions survive
+NAS_RESET_STATUSES = ("Accounting-On", "Accounting-Off")
+
+def session_key(nas_ip_address: str, nas_identifier: str, session_id: str) -> str:
+    """Acct-Session-Id is only unique per NAS, so the NAS is part of the key"""
+    return f"{nas_ip_address or nas_identifier}:{session_id}"
+
+def session_operation(
+    accounting_data: Dict,
+    station: Optional[str] = None,
+    rates: Optional[Tuple[int, int]] = None
+) -> Union[UpdateOne, DeleteOne]:
+    """Registry write for one accounting packet.
+
+    Start and Interim-Update upsert the session, so a missed Start is
+    recovered by the next interim; Stop removes it. ``rates`` is the
+    (download, upload) bps since the previous packet, when known.
+    """
+    key = session_key(
+        accounting_data["nas_ip_address"],
+        accounting_data["nas_identifier"],
+        accounting_data["session_id"]
+    )
+    if accounting_data["status"] == "Stop":
+        return DeleteOne({"_id": key})
+    timestamp = accounting_data["timestamp"]
+    fields = {
+        "username": accounting_data["username"],
+        "customer_id": accounting_data["customer_id"],
+        "agency": accounting_data["agency"],
+        "station": station,
+        "package": accounting_data["package"],
+        "session_id": accounting_data["session_id"],
+        "nas_ip_address": accounting_data["nas_ip_address"],
+        "nas_identifier": accounting_data["nas_identifier"],
+        "nas_port": accounting_data["nas_port"],
+        "framed_ip_address": accounting_data["framed_ip_address"],
+        "calling_station_id": accounting_data["calling_station_id"],
+        "session_time": accounting_data["session_time"],
+        "total_input_bytes": accounting_data["total_input_bytes"],
+        "total_output_bytes": accounting_data["total_output_bytes"],
+        "last_update": timestamp
+    }
+    if rates is not None:
+        fields["download_bps"], fields["upload_bps"] = rates
+    return UpdateOne({"_id": key}, {
+        "$set": fields,
+        "$setOnInsert": {
+            "start_time": timestamp - timedelta(seconds=accounting_data["session_time"])
+        }
+    }, upsert=True)
+
+async def clear_nas_sessions(database, nas_ip_address: str, nas_identifier: str) -> int:
+    """Drop every session of a NAS that reported Accounting-On/Off"""
+    query = {"nas_ip_address": nas_ip_address} if nas_ip_address else {"nas_identifier": nas_identifier}
+    result = await database.get_collection("radius_sessions").delete_many(query)
+    return result.deleted_count
+
+class SessionReaper:
+    """Removes sessions whose accounting updates stopped arriving.
+
+    A NAS that loses power or its route to us never sends Stop, so without
+    this the registry would keep counting those subscribers as online.
+    """
+
+    def __init__(self, stale_after: float = SESSION_STALE_AFTER, interval: float = SESSION_REAP_INTERVAL):
+        self.stale_after = stale_after
+        self.interval = interval
+        self.reaped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, database) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(database))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def reap(self, database) -> int:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.stale_after)
+        result = await database.get_collection("radius_sessions").delete_many(
+            {"last_update": {"$lt": cutoff}}
+        )
+        if result.deleted_count:
+            self.reaped += result.deleted_count
+            logger.info(f"Reaped {result.deleted_count} stale RADIUS sessions")
+        return result.deleted_count
+
+    async def _run(self, database) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reap(database)
+            except PyMongoError as e:
+                logger.error(f"Session reaper failed: {str(e)}")
+
+    def stats(self) -> Dict:
+        return {"stale_after": self.stale_after, "reaped": self.reaped}
+
+# Shared reaper instance
+session_reaper = SessionReaper()
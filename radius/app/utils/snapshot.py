@@ -0,0 +1,259 @@
+"""Last-known-good customer snapshot on local disk.
+
+The file is rewritten atomically every RADIUS_SNAPSHOT_INTERVAL seconds and
+read through mmap, so lookups touch only the pages they need:
+
+    header   magic, version, slot count, record count, metadata offset,
+             metadata length, generated-at (epoch seconds)
+    slots    slot count x uint64 record offset (0 = empty), open addressing
+             on crc32(key), where key is ``agency NUL username``
+    names    slot count x uint64 record offset, open addressing on
+             crc32(username); the first record of each username, for
+             lookups no realm or NAS scoped to an agency
+    records  uint16 key length, uint32 value length, key, JSON customer
+    metadata JSON object: compiled package replies by package id under
+             "templates", the realm resolver mapping under "realms"
+"""
+from typing import Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from pymongo.errors import PyMongoError
+from .replies import package_replies
+from .subscribers import AUTHORIZE_PROJECTION, LOGIN_STATUSES
+from .realms import realm_resolver
+
+logger = logging.getLogger(__name__)
+
+RADIUS_SNAPSHOT_PATH = os.getenv("RADIUS_SNAPSHOT_PATH", "data/radius_snapshot.bin")
+RADIUS_SNAPSHOT_INTERVAL = float(os.getenv("RADIUS_SNAPSHOT_INTERVAL", "600"))  # seconds
+
+MAGIC = b"RSNP"
+VERSION = 3
+HEADER = struct.Struct("<4sIIIQQd")
+SLOT = struct.Struct("<Q")
+RECORD = struct.Struct("<HI")
+
+# (customer agency, username)
+SnapshotKey = Tuple[Optional[str], str]
+
+def _record_key(agency: Optional[str], username: str) -> bytes:
+    return f"{agency or ''}\0{username}".encode("utf-8")
+
+def _insert(slots, key: bytes, offset: int) -> None:
+    index = zlib.crc32(key) & (len(slots) - 1)
+    while slots[index]:
+        index = (index + 1) & (len(slots) - 1)
+    slots[index] = offset
+
+def _slot_count(records: int) -> int:
+    """Power of two keeping the table at most half full"""
+    slots = 16
+    while slots < records * 2:
+        slots *= 2
+    return slots
+
+def build_snapshot(
+    customers: Dict[SnapshotKey, Dict],
+    templates: Dict[str, Dict],
+    generated_at: float,
+    realms: Optional[Dict] = None
+) -> bytes:
+    slot_count = _slot_count(len(customers))
+    slots = [0] * slot_count
+    names = [0] * slot_count
+    seen = set()
+    records = bytearray()
+    base = HEADER.size + 2 * SLOT.size * slot_count
+    for (agency, username), customer in customers.items():
+        key = _record_key(agency, username)
+        value = json.dumps(customer, separators=(",", ":"), default=str).encode("utf-8")
+        offset = base + len(records)
+        _insert(slots, key, offset)
+        if username not in seen:
+            seen.add(username)
+            _insert(names, username.encode("utf-8"), offset)
+        records += RECORD.pack(len(key), len(value)) + key + value
+    metadata = json.dumps({"templates": templates, "realms": realms or {}}, separators=(",", ":")).encode("utf-8")
+    header = HEADER.pack(
+        MAGIC, VERSION, slot_count, len(customers),
+        base + len(records), len(metadata), generated_at
+    )
+    return b"".join((
+        header,
+        b"".join(SLOT.pack(slot) for slot in slots),
+        b"".join(SLOT.pack(slot) for slot in names),
+        bytes(records),
+        metadata
+    ))
+
+class Snapshot:
+    """Read-only view of one snapshot file"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.slot_count, self.records, metadata_offset, metadata_length, self.generated_at = (
+            HEADER.unpack_from(self._map, 0)
+        )
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {VERSION} RADIUS snapshot")
+        metadata = json.loads(self._map[metadata_offset:metadata_offset + metadata_length])
+        self.templates: Dict[str, Dict] = metadata["templates"]
+        self.realms: Dict[str, Dict[str, str]] = metadata["realms"]
+
+    def lookup(self, username: str, agency: Optional[str] = None) -> Optional[Dict]:
+        """Customer ``username`` of ``agency``, or the first customer with
+        that username when the request was not scoped to an agency"""
+        if agency is not None:
+            return self._probe(0, _record_key(agency, username), lambda key: key)
+        # Name slots point at records; compare the username part of their key
+        return self._probe(self.slot_count, username.encode("utf-8"), lambda key: key.split(b"\0", 1)[1])
+
+    def _probe(self, table: int, key: bytes, record_part) -> Optional[Dict]:
+        index = zlib.crc32(key) & (self.slot_count - 1)
+        for _ in range(self.slot_count):
+            (offset,) = SLOT.unpack_from(self._map, HEADER.size + SLOT.size * (table + index))
+            if not offset:
+                return None
+            key_length, value_length = RECORD.unpack_from(self._map, offset)
+            start = offset + RECORD.size
+            if record_part(self._map[start:start + key_length]) == key:
+                start += key_length
+                return json.loads(self._map[start:start + value_length])
+            index = (index + 1) & (self.slot_count - 1)
+        return None
+
+    def customers(self):
+        """Iterate over (username, customer) pairs"""
+        for index in range(self.slot_count):
+            (offset,) = SLOT.unpack_from(self._map, HEADER.size + SLOT.size * index)
+            if offset:
+                key_length, value_length = RECORD.unpack_from(self._map, offset)
+                start = offset + RECORD.size
+                username = self._map[start:start + key_length].split(b"\0", 1)[1].decode("utf-8")
+                yield username, json.loads(self._map[start + key_length:start + key_length + value_length])
+
+    def close(self) -> None:
+        self._map.close()
+
+class SnapshotStore:
+    """Keeps the snapshot file fresh and serves lookups from it.
+
+    Only customers allowed to log in are written, with the fields authorize
+    and auth read, the compiled reply of every package and the realm map. The file holds
+    credentials, so it is created readable by the service user only.
+    """
+
+    def __init__(self, path: str = RADIUS_SNAPSHOT_PATH, interval: float = RADIUS_SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.snapshot: Optional[Snapshot] = None
+        self.refreshes = 0
+        self.fallbacks = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.snapshot is not None
+
+    def age(self) -> Optional[float]:
+        return time.time() - self.snapshot.generated_at if self.snapshot else None
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        try:
+            snapshot = Snapshot(self.path)
+        except (OSError, ValueError, struct.error) as e:
+            logger.error(f"Ignoring unreadable snapshot {self.path}: {str(e)}")
+            return False
+        previous, self.snapshot = self.snapshot, snapshot
+        if previous is not None:
+            previous.close()
+        logger.info(f"Loaded snapshot of {snapshot.records} customers from {self.path}")
+        return True
+
+    def lookup(self, username: str, agency: Optional[str] = None) -> Optional[Dict]:
+        """Customer as of the last snapshot, with its package reply under ``template``"""
+        if self.snapshot is None:
+            return None
+        customer = self.snapshot.lookup(username, agency)
+        if customer is not None:
+            self.fallbacks += 1
+            customer["template"] = self.snapshot.templates.get(customer.get("package") or "")
+        return customer
+
+    async def refresh(self, database) -> None:
+        packages = {}
+        async for package in database.get_collection("packages").find({}):
+            packages[str(package["_id"])] = package_replies.get(package)
+        customers = {}
+        async for customer in database.get_collection("customers").find(
+            {"status": {"$in": list(LOGIN_STATUSES)}},
+            AUTHORIZE_PROJECTION
+        ):
+            customer["_id"] = str(customer["_id"])
+            # Usernames are only unique within an agency
+            customers[(customer.get("agency"), customer["username"])] = customer
+        # Encoding and fsync take a while for a large subscriber set, so they
+        # run off the event loop; authorize and accounting keep flowing
+        await asyncio.to_thread(self._write, customers, packages, time.time(), realm_resolver.mapping())
+        self.refreshes += 1
+        self.load()
+
+    def _write(self, customers: Dict, packages: Dict, generated_at: float, realms: Dict) -> None:
+        data = build_snapshot(customers, packages, generated_at, realms)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "wb") as handle:
+            handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, self.path)
+
+    def start(self, database, breaker) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(database, breaker))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, database, breaker) -> None:
+        # Refresh right away when there is no snapshot or it is already due
+        age = self.age()
+        delay = 0 if age is None else max(0.0, self.interval - age)
+        while True:
+            await asyncio.sleep(delay)
+            delay = self.interval
+            if not breaker.closed:
+                # Never replace the last good snapshot with a partial one
+                continue
+            try:
+                await self.refresh(database)
+            except (PyMongoError, OSError) as e:
+                logger.error(f"Snapshot refresh failed: {str(e)}")
+
+    def stats(self) -> Dict:
+        age = self.age()
+        return {
+            "customers": self.snapshot.records if self.snapshot else 0,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "refreshes": self.refreshes,
+            "fallbacks": self.fallbacks
+        }
+
+# Shared snapshot store
+snapshot_store = SnapshotStore()
@@ -0,0 +1,147 @@
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import json
+import logging
+import os
+from .circuit import DatabaseUnavailable
+
+logger = logging.getLogger(__name__)
+
+RADIUS_ACCOUNTING_SPOOL = os.getenv("RADIUS_ACCOUNTING_SPOOL", "data/accounting_spool.jsonl")
+RADIUS_SPOOL_REPLAY_INTERVAL = float(os.getenv("RADIUS_SPOOL_REPLAY_INTERVAL", "5"))  # seconds
+
+class AccountingSpool:
+    """Local append-only log of accounting packets taken while MongoDB is down.
+
+    Packets are acknowledged to the NAS once they are in the spool, with the
+    time they arrived, and replayed through the normal accounting path once
+    the database circuit breaker closes again. Replay works on a renamed copy
+    so packets spooled meanwhile are never lost or replayed twice.
+
+    Counters are cumulative, so packets must be counted in order: while
+    anything is pending, live packets are spooled behind it too, and the
+    spool is drained round after round until it is empty. Since live
+    packets then never touch the database, ``probe`` is called while the
+    spool waits so the breaker finds out the database is back.
+    """
+
+    def __init__(self, path: str = RADIUS_ACCOUNTING_SPOOL, interval: float = RADIUS_SPOOL_REPLAY_INTERVAL):
+        self.path = path
+        self.replaying_path = f"{path}.replaying"
+        self.interval = interval
+        self.spooled = 0
+        self.replayed = 0
+        # Replayed packets older than what was already counted
+        self.stale = 0
+        self._handle = None
+        self._task = None
+
+    def pending(self) -> bool:
+        return os.path.exists(self.path) or os.path.exists(self.replaying_path)
+
+    def append(self, body: Dict, received_at: datetime) -> None:
+        if self._handle is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._handle = open(self.path, "a", encoding="utf-8")
+        self._handle.write(json.dumps({"received_at": received_at.isoformat(), "body": body}, default=str) + "\n")
+        # Acknowledged packets must survive a process crash
+        self._handle.flush()
+        self.spooled += 1
+
+    def _close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    async def replay(self, handler: Callable[[Dict, datetime], Awaitable[int]], ready: Callable[[], bool]) -> int:
+        """Feed spooled packets to ``handler`` while ``ready()`` holds"""
+        if not os.path.exists(self.replaying_path):
+            if not os.path.exists(self.path):
+                return 0
+            self._close()
+            os.replace(self.path, self.replaying_path)
+
+        replayed = 0
+        remainder = None
+        with open(self.replaying_path, encoding="utf-8") as handle:
+            while True:
+                position = handle.tell()
+                line = handle.readline()
+                if not line:
+                    break
+                if not ready():
+                    remainder = position
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.error(f"Skipping corrupt spool line: {line[:200]!r}")
+                    continue
+                status = await handler(entry["body"], datetime.fromisoformat(entry["received_at"]))
+                if status >= 500:
+                    remainder = position
+                    break
+                replayed += 1
+            if remainder is not None:
+                # Keep what is left for the next attempt
+                handle.seek(remainder)
+                rest = handle.read()
+        if remainder is None:
+            os.remove(self.replaying_path)
+        else:
+            temporary = f"{self.replaying_path}.tmp"
+            with open(temporary, "w", encoding="utf-8") as handle:
+                handle.write(rest)
+            os.replace(temporary, self.replaying_path)
+
+        self.replayed += replayed
+        if replayed:
+            logger.info(f"Replayed {replayed} spooled accounting packets")
+        return replayed
+
+    def start(
+        self,
+        handler: Callable[[Dict, datetime], Awaitable[int]],
+        ready: Callable[[], bool],
+        probe: Optional[Callable[[], Awaitable]] = None
+    ) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(handler, ready, probe))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._close()
+
+    async def _run(self, handler, ready, probe=None) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if probe is not None and not ready() and self.pending():
+                    try:
+                        await probe()
+                    except DatabaseUnavailable:
+                        continue
+                # Live packets queue up behind the replay; keep going until
+                # a round finds nothing new so they are not held back
+                while ready() and self.pending():
+                    if not await self.replay(handler, ready):
+                        break
+            except Exception as e:
+                logger.error(f"Accounting spool replay failed: {str(e)}")
+
+    def stats(self) -> Dict:
+        return {
+            "pending": self.pending(),
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "stale": self.stale
+        }
+
+# Shared spool instance
+accounting_spool = AccountingSpool()
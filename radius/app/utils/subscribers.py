@@ -0,0 +1,67 @@
+from typing import Dict, Optional
+from .replies import PACKAGE_REPLY_FIELDS
+
+# Customer fields each hot path actually reads
+AUTHORIZE_PROJECTION = {
+    "_id": 1, "username": 1, "password": 1, "status": 1,
+    "expiry": 1, "expiry_epoch": 1, "package": 1, "agency": 1
+}
+AUTHENTICATE_PROJECTION = {"_id": 1, "password": 1, "expiry": 1, "expiry_epoch": 1}
+ACCOUNTING_PROJECTION = {"_id": 1, "agency": 1, "package": 1, "station": 1}
+
+# Administrative statuses that may log in. Older releases overwrote "active"
+# with "online"/"offline" on every login and logout; those still count.
+LOGIN_STATUSES = {"active", "online", "offline"}
+
+def subscriber_query(username: str, agency: Optional[str] = None) -> Dict:
+    """Scoped lookups match the (agency, username) index; others fall back to username"""
+    if agency is None:
+        return {"username": username}
+    return {"agency": agency, "username": username}
+
+def _authorize_pipeline(username: str, agency: Optional[str] = None) -> list:
+    package_projection = {
+        f"package_doc.{field}": 1 for field in (*PACKAGE_REPLY_FIELDS, "_id", "updated_at")
+    }
+    return [
+        {"$match": subscriber_query(username, agency)},
+        {"$limit": 1},
+        # customers.package is stored as a string id; convert it so the
+        # lookup can use the _id index on packages
+        {"$addFields": {
+            "package_oid": {
+                "$convert": {"input": "$package", "to": "objectId", "onError": None, "onNull": None}
+            }
+        }},
+        {"$lookup": {
+            "from": "packages",
+            "localField": "package_oid",
+            "foreignField": "_id",
+            "as": "package_doc"
+        }},
+        {"$project": {**AUTHORIZE_PROJECTION, **package_projection}}
+    ]
+
+async def resolve_subscriber(database, username: str, agency: Optional[str] = None) -> Optional[Dict]:
+    """Fetch a customer and its package in a single round trip.
+
+    Returns the customer fields in ``AUTHORIZE_PROJECTION`` with the package
+    document (or ``None``) under ``package_doc``.
+    """
+    documents = await database.get_collection("customers").aggregate(
+        _authorize_pipeline(username, agency)
+    ).to_list(1)
+    if not documents:
+        return None
+    customer = documents[0]
+    packages = customer.get("package_doc") or []
+    customer["package_doc"] = packages[0] if packages else None
+    return customer
+
+async def find_subscriber(
+    database, username: str, projection: Dict, agency: Optional[str] = None
+) -> Optional[Dict]:
+    """Fetch only the customer fields a hot path needs"""
+    return await database.get_collection("customers").find_one(
+        subscriber_query(username, agency), projection
+    )
@@ -0,0 +1,106 @@
+"""Minimal asyncio HTTP and RADIUS clients for the benchmarks.
+
+Kept dependency free so the benchmarks run with the service requirements.
+"""
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import json
+from app.radius_server.packet import encode_request, verify_reply
+
+class HttpClient:
+    """One keep-alive HTTP/1.1 connection posting JSON"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def post(self, path: str, body: Dict) -> Tuple[int, bytes]:
+        payload = json.dumps(body).encode("utf-8")
+        self._writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode("ascii")
+            + payload
+        )
+        status_line = await self._reader.readline()
+        status = int(status_line.split()[1])
+        length = 0
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value.strip())
+        content = await self._reader.readexactly(length) if length else b""
+        return status, content
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+class _RadiusClientProtocol(asyncio.DatagramProtocol):
+    def __init__(self, client: "RadiusClient"):
+        self.client = client
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        future = self.client._pending.pop(data[1], None) if len(data) >= 20 else None
+        if future is not None and not future.done():
+            future.set_result(data)
+
+class RadiusClient:
+    """UDP client with up to 256 outstanding requests (one per identifier)"""
+
+    def __init__(self, host: str, secret: bytes, timeout: float = 3.0):
+        self.host = host
+        self.secret = secret
+        self.timeout = timeout
+        self._transport = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._free: asyncio.Queue = asyncio.Queue()
+        for identifier in range(256):
+            self._free.put_nowait(identifier)
+
+    async def connect(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _RadiusClientProtocol(self),
+            local_addr=("0.0.0.0", 0)
+        )
+
+    async def request(
+        self,
+        port: int,
+        code: int,
+        attributes: List[Tuple[str, str]],
+        password: Optional[str] = None
+    ) -> Optional[bytes]:
+        """Send one request and return the verified reply, or None on timeout"""
+        identifier = await self._free.get()
+        try:
+            packet = encode_request(code, identifier, attributes, self.secret, password)
+            future = asyncio.get_running_loop().create_future()
+            self._pending[identifier] = future
+            self._transport.sendto(packet, (self.host, port))
+            try:
+                reply = await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                return None
+            if not verify_reply(reply, packet[4:20], self.secret):
+                raise ValueError("reply failed authenticator check")
+            return reply
+        finally:
+            self._pending.pop(identifier, None)
+            self._free.put_nowait(identifier)
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+
+def reply_code(reply: Optional[bytes]) -> Optional[int]:
+    return reply[0] if reply else None
@@ -0,0 +1,96 @@
+"""Time to push a package speed change to every online subscriber on it.
+
+Seeds the bench database, registers one live session per customer spread
+over several fake NAS devices on loopback addresses, then changes a
+package and times the CoA fan-out. ``sequential`` sends one request at a
+time, which is what a naive loop over the sessions costs; ``batched`` uses
+the dispatcher's defaults. ``--drop`` makes the fake NAS devices lose a
+share of requests so retransmissions show up in the numbers.
+
+    python -m benchmarks.coa_bench --customers 20000 --nas 8 --delay 0.005
+"""
+from datetime import datetime, timezone
+from motor.motor_asyncio import AsyncIOMotorClient
+import argparse
+import asyncio
+import time
+from app.radius_server.coa import CoaClient, CoaDispatcher, RADIUS_COA_BATCH_SIZE
+from app.radius_server.server import ClientTable
+from .fake_nas import start_fake_nas
+from .seed import seed_subscribers
+
+SECRET = "testing123"
+
+async def seed_sessions(database, nas_addresses):
+    """One session per customer, round-robin over the NAS addresses"""
+    await database.radius_sessions.delete_many({})
+    now = datetime.now(timezone.utc)
+    sessions = []
+    async for customer in database.customers.find({}, {"username": 1, "package": 1}):
+        nas = nas_addresses[len(sessions) % len(nas_addresses)]
+        sessions.append({
+            "_id": f"{nas}:{customer['username']}",
+            "session_id": customer["username"],
+            "username": customer["username"],
+            "customer_id": str(customer["_id"]),
+            "package": customer["package"],
+            "nas_ip_address": nas,
+            "framed_ip_address": "",
+            "last_update": now
+        })
+    if sessions:
+        await database.radius_sessions.insert_many(sessions)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongodb-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="radius_bench")
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--packages", type=int, default=4)
+    parser.add_argument("--nas", type=int, default=8, help="fake NAS devices on 127.0.0.2 upwards")
+    parser.add_argument("--port", type=int, default=13799)
+    parser.add_argument("--delay", type=float, default=0.005, help="NAS processing time per request")
+    parser.add_argument("--drop", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongodb_url)
+    database = client[args.database]
+    await seed_subscribers(database, customers=args.customers, packages=args.packages)
+    addresses = [f"127.0.0.{index + 2}" for index in range(args.nas)]
+    await seed_sessions(database, addresses)
+    devices = [
+        await start_fake_nas(address, args.port, SECRET.encode("utf-8"), drop=args.drop, delay=args.delay)
+        for address in addresses
+    ]
+    package = await database.packages.find_one({})
+    package_id = str(package["_id"])
+    online = await database.radius_sessions.count_documents({"package": package_id})
+    clients = ClientTable(",".join(f"{address}={SECRET}" for address in addresses))
+
+    for label, concurrency, nas_concurrency, batch_size in (
+        ("sequential", 1, 1, 1),
+        ("batched", 256, 32, RADIUS_COA_BATCH_SIZE),
+    ):
+        coa = CoaClient(
+            clients, port=args.port, timeout=args.timeout,
+            concurrency=concurrency, nas_concurrency=nas_concurrency
+        )
+        dispatcher = CoaDispatcher(coa, batch_size=batch_size, sweep_interval=0)
+        await database.packages.update_one({"_id": package["_id"]}, {"$inc": {"download_speed": 1}})
+        start = time.perf_counter()
+        acknowledged, total = await dispatcher.apply_package(database, package_id)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:>10}: {total} sessions ({online} online) in {elapsed:.2f}s "
+            f"({total / elapsed:.0f}/s), {acknowledged} acked, "
+            f"{coa.counters['retransmits']} retransmits, {coa.counters['timeouts']} timeouts"
+        )
+        coa.close()
+
+    for device in devices:
+        device.transport.close()
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
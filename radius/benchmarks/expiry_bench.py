@@ -0,0 +1,33 @@
+"""Microbenchmark: per-request expiry parsing vs the precomputed epoch.
+
+Run from the radius directory:
+
+    python -m benchmarks.expiry_bench
+"""
+from datetime import datetime, timedelta
+import timeit
+from app.utils.handlers import convert_to_timezone, get_current_time, expiry_epoch, is_expired
+
+EXPIRY = datetime.utcnow() + timedelta(days=30)
+CUSTOMERS = {
+    "datetime": {"expiry": EXPIRY},
+    "iso string": {"expiry": EXPIRY.isoformat() + "Z"},
+    "backfilled": {"expiry": EXPIRY, "expiry_epoch": expiry_epoch({"expiry": EXPIRY})},
+}
+
+def converted_check(customer) -> bool:
+    """The check authorize and auth ran before expiry_epoch existed"""
+    return bool(customer.get("expiry")) and get_current_time() > convert_to_timezone(customer["expiry"])
+
+def epoch_check(customer) -> bool:
+    return is_expired(expiry_epoch(customer))
+
+def main(number: int = 100000):
+    for name, customer in CUSTOMERS.items():
+        assert converted_check(customer) == epoch_check(customer)
+        for label, fn in (("converted", converted_check), ("epoch", epoch_check)):
+            best = min(timeit.repeat(lambda: fn(customer), number=number, repeat=5))
+            print(f"{name:>10} {label:>9}: {best / number * 1e9:8.0f} ns/check")
+
+if __name__ == "__main__":
+    main()
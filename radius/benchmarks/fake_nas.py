@@ -0,0 +1,101 @@
+"""Stand-in NAS answering CoA-Request and Disconnect-Request (RFC 5176).
+
+Acknowledges requests for sessions it knows about and NAKs the rest with
+Error-Cause Session-Context-Not-Found. ``drop`` discards a share of requests
+so the client's retransmission path gets exercised, and ``delay`` adds
+processing latency. Every loopback address works on Linux, so several
+instances on 127.0.0.1, 127.0.0.2, ... look like separate NAS devices.
+
+    python -m benchmarks.fake_nas --address 127.0.0.2 --port 3799 --secret testing123
+"""
+from typing import Dict, List, Optional, Set
+import argparse
+import asyncio
+import random
+from app.radius_server.packet import (
+    COA_REQUEST, COA_ACK, COA_NAK, DISCONNECT_REQUEST, DISCONNECT_ACK, DISCONNECT_NAK,
+    Packet, PacketError, decode_packet, encode_attribute, encode_reply, verify_accounting_request
+)
+
+class FakeNas(asyncio.DatagramProtocol):
+    def __init__(self, secret: bytes, sessions: Optional[Set[str]] = None, drop: float = 0.0, delay: float = 0.0):
+        self.secret = secret
+        # Acct-Session-Ids considered live; None accepts any session
+        self.sessions = sessions
+        self.drop = drop
+        self.delay = delay
+        self.transport = None
+        self.received: List[Packet] = []
+        self.rate_limits: Dict[str, str] = {}
+        self.counters = {"coa": 0, "disconnect": 0, "nak": 0, "dropped": 0, "bad": 0}
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            packet = decode_packet(data)
+        except PacketError:
+            self.counters["bad"] += 1
+            return
+        # CoA and Disconnect requests are signed like Accounting-Requests
+        if packet.code not in (COA_REQUEST, DISCONNECT_REQUEST) or not verify_accounting_request(packet, self.secret):
+            self.counters["bad"] += 1
+            return
+        if random.random() < self.drop:
+            self.counters["dropped"] += 1
+            return
+        self.received.append(packet)
+        if self.delay:
+            asyncio.get_running_loop().call_later(self.delay, self._answer, packet, addr)
+        else:
+            self._answer(packet, addr)
+
+    def _answer(self, packet: Packet, addr) -> None:
+        session_id = packet.value("Acct-Session-Id")
+        known = self.sessions is None or session_id in self.sessions
+        if packet.code == COA_REQUEST:
+            code = COA_ACK if known else COA_NAK
+            if known:
+                self.counters["coa"] += 1
+                self.rate_limits[session_id] = packet.value("Mikrotik-Rate-Limit")
+        else:
+            code = DISCONNECT_ACK if known else DISCONNECT_NAK
+            if known:
+                self.counters["disconnect"] += 1
+                if self.sessions is not None:
+                    self.sessions.discard(session_id)
+        attributes = b""
+        if not known:
+            self.counters["nak"] += 1
+            attributes = encode_attribute("Error-Cause", "Session-Context-Not-Found")
+        self.transport.sendto(encode_reply(code, packet, self.secret, attributes, message_authenticator=False), addr)
+
+async def start_fake_nas(address: str, port: int, secret: bytes, **options) -> FakeNas:
+    loop = asyncio.get_running_loop()
+    _, nas = await loop.create_datagram_endpoint(
+        lambda: FakeNas(secret, **options),
+        local_addr=(address, port)
+    )
+    return nas
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3799)
+    parser.add_argument("--secret", default="testing123")
+    parser.add_argument("--drop", type=float, default=0.0)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    nas = await start_fake_nas(args.address, args.port, args.secret.encode("utf-8"), drop=args.drop, delay=args.delay)
+    print(f"Fake NAS listening on {args.address}:{args.port}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(nas.counters)
+    finally:
+        nas.transport.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
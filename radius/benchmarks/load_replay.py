@@ -0,0 +1,257 @@
+"""Replay FreeRADIUS rest-module traffic against the radius service.
+
+Request bodies are rendered from the ``data`` templates in
+freeradius/mods-available/rest, so the service sees exactly what rlm_rest
+would send. Two scenarios:
+
+* ``storm``: a NAS reboot. Every subscriber on it logs in within
+  ``--storm-window`` seconds (authorize, auth, accounting Start, post-auth).
+* ``steady``: open-loop Interim-Update traffic at ``--rate`` packets per
+  second for ``--duration`` seconds.
+
+Runs fully locally. With ``--spawn`` the service is started against the bench
+database; otherwise point ``--http`` at a running instance that uses it.
+
+    python -m benchmarks.load_replay --spawn --customers 20000 storm
+    python -m benchmarks.load_replay --spawn --rate 2000 --duration 30 steady
+"""
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+from .client import HttpClient
+from .seed import seed_subscribers, percentile
+from .udp_bench import password_for
+
+REST_CONFIG = Path(__file__).resolve().parent.parent / "freeradius" / "mods-available" / "rest"
+SECTIONS = ("authorize", "authenticate", "accounting", "post-auth")
+
+def load_templates(path: Path = REST_CONFIG) -> Dict[str, Dict[str, str]]:
+    """Section name -> {"path": URI path, "data": JSON template} from the rest config"""
+    text = path.read_text()
+    templates = {}
+    for section in SECTIONS:
+        block = re.search(r"^\s*" + re.escape(section) + r"\s*\{(.*?)^\s*\}", text, re.S | re.M)
+        if not block:
+            continue
+        uri = re.search(r'uri\s*=\s*"\$\{\.\.connect_uri\}(/[^"]*)"', block.group(1))
+        data = re.search(r'data\s*=\s*"((?:[^"\\]|\\.)*)"', block.group(1))
+        if uri and data:
+            templates[section] = {
+                "path": "/radius" + uri.group(1),
+                "data": data.group(1).replace('\\"', '"')
+            }
+    return templates
+
+def render(template: str, attributes: Dict[str, str]) -> Dict:
+    """Expand %{Attr} like FreeRADIUS does; unknown attributes become empty"""
+    return json.loads(re.sub(
+        r"%\{([^}]+)\}",
+        lambda match: json.dumps(str(attributes.get(match.group(1), "")))[1:-1],
+        template
+    ))
+
+def subscriber_attributes(username: str, index: int, nas_ip: str) -> Dict[str, str]:
+    return {
+        "User-Name": username,
+        "User-Password": password_for(username),
+        "NAS-IP-Address": nas_ip,
+        "NAS-Identifier": "bench-nas",
+        "NAS-Port": str(index),
+        "NAS-Port-Id": f"ether{index % 24 + 1}",
+        "NAS-Port-Type": "Ethernet",
+        "Service-Type": "Framed-User",
+        "Framed-Protocol": "PPP",
+        "Called-Station-Id": "pppoe-service",
+        "Calling-Station-Id": f"02:00:{index >> 24 & 255:02X}:{index >> 16 & 255:02X}:{index >> 8 & 255:02X}:{index & 255:02X}",
+        "Framed-IP-Address": f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}",
+        "Acct-Session-Id": f"{index:08X}",
+        "reply:Packet-Type": "Access-Accept",
+    }
+
+class ConnectionPool:
+    """Keep-alive connections shared by concurrent replay tasks"""
+
+    def __init__(self, host: str, port: int, size: int):
+        self._clients = [HttpClient(host, port) for _ in range(size)]
+        self._idle: asyncio.Queue = asyncio.Queue()
+
+    async def open(self) -> None:
+        await asyncio.gather(*(client.connect() for client in self._clients))
+        for client in self._clients:
+            self._idle.put_nowait(client)
+
+    async def post(self, path: str, body: Dict) -> int:
+        client = await self._idle.get()
+        try:
+            status, _ = await client.post(path, body)
+            return status
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # Replace a connection the server closed on us
+            client = HttpClient(client.host, client.port)
+            await client.connect()
+            return 0
+        finally:
+            self._idle.put_nowait(client)
+
+    async def close(self) -> None:
+        await asyncio.gather(*(client.close() for client in self._clients), return_exceptions=True)
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, pool: ConnectionPool, section: str, templates: Dict, attributes: Dict) -> int:
+        template = templates[section]
+        start = time.perf_counter()
+        status = await pool.post(template["path"], render(template["data"], attributes))
+        self.samples[section].append((time.perf_counter() - start) * 1000)
+        self.statuses[section][status] += 1
+        return status
+
+    def report(self, elapsed: float) -> None:
+        total = sum(len(samples) for samples in self.samples.values())
+        print(f"{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+        for section, samples in self.samples.items():
+            statuses = ", ".join(f"{status}: {count}" for status, count in sorted(self.statuses[section].items()))
+            print(
+                f"{section:>13}: {len(samples) / elapsed:8.0f} req/s  "
+                f"p50 {percentile(samples, 50):7.2f} ms  p99 {percentile(samples, 99):7.2f} ms  "
+                f"[{statuses}]"
+            )
+
+async def storm(pool, templates, usernames, args) -> Recorder:
+    recorder = Recorder()
+
+    async def login(index: int, username: str):
+        await asyncio.sleep(random.uniform(0, args.storm_window))
+        attributes = subscriber_attributes(username, index, args.nas_ip)
+        if await recorder.call(pool, "authorize", templates, attributes) != 200:
+            return
+        if not args.local_auth:
+            if await recorder.call(pool, "authenticate", templates, attributes) != 204:
+                return
+        await recorder.call(pool, "post-auth", templates, attributes)
+        await recorder.call(pool, "accounting", templates, {
+            **attributes, "Acct-Status-Type": "Start", "Acct-Session-Time": "0"
+        })
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login(index, username) for index, username in enumerate(usernames)))
+    recorder.report(time.perf_counter() - start)
+    return recorder
+
+async def steady(pool, templates, usernames, args) -> Recorder:
+    recorder = Recorder()
+    tasks = set()
+    session_time = defaultdict(int)
+
+    async def interim(index: int, username: str):
+        session_time[index] += args.interim_interval
+        elapsed = session_time[index]
+        await recorder.call(pool, "accounting", templates, {
+            **subscriber_attributes(username, index, args.nas_ip),
+            "Acct-Status-Type": "Interim-Update",
+            "Acct-Session-Time": str(elapsed),
+            "Acct-Input-Octets": str(elapsed * 12_500 % 2**32),
+            "Acct-Output-Octets": str(elapsed * 125_000 % 2**32),
+            "Acct-Input-Packets": str(elapsed * 20),
+            "Acct-Output-Packets": str(elapsed * 90),
+            "Acct-Output-Gigawords": str(elapsed * 125_000 // 2**32),
+        })
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    # Open loop: arrivals follow a Poisson process regardless of response times
+    next_arrival = start
+    while next_arrival < deadline:
+        # Schedule against absolute time so sleep overhead does not lower the rate
+        next_arrival += random.expovariate(args.rate)
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        index = random.randrange(len(usernames))
+        task = asyncio.create_task(interim(index, usernames[index]))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+    recorder.report(time.perf_counter() - start)
+    return recorder
+
+async def spawn_service(args) -> asyncio.subprocess.Process:
+    host, port = args.http.split(":")
+    env = {
+        **os.environ,
+        "MONGODB_URL": args.mongodb_url,
+        "DATABASE_NAME": args.database,
+        "RADIUS_AUTH_MODE": "local" if args.local_auth else "rest",
+    }
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", host, "--port", port, "--log-level", "warning",
+        cwd=str(REST_CONFIG.parent.parent.parent), env=env
+    )
+    # Wait for the service to accept connections
+    for _ in range(100):
+        try:
+            client = HttpClient(host, int(port))
+            await client.connect()
+            await client.close()
+            return process
+        except OSError:
+            await asyncio.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("radius service did not start")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=("storm", "steady"))
+    parser.add_argument("--mongodb-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="radius_bench")
+    parser.add_argument("--http", default="127.0.0.1:9000")
+    parser.add_argument("--spawn", action="store_true", help="start the service for the run")
+    parser.add_argument("--local-auth", action="store_true", help="skip /radius/auth (RADIUS_AUTH_MODE=local)")
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--connections", type=int, default=64, help="rlm_rest pool size")
+    parser.add_argument("--nas-ip", default="10.0.0.1")
+    parser.add_argument("--storm-window", type=float, default=1.0, help="seconds over which logins arrive")
+    parser.add_argument("--rate", type=float, default=1000.0, help="interim updates per second")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--interim-interval", type=int, default=300, help="NAS interim interval in seconds")
+    parser.add_argument("--no-seed", action="store_true", help="reuse the existing bench database")
+    args = parser.parse_args()
+
+    templates = load_templates()
+    if args.no_seed:
+        client = AsyncIOMotorClient(args.mongodb_url)
+        usernames = await client[args.database].customers.distinct("username")
+        client.close()
+    else:
+        client = AsyncIOMotorClient(args.mongodb_url)
+        usernames = await seed_subscribers(client[args.database], customers=args.customers)
+        client.close()
+
+    process: Optional[asyncio.subprocess.Process] = await spawn_service(args) if args.spawn else None
+    host, port = args.http.split(":")
+    pool = ConnectionPool(host, int(port), args.connections)
+    try:
+        await pool.open()
+        if args.scenario == "storm":
+            await storm(pool, templates, usernames, args)
+        else:
+            await steady(pool, templates, usernames, args)
+    finally:
+        await pool.close()
+        if process is not None:
+            process.terminate()
+            await process.wait()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""Accounting throughput with logging off, synchronous and queued.
+
+Calls process_accounting in-process against the bench database with the
+root logger at DEBUG, so every per-packet line is produced:
+
+* ``off``: logging disabled; the floor.
+* ``sync``: a plain StreamHandler on the root logger and every payload
+  logged, which is what each packet used to cost.
+* ``queued``: the log pipeline with its default payload sample and rate
+  limit.
+
+Log output goes to ``--output`` (default /dev/null) so terminal speed does
+not skew the numbers.
+
+    python -m benchmarks.logging_bench --customers 20000 --requests 50000
+"""
+from motor.motor_asyncio import AsyncIOMotorClient
+import argparse
+import asyncio
+import logging
+import os
+from app.config.database import Database
+from app.utils import log_pipeline as pipeline
+from app.utils.accounting import accounting_buffer
+from app.utils.handlers import process_accounting
+from .seed import seed_subscribers
+from .udp_bench import run, accounting_body
+
+def configure(mode: str, output) -> None:
+    root = logging.getLogger()
+    pipeline.log_pipeline.stop()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    logging.disable(logging.CRITICAL if mode == "off" else logging.NOTSET)
+    if mode == "sync":
+        handler = logging.StreamHandler(output)
+        handler.setFormatter(logging.Formatter(pipeline.TEXT_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)
+    elif mode == "queued":
+        pipeline.log_pipeline.start(level="DEBUG", stream=output)
+    # The sync run logs every payload, like the old INFO json.dumps lines
+    pipeline.log_pipeline.sample = 1.0 if mode == "sync" else pipeline.RADIUS_LOG_PAYLOAD_SAMPLE
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongodb-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="radius_bench")
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--output", default=os.devnull)
+    args = parser.parse_args()
+
+    # The write-behind buffer writes through the shared client
+    os.environ["DATABASE_NAME"] = args.database
+    client = Database.client = AsyncIOMotorClient(args.mongodb_url)
+    database = client[args.database]
+    usernames = await seed_subscribers(database, customers=args.customers)
+    accounting_buffer.start()
+
+    async def account(index: int, username: str) -> bool:
+        body = accounting_body(username)
+        # Route-level payload logging, then the handler itself
+        pipeline.log_pipeline.payload(logging.getLogger("radius_routes"), "accounting", body)
+        return await process_accounting(database, body) == 204
+
+    with open(args.output, "w") as output:
+        for mode in ("off", "sync", "queued"):
+            configure(mode, output)
+            await run(mode, account, usernames, args.requests, args.concurrency)
+            await accounting_buffer.flush()
+        configure("off", output)
+        logging.disable(logging.NOTSET)
+
+    await accounting_buffer.drain()
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
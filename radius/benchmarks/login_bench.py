@@ -0,0 +1,65 @@
+"""Logins per second with each RADIUS_AUTH_MODE.
+
+"rest" makes FreeRADIUS call /radius/authorize and then /radius/auth for every
+login. "local" only calls /radius/authorize and checks the password inside
+FreeRADIUS, so a login costs one HTTP call. Run the service against the bench
+database first:
+
+    DATABASE_NAME=radius_bench RADIUS_AUTH_MODE=local python run.py
+    python -m benchmarks.login_bench --customers 20000 --requests 20000
+
+Both runs hit a warm authorize cache, so the difference is the /radius/auth
+round trip and its customer read and status write.
+"""
+from motor.motor_asyncio import AsyncIOMotorClient
+import argparse
+import asyncio
+import json
+from .client import HttpClient
+from .seed import seed_subscribers
+from .udp_bench import run, password_for
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongodb-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="radius_bench")
+    parser.add_argument("--http", default="127.0.0.1:9000")
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongodb_url)
+    usernames = await seed_subscribers(client[args.database], customers=args.customers)
+    client.close()
+
+    host, port = args.http.split(":")
+    connections = [HttpClient(host, int(port)) for _ in range(args.concurrency)]
+    await asyncio.gather(*(connection.connect() for connection in connections))
+
+    async def rest_login(index: int, username: str) -> bool:
+        connection = connections[index]
+        status, _ = await connection.post("/radius/authorize", {"username": username})
+        if status != 200:
+            return False
+        status, _ = await connection.post(
+            "/radius/auth", {"username": username, "password": password_for(username)}
+        )
+        return status == 204
+
+    async def local_login(index: int, username: str) -> bool:
+        status, content = await connections[index].post("/radius/authorize", {"username": username})
+        if status != 200:
+            return False
+        # FreeRADIUS would compare against this credential in-process
+        reply = json.loads(content)
+        return reply.get("control:Cleartext-Password", {}).get("value") == [password_for(username)]
+
+    await run("warmup", local_login, usernames, min(args.requests, 2000), args.concurrency)
+    await run("rest mode", rest_login, usernames, args.requests, args.concurrency)
+    await run("local mode", local_login, usernames, args.requests, args.concurrency)
+
+    await asyncio.gather(*(connection.close() for connection in connections))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+"""Microbenchmark: per-request reply building vs compiled package templates.
+
+Run from the radius directory:
+
+    python -m benchmarks.reply_bench
+"""
+from datetime import datetime
+from bson import ObjectId
+import timeit
+from app.models.radius_models import RadiusProfile
+from app.utils.replies import format_radius_response, package_replies, build_authorize_reply
+
+PACKAGE = {
+    "_id": ObjectId(),
+    "name": "Home 20M",
+    "download_speed": 20,
+    "upload_speed": 10,
+    "burst_download": 25,
+    "burst_upload": 12,
+    "threshold_download": 18,
+    "threshold_upload": 8,
+    "burst_time": 10,
+    "service_type": "pppoe",
+    "address_pool": "pppoe-pool",
+    "session_timeout": 86400,
+    "idle_timeout": 600,
+    "priority": 5,
+    "vlan_id": 120,
+    "updated_at": datetime.utcnow()
+}
+PASSWORD = "s3cret"
+
+def per_request_reply():
+    """The reply path radius_authorize used before templates were compiled"""
+    reply = {"Cleartext-Password": PASSWORD}
+    profile = RadiusProfile.from_package(PACKAGE)
+    reply["Mikrotik-Rate-Limit"] = profile.get_rate_limit()
+    for attr in profile.to_radius_attributes():
+        if attr.name not in reply:
+            reply[attr.name] = attr.value
+    return format_radius_response(reply)
+
+def compiled_reply():
+    return build_authorize_reply(PASSWORD, package_replies.get(PACKAGE))
+
+def main(number: int = 20000):
+    assert per_request_reply() == compiled_reply()
+    for label, fn in (("per-request", per_request_reply), ("compiled", compiled_reply)):
+        best = min(timeit.repeat(fn, number=number, repeat=5))
+        print(f"{label:>12}: {best / number * 1e6:8.2f} us/reply  ({number / best:,.0f} replies/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Per-request latency of customer+package resolution for radius_authorize.
+
+Compares the original two sequential queries with the single $lookup round
+trip. Needs a local mongod; the target database is wiped and re-seeded.
+
+    python -m benchmarks.resolver_bench --mongodb-url mongodb://localhost:27017 \
+        --database radius_bench --customers 20000 --requests 5000
+"""
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+import argparse
+import asyncio
+import random
+import time
+from app.utils.subscribers import resolve_subscriber
+from .seed import seed_subscribers, percentile
+
+async def two_queries(database, username: str):
+    customer = await database.customers.find_one({"username": username})
+    if customer and customer.get("package"):
+        await database.packages.find_one({"_id": ObjectId(customer["package"])})
+    return customer
+
+async def measure(label: str, fn, database, usernames, requests: int):
+    samples = []
+    for username in random.choices(usernames, k=requests):
+        start = time.perf_counter()
+        await fn(database, username)
+        samples.append((time.perf_counter() - start) * 1000)
+    print(
+        f"{label:>12}: p50 {percentile(samples, 50):6.3f} ms  "
+        f"p99 {percentile(samples, 99):6.3f} ms  "
+        f"mean {sum(samples) / len(samples):6.3f} ms"
+    )
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongodb-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="radius_bench")
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongodb_url)
+    database = client[args.database]
+    usernames = await seed_subscribers(database, customers=args.customers)
+
+    # Warm up connections and the working set before measuring
+    await measure("warmup", two_queries, database, usernames, 500)
+    await measure("two queries", two_queries, database, usernames, args.requests)
+    await measure("$lookup", resolve_subscriber, database, usernames, args.requests)
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
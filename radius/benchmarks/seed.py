@@ -0,0 +1,84 @@
+"""Synthetic subscriber base for the radius benchmarks."""
+from datetime import datetime, timedelta, timezone
+from typing import List
+import random
+
+def subscriber_username(index: int) -> str:
+    return f"bench{index:07d}"
+
+async def seed_subscribers(
+    database,
+    customers: int = 10000,
+    packages: int = 20,
+    agencies: int = 5,
+    batch_size: int = 5000
+) -> List[str]:
+    """Replace customers/packages in ``database`` with a synthetic base.
+
+    Returns the generated usernames. Every customer is active with an expiry
+    30 days out so the authorize path runs to completion.
+    """
+    now = datetime.utcnow()
+    expiry = now + timedelta(days=30)
+    agency_ids = [f"agency{index}" for index in range(agencies)]
+
+    await database.packages.delete_many({})
+    await database.customers.delete_many({})
+
+    package_docs = []
+    for index in range(packages):
+        speed = random.choice([5, 10, 20, 50, 100])
+        package_docs.append({
+            "name": f"Bench {speed}M #{index}",
+            "price": speed * 100,
+            "download_speed": speed,
+            "upload_speed": speed / 2,
+            "burst_download": speed * 1.5,
+            "burst_upload": speed * 0.75,
+            "burst_time": 10,
+            "service_type": "pppoe",
+            "address_pool": "pppoe-pool",
+            "idle_timeout": 600,
+            "priority": 8,
+            "agency": agency_ids[index % agencies],
+            "created_at": now,
+            "updated_at": now
+        })
+    result = await database.packages.insert_many(package_docs)
+    package_ids = [str(package_id) for package_id in result.inserted_ids]
+
+    usernames = []
+    batch = []
+    for index in range(customers):
+        username = subscriber_username(index)
+        usernames.append(username)
+        batch.append({
+            "name": f"Bench Customer {index}",
+            "email": f"{username}@example.com",
+            "phone": f"07{index:08d}",
+            "username": username,
+            "password": f"pw{index}",
+            "agency": agency_ids[index % agencies],
+            "package": package_ids[index % packages],
+            "station": None,
+            "status": "active",
+            "expiry": expiry,
+            "expiry_epoch": int(expiry.replace(tzinfo=timezone.utc).timestamp()),
+            "created_at": now,
+            "updated_at": now
+        })
+        if len(batch) >= batch_size:
+            await database.customers.insert_many(batch)
+            batch = []
+    if batch:
+        await database.customers.insert_many(batch)
+
+    await database.customers.create_index("username")
+    return usernames
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
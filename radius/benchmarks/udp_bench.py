@@ -0,0 +1,137 @@
+"""Packets per second through the native UDP server versus the REST path.
+
+The REST numbers cover only the HTTP leg FreeRADIUS would make (authorize +
+auth per login), so they flatter the REST path slightly. Start the service
+against the bench database with the UDP listener enabled:
+
+    DATABASE_NAME=radius_bench RADIUS_UDP_ENABLED=true \
+        RADIUS_CLIENTS=127.0.0.1=testing123 python run.py
+
+then seed and measure:
+
+    python -m benchmarks.udp_bench --customers 20000 --requests 20000 --concurrency 64
+"""
+from motor.motor_asyncio import AsyncIOMotorClient
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from app.radius_server.packet import ACCESS_REQUEST, ACCOUNTING_REQUEST, ACCESS_ACCEPT
+from .client import HttpClient, RadiusClient, reply_code
+from .seed import seed_subscribers, percentile
+
+async def run(label: str, call, usernames, requests: int, concurrency: int):
+    jobs = iter(random.choices(usernames, k=requests))
+    samples = []
+    failures = 0
+
+    async def worker(index: int):
+        nonlocal failures
+        for username in jobs:
+            start = time.perf_counter()
+            if not await call(index, username):
+                failures += 1
+            samples.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:>16}: {requests / elapsed:8.0f} req/s  "
+        f"p50 {percentile(samples, 50):6.2f} ms  p99 {percentile(samples, 99):6.2f} ms  "
+        f"failures {failures}"
+    )
+
+def password_for(username: str) -> str:
+    # Matches the synthetic passwords written by seed_subscribers
+    return f"pw{int(username[len('bench'):])}"
+
+def accounting_body(username: str) -> dict:
+    return {
+        "username": username,
+        "session_id": f"{username}-1",
+        "status": "Interim-Update",
+        "session_time": "600",
+        "input_octets": "1048576",
+        "output_octets": "8388608",
+        "nas_ip_address": "127.0.0.1"
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongodb-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="radius_bench")
+    parser.add_argument("--http", default="127.0.0.1:9000")
+    parser.add_argument("--radius-host", default="127.0.0.1")
+    parser.add_argument("--auth-port", type=int, default=1812)
+    parser.add_argument("--acct-port", type=int, default=1813)
+    parser.add_argument("--secret", default="testing123")
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongodb_url)
+    usernames = await seed_subscribers(client[args.database], customers=args.customers)
+    client.close()
+
+    host, port = args.http.split(":")
+    connections = [HttpClient(host, int(port)) for _ in range(args.concurrency)]
+    await asyncio.gather(*(connection.connect() for connection in connections))
+    # Each RadiusClient multiplexes up to 256 requests over one socket
+    radius_clients = [
+        RadiusClient(args.radius_host, args.secret.encode("utf-8"))
+        for _ in range(max(1, args.concurrency // 128))
+    ]
+    await asyncio.gather(*(radius.connect() for radius in radius_clients))
+    radius_for = itertools.cycle(radius_clients)
+
+    async def rest_login(index: int, username: str) -> bool:
+        connection = connections[index]
+        status, _ = await connection.post("/radius/authorize", {"username": username})
+        if status != 200:
+            return False
+        status, _ = await connection.post(
+            "/radius/auth", {"username": username, "password": password_for(username)}
+        )
+        return status == 204
+
+    async def udp_login(index: int, username: str) -> bool:
+        reply = await next(radius_for).request(
+            args.auth_port, ACCESS_REQUEST,
+            [("User-Name", username), ("NAS-IP-Address", "127.0.0.1")],
+            password=password_for(username)
+        )
+        return reply_code(reply) == ACCESS_ACCEPT
+
+    async def rest_accounting(index: int, username: str) -> bool:
+        status, _ = await connections[index].post("/radius/accounting", accounting_body(username))
+        return status == 204
+
+    async def udp_accounting(index: int, username: str) -> bool:
+        body = accounting_body(username)
+        reply = await next(radius_for).request(args.acct_port, ACCOUNTING_REQUEST, [
+            ("User-Name", username),
+            ("Acct-Session-Id", body["session_id"]),
+            ("Acct-Status-Type", body["status"]),
+            ("Acct-Session-Time", body["session_time"]),
+            ("Acct-Input-Octets", body["input_octets"]),
+            ("Acct-Output-Octets", body["output_octets"]),
+            ("NAS-IP-Address", body["nas_ip_address"])
+        ])
+        return reply is not None
+
+    # Warm the authorize cache and connection pools before measuring
+    await run("warmup", rest_login, usernames, min(args.requests, 2000), args.concurrency)
+    await run("rest login", rest_login, usernames, args.requests, args.concurrency)
+    await run("udp login", udp_login, usernames, args.requests, args.concurrency)
+    await run("rest accounting", rest_accounting, usernames, args.requests, args.concurrency)
+    await run("udp accounting", udp_accounting, usernames, args.requests, args.concurrency)
+
+    await asyncio.gather(*(connection.close() for connection in connections))
+    for radius in radius_clients:
+        radius.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+from datetime import timedelta
+import asyncio
+import os
+import tempfile
+import unittest
+from bson import ObjectId
+from app.utils.accounting import accounting_buffer
+from app.utils.circuit import CircuitBreaker
+from app.utils.handlers import process_accounting, get_current_time
+from app.utils.rollups import usage_rollups
+from app.utils.spool import accounting_spool
+
+MB = 1024 * 1024
+CUSTOMER = {"_id": ObjectId(), "username": "alice", "agency": "agency-1", "package": "package-1", "station": None}
+
+class FakeCustomers:
+    async def find_one(self, query, projection=None):
+        return dict(CUSTOMER)
+
+class FakeDatabase:
+    def __init__(self):
+        self.pings = 0
+
+    def get_collection(self, name):
+        return FakeCustomers()
+
+    async def command(self, name):
+        self.pings += 1
+        return {"ok": 1}
+
+def packet(status, megabytes=0, session_time=0):
+    return {
+        "User-Name": "alice",
+        "Acct-Session-Id": "session-1",
+        "Acct-Status-Type": status,
+        "Acct-Session-Time": session_time,
+        "Acct-Input-Octets": megabytes * MB,
+        "Acct-Output-Octets": 0,
+        "NAS-IP-Address": "10.0.0.1"
+    }
+
+def counted():
+    """(input bytes, session time) summed over the hourly customer buckets"""
+    buckets = [
+        totals for (collection, dimension, _, _), totals in usage_rollups._buckets.items()
+        if collection == "usage_hourly" and dimension == "customer"
+    ]
+    return sum(totals[0] for totals in buckets), sum(totals[2] for totals in buckets)
+
+class AccountingReplayTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.original_path = accounting_spool.path, accounting_spool.replaying_path
+        accounting_spool.path = os.path.join(directory, "spool.jsonl")
+        accounting_spool.replaying_path = f"{accounting_spool.path}.replaying"
+        usage_rollups._baselines.clear()
+        usage_rollups._buckets.clear()
+        accounting_buffer._take_batch()
+        self.original_max_pending = accounting_buffer.max_pending
+        self.original_interval = accounting_spool.interval
+        self.database = FakeDatabase()
+
+    def tearDown(self):
+        accounting_buffer.max_pending = self.original_max_pending
+        accounting_spool._close()
+        accounting_spool.path, accounting_spool.replaying_path = self.original_path
+
+    async def replay(self):
+        return await accounting_spool.replay(
+            lambda body, received_at: process_accounting(self.database, body, received_at),
+            lambda: True
+        )
+
+    async def test_live_packets_wait_behind_spooled_ones(self):
+        self.assertEqual(await process_accounting(self.database, packet("Start")), 204)
+        # T1 was taken while the database was down
+        accounting_spool.append(packet("Interim-Update", 100, 300), get_current_time() - timedelta(seconds=1))
+        # T2 arrives live before the spool has drained
+        self.assertEqual(await process_accounting(self.database, packet("Interim-Update", 200, 600)), 204)
+        # Replayed in arrival order: T1, then T2
+        self.assertEqual(await self.replay(), 2)
+        self.assertFalse(accounting_spool.pending())
+        await process_accounting(self.database, packet("Interim-Update", 300, 900))
+        self.assertEqual(counted(), (300 * MB, 900))
+
+    async def test_stale_replayed_packet_is_dropped(self):
+        await process_accounting(self.database, packet("Start"))
+        await process_accounting(self.database, packet("Interim-Update", 200, 600))
+        # An older packet replayed after a later one was already counted
+        stale_before = accounting_spool.stale
+        status = await process_accounting(
+            self.database, packet("Interim-Update", 100, 300), get_current_time() - timedelta(seconds=1)
+        )
+        self.assertEqual(status, 204)
+        self.assertEqual(accounting_spool.stale, stale_before + 1)
+        await process_accounting(self.database, packet("Interim-Update", 300, 900))
+        self.assertEqual(counted(), (300 * MB, 900))
+
+    async def test_full_buffer_spools_instead_of_flushing(self):
+        await process_accounting(self.database, packet("Start"))
+        accounting_buffer.max_pending = accounting_buffer.pending()
+        self.assertEqual(await process_accounting(self.database, packet("Interim-Update", 100, 300)), 204)
+        self.assertTrue(accounting_spool.pending())
+        # Replay backs off while the buffer is still full
+        self.assertEqual(await self.replay(), 0)
+        self.assertTrue(accounting_spool.pending())
+        accounting_buffer._take_batch()
+        self.assertEqual(await self.replay(), 1)
+        self.assertEqual(counted(), (100 * MB, 300))
+
+    async def test_spool_drains_without_authorize_traffic(self):
+        await process_accounting(self.database, packet("Start"))
+        accounting_spool.append(packet("Interim-Update", 100, 300), get_current_time())
+        # The database came back, but only accounting arrives and it all
+        # goes to the spool, so nothing else would close the breaker
+        breaker = CircuitBreaker(reset_timeout=0)
+        breaker.trip()
+        accounting_spool.interval = 0.01
+        accounting_spool.start(
+            lambda body, received_at: process_accounting(self.database, body, received_at),
+            lambda: breaker.closed,
+            lambda: breaker.call(lambda: self.database.command("ping"))
+        )
+        try:
+            for _ in range(100):
+                if not accounting_spool.pending():
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await accounting_spool.stop()
+            accounting_spool.interval = self.original_interval
+        self.assertTrue(breaker.closed)
+        self.assertEqual(self.database.pings, 1)
+        self.assertFalse(accounting_spool.pending())
+        self.assertEqual(counted(), (100 * MB, 300))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+from unittest import mock
+import asyncio
+import unittest
+from app.utils.admission import AdmissionController
+
+async def granted_then_cancelled(awaitable, timeout):
+    # The slot is handed over, then the request is cancelled before it resumes
+    await awaitable
+    raise asyncio.CancelledError
+
+class AdmissionControllerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_cancelled_grant_keeps_service_estimate(self):
+        admission = AdmissionController(max_concurrency=1, limits={}, timeout=5)
+        async with admission.slot("authorize"):
+            await asyncio.sleep(0.02)
+        estimate = admission.stats()["endpoints"]["authorize"]["service_ms"]
+
+        await admission.acquire("authorize")
+        with mock.patch("app.utils.admission.asyncio.wait_for", granted_then_cancelled):
+            waiter = asyncio.create_task(admission.acquire("authorize"))
+            await asyncio.sleep(0)
+            admission.release("authorize", 0.02)
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+        stats = admission.stats()
+        self.assertEqual(stats["active"], 0)
+        self.assertAlmostEqual(stats["endpoints"]["authorize"]["service_ms"], estimate, delta=1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+from app.utils.auth_cache import AuthorizeCache, ChangeStreamInvalidator
+
+CUSTOMER_ID = ObjectId()
+OTHER_ID = ObjectId()
+PACKAGE_ID = ObjectId()
+
+class FakeChangeStream:
+    """Yields ``changes``, then raises ``error`` or waits like an idle stream"""
+
+    def __init__(self, changes, error=None):
+        self.changes = list(changes)
+        self.error = error
+        self.resume_token = None
+        self.drained = asyncio.Event()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.changes:
+            change = self.changes.pop(0)
+            self.resume_token = {"_data": str(id(change))}
+            return change
+        self.drained.set()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        await asyncio.Event().wait()
+
+class FakeCollection:
+    def __init__(self, streams):
+        self.streams = streams
+
+    def watch(self, pipeline, resume_after=None):
+        # Reconnects after the scripted streams get an idle one
+        return self.streams.pop(0) if self.streams else FakeChangeStream([])
+
+class FakeDatabase:
+    def __init__(self, **streams):
+        self.collections = {name: FakeCollection(list(scripted)) for name, scripted in streams.items()}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection([]))
+
+def update(collection_id, *fields):
+    return {
+        "operationType": "update",
+        "documentKey": {"_id": collection_id},
+        "updateDescription": {"updatedFields": {field: 1 for field in fields}, "removedFields": []}
+    }
+
+class ChangeStreamInvalidatorTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = AuthorizeCache()
+        # alice is cached scoped and unscoped; bob shares her package
+        self.cache.put(("agency-1", "alice"), {}, str(CUSTOMER_ID), "agency-1", str(PACKAGE_ID))
+        self.cache.put((None, "alice"), {}, str(CUSTOMER_ID), "agency-1", str(PACKAGE_ID))
+        self.cache.put(("agency-1", "bob"), {}, str(OTHER_ID), "agency-1", str(PACKAGE_ID))
+        self.cache.put(("agency-2", "carol"), {}, str(ObjectId()), "agency-2", None)
+        self.invalidator = ChangeStreamInvalidator(self.cache)
+        self.invalidator.RETRY_DELAY = 0
+
+    async def run_streams(self, customers=(), packages=()):
+        self.invalidator.start(FakeDatabase(customers=customers, packages=packages))
+        self.addAsyncCleanup(self.invalidator.stop)
+        for stream in (*customers, *packages):
+            await asyncio.wait_for(stream.drained.wait(), 1)
+        # Let the watcher finish handling the last change
+        await asyncio.sleep(0)
+
+    def cached(self):
+        return set(self.cache._entries)
+
+    async def test_unrelated_updates_keep_entries(self):
+        await self.run_streams(customers=[FakeChangeStream([
+            update(CUSTOMER_ID, "last_seen", "total_input_bytes", "last_session.end_time")
+        ])])
+        self.assertEqual(len(self.cached()), 4)
+
+    async def test_authorize_field_update_drops_every_key_of_the_customer(self):
+        await self.run_streams(customers=[FakeChangeStream([update(CUSTOMER_ID, "status")])])
+        self.assertEqual(self.cached(), {("agency-1", "bob"), ("agency-2", "carol")})
+
+    async def test_package_change_drops_every_key_on_the_package(self):
+        await self.run_streams(packages=[FakeChangeStream([update(PACKAGE_ID, "download_speed")])])
+        self.assertEqual(self.cached(), {("agency-2", "carol")})
+
+    async def test_stream_error_clears_the_cache(self):
+        await self.run_streams(customers=[FakeChangeStream([], error=AutoReconnect("connection lost"))])
+        await asyncio.sleep(0)
+        self.assertEqual(self.cached(), set())
+
+    async def test_failing_listener_does_not_stop_invalidation(self):
+        def broken_listener(collection_name, change):
+            raise RuntimeError("listener failed")
+        self.invalidator.listeners.append(broken_listener)
+        await self.run_streams(customers=[FakeChangeStream([update(OTHER_ID, "status"), update(CUSTOMER_ID, "package")])])
+        self.assertEqual(self.cached(), {("agency-2", "carol")})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import asyncio
+import unittest
+from app.radius_server.coa import CoaClient
+from app.radius_server.packet import COA_REQUEST, DISCONNECT_REQUEST
+from app.radius_server.server import ClientTable
+from benchmarks.fake_nas import FakeNas
+
+SECRET = b"testing123"
+
+class DropFirstNas(FakeNas):
+    """Ignores the first ``drops`` requests so the client has to retransmit"""
+
+    def __init__(self, secret: bytes, drops: int, **options):
+        super().__init__(secret, **options)
+        self.drops = drops
+        self.datagrams = []
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.datagrams.append(data)
+        if self.drops:
+            self.drops -= 1
+            self.counters["dropped"] += 1
+            return
+        super().datagram_received(data, addr)
+
+class CoaClientTest(unittest.IsolatedAsyncioTestCase):
+    async def start_nas(self, nas: FakeNas) -> CoaClient:
+        transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: nas, local_addr=("127.0.0.1", 0)
+        )
+        self.addCleanup(transport.close)
+        client = CoaClient(
+            ClientTable(f"127.0.0.1={SECRET.decode()}"),
+            port=transport.get_extra_info("sockname")[1],
+            timeout=0.05,
+            retries=2
+        )
+        self.addCleanup(client.close)
+        return client
+
+    def session(self, session_id: str):
+        return [("User-Name", "alice"), ("Acct-Session-Id", session_id)]
+
+    async def test_ack(self):
+        nas = FakeNas(SECRET, sessions={"session-1"})
+        client = await self.start_nas(nas)
+        attributes = self.session("session-1") + [("Mikrotik-Rate-Limit", "10M/20M")]
+        self.assertIs(await client.send("127.0.0.1", COA_REQUEST, attributes), True)
+        self.assertEqual(nas.rate_limits, {"session-1": "10M/20M"})
+        self.assertEqual(client.counters["acked"], 1)
+        self.assertEqual(client.stats()["in_flight"], 0)
+
+    async def test_nak(self):
+        nas = FakeNas(SECRET, sessions=set())
+        client = await self.start_nas(nas)
+        self.assertIs(await client.send("127.0.0.1", DISCONNECT_REQUEST, self.session("session-1")), False)
+        self.assertEqual(client.counters["naked"], 1)
+        self.assertEqual(nas.counters["nak"], 1)
+
+    async def test_retransmits_on_timeout(self):
+        nas = DropFirstNas(SECRET, drops=2, sessions={"session-1"})
+        client = await self.start_nas(nas)
+        self.assertIs(await client.send("127.0.0.1", DISCONNECT_REQUEST, self.session("session-1")), True)
+        self.assertEqual(client.counters["retransmits"], 2)
+        # Retransmissions are the same packet, as RFC 5176 requires
+        self.assertEqual(len(nas.datagrams), 3)
+        self.assertEqual(len(set(nas.datagrams)), 1)
+        self.assertEqual(nas.counters["disconnect"], 1)
+
+    async def test_gives_up_after_retries(self):
+        nas = DropFirstNas(SECRET, drops=3, sessions={"session-1"})
+        client = await self.start_nas(nas)
+        self.assertIsNone(await client.send("127.0.0.1", COA_REQUEST, self.session("session-1")))
+        self.assertEqual(client.counters["timeouts"], 1)
+        self.assertEqual(client.counters["retransmits"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
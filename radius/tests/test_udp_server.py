@@ -0,0 +1,132 @@
+from unittest import mock
+import asyncio
+import hashlib
+import os
+import struct
+import unittest
+from app.radius_server.packet import (
+    ACCESS_REQUEST, ACCESS_ACCEPT, ACCESS_REJECT, ACCOUNTING_REQUEST, ACCOUNTING_RESPONSE,
+    decode_packet, encode_attribute, encode_request, verify_reply
+)
+from app.radius_server.server import ClientTable, RadiusUdpServer
+
+SECRET = b"testing123"
+PASSWORD = "correct horse"
+
+async def authorize_user(database, username, nas_ip_address, nas_identifier):
+    if username != "alice":
+        return {"reply:Reply-Message": {"value": ["Login invalid"]}}
+    return {
+        "control:Cleartext-Password": {"value": [PASSWORD]},
+        "reply:Mikrotik-Rate-Limit": {"value": ["10M/20M"]}
+    }
+
+class _ClientProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.replies: asyncio.Queue = asyncio.Queue()
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.replies.put_nowait(data)
+
+class RadiusUdpServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.accounting = []
+
+        async def process_accounting(database, body, received_at=None):
+            self.accounting.append(body)
+            return 204
+
+        for name, replacement in (
+            ("authorize_user", authorize_user),
+            ("process_accounting", process_accounting),
+            ("record_post_auth", lambda body: None),
+            ("db", mock.Mock())
+        ):
+            patcher = mock.patch(f"app.radius_server.server.{name}", replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.server = RadiusUdpServer(
+            ClientTable(f"127.0.0.1={SECRET.decode()}"), host="127.0.0.1", auth_port=0, acct_port=0
+        )
+        await self.server.start()
+        self.auth_port, self.acct_port = (
+            transport.get_extra_info("sockname")[1] for transport in self.server._transports
+        )
+        self.transport, self.client = await asyncio.get_running_loop().create_datagram_endpoint(
+            _ClientProtocol, local_addr=("127.0.0.1", 0)
+        )
+
+    async def asyncTearDown(self):
+        self.transport.close()
+        await self.server.stop()
+
+    async def exchange(self, port: int, data: bytes, timeout: float = 1.0):
+        self.transport.sendto(data, ("127.0.0.1", port))
+        try:
+            return await asyncio.wait_for(self.client.replies.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def access(self, data: bytes):
+        reply = await self.exchange(self.auth_port, data)
+        self.assertIsNotNone(reply)
+        self.assertTrue(verify_reply(reply, data[4:20], SECRET))
+        return decode_packet(reply)
+
+    async def test_pap_accept(self):
+        reply = await self.access(encode_request(ACCESS_REQUEST, 1, [("User-Name", "alice")], SECRET, PASSWORD))
+        self.assertEqual(reply.code, ACCESS_ACCEPT)
+        self.assertEqual(reply.value("Mikrotik-Rate-Limit"), "10M/20M")
+
+    async def test_pap_reject(self):
+        reply = await self.access(encode_request(ACCESS_REQUEST, 2, [("User-Name", "alice")], SECRET, "wrong"))
+        self.assertEqual(reply.code, ACCESS_REJECT)
+        self.assertEqual(reply.value("Reply-Message"), "Wrong Password")
+        reply = await self.access(encode_request(ACCESS_REQUEST, 3, [("User-Name", "bob")], SECRET, PASSWORD))
+        self.assertEqual(reply.code, ACCESS_REJECT)
+
+    async def test_chap(self):
+        challenge = os.urandom(16)
+        response = hashlib.md5(b"\x07" + PASSWORD.encode() + challenge).digest()
+        attributes = [("User-Name", "alice"), ("CHAP-Challenge", challenge), ("CHAP-Password", b"\x07" + response)]
+        reply = await self.access(encode_request(ACCESS_REQUEST, 4, attributes, SECRET))
+        self.assertEqual(reply.code, ACCESS_ACCEPT)
+        attributes[2] = ("CHAP-Password", b"\x07" + bytes(16))
+        reply = await self.access(encode_request(ACCESS_REQUEST, 5, attributes, SECRET))
+        self.assertEqual(reply.code, ACCESS_REJECT)
+
+    async def test_accounting_response_authenticator(self):
+        request = encode_request(ACCOUNTING_REQUEST, 6, [
+            ("User-Name", "alice"), ("Acct-Session-Id", "session-1"), ("Acct-Status-Type", "Start")
+        ], SECRET)
+        reply = await self.exchange(self.acct_port, request)
+        self.assertEqual(reply[0], ACCOUNTING_RESPONSE)
+        self.assertTrue(verify_reply(reply, request[4:20], SECRET))
+        self.assertFalse(verify_reply(reply, request[4:20], b"other"))
+        self.assertEqual(self.accounting[0]["Acct-Status-Type"], "Start")
+
+    async def test_duplicate_gets_cached_reply(self):
+        request = encode_request(ACCOUNTING_REQUEST, 7, [
+            ("User-Name", "alice"), ("Acct-Session-Id", "session-1"), ("Acct-Status-Type", "Interim-Update")
+        ], SECRET)
+        first = await self.exchange(self.acct_port, request)
+        second = await self.exchange(self.acct_port, request)
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.accounting), 1)
+        self.assertEqual(self.server.counters["duplicates"], 1)
+
+    async def test_unknown_client_is_dropped(self):
+        self.server.clients = ClientTable("127.0.0.2=other")
+        request = encode_request(ACCESS_REQUEST, 8, [("User-Name", "alice")], SECRET, PASSWORD)
+        self.assertIsNone(await self.exchange(self.auth_port, request, timeout=0.2))
+        self.assertEqual(self.server.counters["dropped"], 1)
+
+    async def test_missing_message_authenticator_is_dropped(self):
+        body = encode_attribute("User-Name", "alice")
+        request = struct.pack("!BBH", ACCESS_REQUEST, 9, 20 + len(body)) + os.urandom(16) + body
+        self.assertIsNone(await self.exchange(self.auth_port, request, timeout=0.2))
+        self.assertEqual(self.server.counters["dropped"], 1)
+
+if __name__ == "__main__":
+    unittest.main()